@@ -0,0 +1,151 @@
+import argparse
+import json
+import math
+import sys
+from collections import OrderedDict
+
+import utils
+from benchmarks import generator
+
+# Generator parameters that can be swept, with the defaults used for the parameters that are held fixed
+PARAMETERS = OrderedDict([
+    ("classes", 2),
+    ("functions", 20),
+    ("overloads", 1),
+    ("depth", 3),
+    ("fanout", 2),
+    ("type_combinations", 1),
+])
+
+
+# Least squares slope of log(time) against log(size). An exponent near 1 is linear scaling, near 2 is quadratic
+def scaling_exponent(sizes, times):
+    points = [(math.log(s), math.log(t)) for s, t in zip(sizes, times) if s > 0 and t > 0]
+
+    if len(points) < 2:
+        return None
+
+    mean_x = sum(x for x, _ in points) / len(points)
+    mean_y = sum(y for _, y in points) / len(points)
+
+    denominator = sum((x - mean_x) ** 2 for x, _ in points)
+
+    if denominator == 0:
+        return None
+
+    return sum((x - mean_x) * (y - mean_y) for x, y in points) / denominator
+
+
+# Compile the program generated with 'parameters' 'repeat' times without building it, keeping the fastest time of each
+# phase. Returns (phase times, counts) of the compilation
+def measure(parameters, repeat=3):
+    source = generator.generate(**parameters)
+
+    best = OrderedDict()
+    counts = None
+
+    for _ in range(repeat):
+        r = utils.analysis(source, compile=False)
+
+        for name, phase in r.phases.items():
+            best[name] = min(best.get(name, math.inf), phase.wall_time)
+
+        counts = r.counts
+
+    best["total"] = sum(best.values())
+
+    return best, dict(counts)
+
+
+# Sweep the parameter 'vary' over 'values' with the other parameters fixed, returning a dict with a row per value and
+# the scaling exponent of each phase
+def sweep(vary, values, fixed=None, repeat=3):
+    parameters = OrderedDict(PARAMETERS)
+    parameters.update(fixed or {})
+
+    rows = []
+
+    for value in values:
+        parameters[vary] = value
+        times, counts = measure(parameters, repeat)
+        rows.append({"parameters": dict(parameters), "phases": times, "counts": counts})
+
+    phases = list(rows[0]["phases"]) if rows else []
+
+    # Scaling is measured against the number of monomorphized functions as well as the swept parameter, since that is
+    # what the per function phases actually iterate over
+    exponents = OrderedDict()
+
+    for phase in phases:
+        times = [row["phases"][phase] for row in rows]
+        exponents[phase] = {
+            vary: scaling_exponent(values, times),
+            "monomorphized_functions": scaling_exponent([row["counts"]["monomorphized_functions"] for row in rows], times),
+        }
+
+    return {"vary": vary, "values": list(values), "rows": rows, "exponents": exponents}
+
+
+def format_exponent(exponent):
+    return "-" if exponent is None else f"{exponent:.2f}"
+
+
+def report(results):
+    vary = results["vary"]
+    rows = results["rows"]
+    phases = list(results["exponents"])
+
+    width = max(14, len(vary) + 2)
+
+    header = f"{vary:<{width}}{'instances':>10}" + "".join(f"{phase:>14}" for phase in phases)
+    print(header)
+
+    for value, row in zip(results["values"], rows):
+        line = f"{value:<{width}}{row['counts']['monomorphized_functions']:>10}"
+        line += "".join(f"{row['phases'][phase] * 1000:>11.2f} ms" for phase in phases)
+        print(line)
+
+    print()
+    print(f"{'exponent':<{width}}{'':>10}" + "".join(f"{format_exponent(results['exponents'][p][vary]):>14}" for p in phases))
+    print(f"{'per function':<{width}}{'':>10}" + "".join(f"{format_exponent(results['exponents'][p]['monomorphized_functions']):>14}" for p in phases))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Time each compiler phase over generated programs of increasing size")
+    parser.add_argument("--vary", choices=list(PARAMETERS), default="functions", help="generator parameter to sweep")
+    parser.add_argument("--values", default="10,20,40,80,160", help="comma separated values of the swept parameter")
+    parser.add_argument("--repeat", type=int, default=3, help="compilations per size, the fastest is kept")
+    parser.add_argument("--json", default=None, help="also write the results to this file")
+    parser.add_argument("--max-exponent", type=float, default=None,
+                        help="fail if any phase scales worse than this exponent against the swept parameter")
+
+    for name, default in PARAMETERS.items():
+        parser.add_argument(f"--{name.replace('_', '-')}", type=int, default=default, help=f"fixed {name} (default: {default})")
+
+    args = parser.parse_args(argv)
+
+    values = [int(v) for v in args.values.split(",")]
+    fixed = {name: getattr(args, name) for name in PARAMETERS}
+
+    results = sweep(args.vary, values, fixed, args.repeat)
+
+    report(results)
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=4)
+
+    if args.max_exponent is not None:
+        worst = [(p, e[args.vary]) for p, e in results["exponents"].items() if e[args.vary] is not None and e[args.vary] > args.max_exponent]
+
+        for phase, exponent in worst:
+            print(f"Phase {phase} scales with exponent {exponent:.2f}, above the limit of {args.max_exponent:.2f}")
+
+        if worst:
+            return 1
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
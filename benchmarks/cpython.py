@@ -0,0 +1,358 @@
+import ast
+import decimal
+import hashlib
+import io
+import math
+import sys
+
+import utils
+
+# Names of functions from docs/mylang_std that the shim implements natively. The standard library versions build
+# strings by pushing into a mutable buffer, which Python strings do not support
+NATIVE_STD_FUNCTIONS = {"format", "print", "panic"}
+
+
+# Run Mylang programs directly under CPython. Mylang source is Python syntax, so the program and the standard library
+# are parsed with ast and transformed just enough for Python to give them Mylang semantics:
+#
+# - Member functions are written without 'self', so it is added as their first parameter
+# - Functions and member functions may be overloaded by arity and annotation, so overloads are renamed and replaced by
+#   a dispatcher that picks the best candidate the same way deduction does
+# - for loops use Mylang's iterator protocol, where __next__ returns some(x) or None
+# - Formatted values in f-strings and __push_fmt__ calls are formatted the way the Rust runtime prints them
+#
+# Getters and setters are not called, attributes are read and written directly. This is equivalent as long as getters
+# and setters only return and assign the member, which is how they are written today.
+class _Transform(ast.NodeTransformer):
+
+    def __init__(self):
+        super().__init__()
+        self.in_class = False
+
+    # Rename overloaded functions in 'body' and add a dispatcher for each after the last overload
+    def dispatch_overloads(self, body, method):
+        counts = {}
+
+        for statement in body:
+            if isinstance(statement, ast.FunctionDef):
+                counts[statement.name] = counts.get(statement.name, 0) + 1
+
+        seen = {}
+        new_body = []
+
+        for statement in body:
+            new_body.append(statement)
+
+            if isinstance(statement, ast.FunctionDef) and counts[statement.name] > 1:
+                name = statement.name
+                index = seen.get(name, 0)
+                seen[name] = index + 1
+
+                statement.name = f"{name}__overload{index}"
+
+                if index + 1 == counts[name]:
+                    candidates = ast.List([ast.Name(f"{name}__overload{i}", ast.Load()) for i in range(counts[name])], ast.Load())
+                    dispatcher = ast.Call(ast.Name("overloaded", ast.Load()), [candidates, ast.Constant(method)], [])
+                    new_body.append(ast.Assign([ast.Name(name, ast.Store())], dispatcher))
+
+        return new_body
+
+    def visit_Module(self, node):
+        self.generic_visit(node)
+        node.body = self.dispatch_overloads(node.body, False)
+        return node
+
+    def visit_ClassDef(self, node):
+        self.in_class = True
+        self.generic_visit(node)
+        self.in_class = False
+
+        node.body = self.dispatch_overloads(node.body, True)
+        return node
+
+    def visit_FunctionDef(self, node):
+        if self.in_class:
+            node.args.args.insert(0, ast.arg("self"))
+
+        # Annotations may name classes defined later in the program, so they are kept as strings and only compared
+        # against the type names of arguments by the overload dispatcher
+        for arg in node.args.args:
+            if arg.annotation is not None:
+                arg.annotation = ast.Constant(ast.unparse(arg.annotation))
+
+        # Functions nested in member functions are not methods
+        in_class = self.in_class
+        self.in_class = False
+        self.generic_visit(node)
+        self.in_class = in_class
+
+        return node
+
+    def visit_For(self, node):
+        self.generic_visit(node)
+        node.iter = ast.Call(ast.Name("iterate", ast.Load()), [node.iter], [])
+        return node
+
+    def visit_FormattedValue(self, node):
+        self.generic_visit(node)
+        node.value = ast.Call(ast.Name("format", ast.Load()), [node.value, ast.Constant(0)], [])
+        node.conversion = -1
+        node.format_spec = None
+        return node
+
+    # x.__push_fmt__(s, c) on a built in value becomes push_fmt(x, s, c)
+    def visit_Call(self, node):
+        self.generic_visit(node)
+
+        if isinstance(node.func, ast.Attribute) and node.func.attr == "__push_fmt__":
+            return ast.Call(ast.Name("push_fmt", ast.Load()), [node.func.value] + node.args, [])
+
+        return node
+
+
+# Score a candidate overload against the arguments of a call, as deduction does. Returns None if the candidate cannot
+# be called with 'args', otherwise the number of annotated parameters whose type name matches their argument
+def _score(candidate, args, method):
+    code = candidate.__code__
+    names = code.co_varnames[1 if method else 0:code.co_argcount]
+
+    if len(names) != len(args):
+        return None
+
+    score = 0
+
+    for name, arg in zip(names, args):
+        annotation = candidate.__annotations__.get(name)
+
+        if annotation is not None:
+            if type(arg).__name__ != annotation:
+                return None
+            score += 1
+
+    return score
+
+
+# Create a dispatcher for a list of overloads of one function. 'method' is set for member functions, whose first
+# parameter is self and is not scored
+def overloaded(candidates, method):
+
+    def dispatch(*args):
+        scored = [(_score(c, args[1:] if method else args, method), c) for c in candidates]
+        scored = [(s, c) for s, c in scored if s is not None]
+
+        if len(scored) == 0:
+            raise TypeError(f"No overload of {candidates[0].__name__.split('__overload')[0]} matches {len(args)} arguments")
+
+        return max(scored, key=lambda sc: sc[0])[1](*args)
+
+    return dispatch
+
+
+# Mylang's Option type, returned by some(x) or represented by None
+class Some:
+    def __init__(self, value):
+        self.value = value
+
+    def unwrap(self):
+        return self.value
+
+    def __bool__(self):
+        return True
+
+
+def some(x):
+    return Some(x)
+
+
+def unwrap(x):
+    if x is None:
+        raise RuntimeError("Called unwrap on a None value")
+    return x.unwrap()
+
+
+# Iterate over a Mylang iterator, whose __next__ returns some(x) or None. Python lists and strings use Python iteration
+def iterate(x):
+    if isinstance(x, (list, str, bytes, bytearray)):
+        yield from x
+        return
+
+    it = x.__iter__()
+
+    while True:
+        n = it.__next__()
+
+        if n is None:
+            return
+
+        yield n.unwrap()
+
+
+# Format a float the way Rust's Display implementation does: the shortest representation that round trips, without an
+# exponent and without a trailing '.0'
+def format_float(x):
+    if math.isnan(x):
+        return "NaN"
+    if math.isinf(x):
+        return "inf" if x > 0 else "-inf"
+
+    s = repr(x)
+
+    if "e" in s:
+        s = format(decimal.Decimal(s), "f")
+
+    if s.endswith(".0"):
+        s = s[:-2]
+
+    return s
+
+
+# A mutable string buffer standing in for the string passed to __push_fmt__
+class Buffer:
+    def __init__(self):
+        self.parts = []
+
+    def push(self, s):
+        self.parts.append(s)
+
+    def __str__(self):
+        return "".join(self.parts)
+
+
+def push_fmt(x, buffer, conversion=0):
+    if hasattr(x, "__push_fmt__"):
+        x.__push_fmt__(buffer, conversion)
+    elif type(x) is bool:
+        buffer.push("true" if x else "false")
+    elif type(x) is float:
+        buffer.push(format_float(x))
+    elif type(x) is list:
+        buffer.push("[" + ", ".join(format_value(e, conversion) for e in x) + "]")
+    elif type(x) is Some:
+        buffer.push("Some(" + format_value(x.value, conversion) + ")")
+    elif x is None:
+        buffer.push("None")
+    else:
+        buffer.push(str(x))
+
+
+def format_value(x, conversion=0):
+    buffer = Buffer()
+    push_fmt(x, buffer, conversion)
+    return str(buffer)
+
+
+# Mylang's hasher. The digest differs from the Rust runtime's, so programs should only compare hashes with each other
+class Hasher:
+    def __init__(self):
+        self.digest = hashlib.blake2b(digest_size=8)
+
+    def write(self, x):
+        self.digest.update(repr((type(x).__name__, x)).encode("utf-8"))
+
+    def finalise(self):
+        return int.from_bytes(self.digest.digest(), "little", signed=True)
+
+    def finish(self):
+        return self.finalise()
+
+
+def hash_value(x, hasher):
+    if "__hash__" in type(x).__dict__ and type(x).__module__ == "__mylang__":
+        x.__hash__(hasher)
+    else:
+        hasher.write(x)
+
+
+def zero(x):
+    return x.__zero__() if hasattr(x, "__zero__") else type(x)(0)
+
+
+def one(x):
+    return x.__one__() if hasattr(x, "__one__") else type(x)(1)
+
+
+def byte_array():
+    return bytearray()
+
+
+class MylangPanic(Exception):
+    pass
+
+
+# Create the namespace a transformed program runs in, with output written to 'stdout'
+def namespace(stdout):
+
+    def print(x):
+        stdout.write(format_value(x, 0) + "\n")
+
+    def panic(x):
+        raise MylangPanic(format_value(x, 0))
+
+    class StdOut:
+        def print(self, x):
+            stdout.write(format_value(x, 0))
+
+        def write(self, x):
+            stdout.write(format_value(x, 0))
+
+        def flush(self):
+            pass
+
+    return {
+        "__name__": "__mylang__",
+        "print": print,
+        "panic": panic,
+        "format": format_value,
+        "push_fmt": push_fmt,
+        "iterate": iterate,
+        "overloaded": overloaded,
+        "some": some,
+        "unwrap": unwrap,
+        "hash": hash_value,
+        "zero": zero,
+        "one": one,
+        "byte_array": byte_array,
+        "Hasher": Hasher,
+        "StdOut": StdOut,
+    }
+
+
+# Transform a Mylang program, with the standard library appended as the compiler does, into a Python code object
+def compile_program(source):
+    with open(utils.STD_PATH) as fh:
+        std = ast.parse(fh.read())
+
+    std.body = [s for s in std.body if not (isinstance(s, ast.FunctionDef) and s.name in NATIVE_STD_FUNCTIONS)]
+
+    module = ast.parse(source)
+    module.body.extend(std.body)
+
+    module = ast.fix_missing_locations(_Transform().visit(module))
+
+    return compile(module, "<mylang>", "exec")
+
+
+# Run a Mylang program under CPython, returning its output as bytes. Exceptions raised by the program propagate
+def run(source):
+    code = compile_program(source)
+
+    stdout = io.StringIO()
+    env = namespace(stdout)
+
+    exec(code, env)
+    env["main"]()
+
+    return stdout.getvalue().encode("utf-8")
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+
+    with open(argv[0]) as fh:
+        sys.stdout.buffer.write(run(fh.read()))
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,152 @@
+import argparse
+import difflib
+import logging
+import statistics
+import sys
+import time
+
+import tests
+import utils
+import workspace
+from benchmarks import cpython
+from benchmarks import programs
+
+logger = logging.getLogger(__name__)
+
+
+# Outcome of running one program under CPython and as generated Rust. Programs printing ids or hashes cannot produce
+# identical output, so they may give a verifier function, as in tests.test_sources, which both outputs must pass instead
+class Comparison:
+    def __init__(self, name, python_output, rust_output, python_times, rust_times, error=None, verifier=None):
+        self.name = name
+        self.python_output = python_output
+        self.rust_output = rust_output
+        self.python_times = python_times
+        self.rust_times = rust_times
+        self.error = error
+        self.verifier = verifier
+
+    def matches(self):
+        if self.error is not None:
+            return False
+
+        if callable(self.verifier):
+            try:
+                self.verifier(self.python_output.decode("utf-8").split("\n"))
+                self.verifier(self.rust_output.decode("utf-8").split("\n"))
+            except AssertionError:
+                return False
+            return True
+
+        return self.python_output == self.rust_output
+
+    # Ratio of the median CPython time to the median time of the compiled program
+    def speedup(self):
+        if not self.python_times or not self.rust_times:
+            return None
+        return statistics.median(self.python_times) / statistics.median(self.rust_times)
+
+    def diff(self):
+        return "".join(difflib.unified_diff(self.python_output.decode("utf-8", "replace").splitlines(keepends=True),
+                                            self.rust_output.decode("utf-8", "replace").splitlines(keepends=True),
+                                            "cpython", "rust"))
+
+
+# Run 'source' 'runs' times under CPython and compile it once and run the executable 'runs' times
+def compare(name, source, runs=3, release=True, workspace_path=None, verifier=None):
+    python_times = []
+    python_output = b""
+
+    try:
+        for _ in range(runs):
+            start = time.perf_counter()
+            python_output = cpython.run(source)
+            python_times.append(time.perf_counter() - start)
+    except Exception as e:
+        return Comparison(name, python_output, b"", python_times, [], f"CPython: {type(e).__name__}: {e}", verifier)
+
+    try:
+        result = utils.analysis(source, compile=True, release=release, workspace_path=workspace_path)
+    except Exception as e:
+        return Comparison(name, python_output, b"", python_times, [], f"Compiler: {type(e).__name__}: {e}", verifier)
+
+    rust_times = []
+    rust_output = result.stdout
+
+    for _ in range(runs):
+        start = time.perf_counter()
+        r = workspace.run_process([result.executable], capture_output=True)
+        rust_times.append(time.perf_counter() - start)
+        rust_output = r.stdout
+
+        if r.returncode != 0:
+            return Comparison(name, python_output, rust_output, python_times, rust_times,
+                              f"Rust: return code {r.returncode}: {r.stderr!r}", verifier)
+
+    return Comparison(name, python_output, rust_output, python_times, rust_times, verifier=verifier)
+
+
+def format_speedup(speedup):
+    return "-" if speedup is None else f"{speedup:.1f}x"
+
+
+def report(comparisons, show_diff=True):
+    print(f"{'program':<18}{'cpython':>12}{'rust':>12}{'speedup':>10}  output")
+
+    for c in comparisons:
+        python = f"{statistics.median(c.python_times) * 1000:.2f} ms" if c.python_times else "-"
+        rust = f"{statistics.median(c.rust_times) * 1000:.2f} ms" if c.rust_times else "-"
+        status = "match" if c.matches() else (c.error or "differs")
+
+        print(f"{c.name:<18}{python:>12}{rust:>12}{format_speedup(c.speedup()):>10}  {status}")
+
+    if show_diff:
+        for c in comparisons:
+            if c.error is None and not c.matches():
+                print()
+                print(c.diff())
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run Mylang programs under CPython and as generated Rust, comparing output and speed")
+    parser.add_argument("benchmarks", nargs="*", help="benchmarks from benchmarks.programs to compare (default: all)")
+    parser.add_argument("--tests", action="store_true", help="also compare the programs in tests.test_sources")
+    parser.add_argument("--file", action="append", default=[], help="compare the Mylang program in this file")
+    parser.add_argument("--size", action="append", default=[], metavar="NAME=N", help="override the problem size of a benchmark")
+    parser.add_argument("--runs", type=int, default=3, help="runs of each program under CPython and as Rust")
+    parser.add_argument("--debug", action="store_true", help="build the Rust in the debug profile instead of release")
+    parser.add_argument("--workspace", default=None, help="cargo workspace used to build the programs")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, stream=sys.stdout)
+
+    sizes = {}
+
+    for override in args.size:
+        name, _, size = override.partition("=")
+        sizes[name] = int(size)
+
+    sources = []
+
+    if args.benchmarks or not (args.tests or args.file):
+        for name in args.benchmarks or programs.PROGRAMS:
+            sources.append((name, programs.source(name, sizes.get(name)), None))
+
+    if args.tests:
+        for i, (source, verifier) in enumerate(tests.test_sources):
+            sources.append((f"test_{i}", source, verifier))
+
+    for path in args.file:
+        with open(path) as fh:
+            sources.append((path, fh.read(), None))
+
+    comparisons = [compare(name, source, args.runs, not args.debug, args.workspace, verifier)
+                   for name, source, verifier in sources]
+
+    report(comparisons)
+
+    return 0 if all(c.matches() for c in comparisons) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,144 @@
+import argparse
+import itertools
+import math
+import sys
+
+# Literal arguments used to create distinct argument type combinations
+LITERALS = ["1", "1.5"]
+
+
+# Generates a synthetic Mylang program for measuring how the compiler scales.
+#
+# The 'functions' global functions are split into 'depth' levels. Every function calls 'fanout' functions of the next
+# level, so the call graph is a DAG of the given depth. The functions of the first level are called from main with
+# 'type_combinations' distinct combinations of int and float arguments, and since every function passes its arguments
+# on, each combination produces a separate instantiation of every reachable function. Each function has 'overloads'
+# overloads, which differ by arity so overload resolution has to score every candidate without any being ambiguous.
+# If 'classes' is non zero, each function also constructs one of the classes and calls a member function on it.
+class ProgramGenerator:
+
+    def __init__(self, classes=0, functions=10, overloads=1, depth=3, fanout=2, type_combinations=1):
+        self.classes = classes
+        self.functions = max(functions, depth)
+        self.overloads = max(overloads, 1)
+        self.depth = max(depth, 1)
+        self.fanout = fanout
+        self.type_combinations = max(type_combinations, 1)
+
+        # Enough arguments to give the requested number of distinct int/float combinations
+        self.arity = max(1, math.ceil(math.log2(self.type_combinations)))
+
+        self.lines = []
+
+    def write(self, line="", indent=0):
+        self.lines.append("    " * indent + line)
+
+    # Distribute the functions evenly over the levels, returning a list of lists of function names
+    def levels(self):
+        levels = []
+
+        for level in range(self.depth):
+            count = self.functions // self.depth + (1 if level < self.functions % self.depth else 0)
+            start = sum(len(l) for l in levels)
+            levels.append([f"fn_{i}" for i in range(start, start + count)])
+
+        return levels
+
+    def args(self, count):
+        return [f"a{i}" for i in range(count)]
+
+    def generate_class(self, index):
+        self.write(f"class C{index}:")
+        self.write("def __init__(x):", 1)
+        self.write("self.x = x", 2)
+        self.write()
+        self.write("def __get_x__():", 1)
+        self.write("return self.x", 2)
+        self.write()
+        self.write("def step(y):", 1)
+        self.write(f"return self.x + y + {index}", 2)
+        self.write()
+
+    def generate_function(self, name, index, children):
+        args = self.args(self.arity)
+
+        self.write(f"def {name}({', '.join(args)}):")
+        self.write(f"r = {' + '.join(args)}", 1)
+
+        for child in children:
+            self.write(f"r = r + {child}({', '.join(args)})", 1)
+
+        if self.classes:
+            self.write(f"o = C{index % self.classes}({args[0]})", 1)
+            self.write(f"r = r + o.step({args[-1]})", 1)
+
+        self.write("return r", 1)
+        self.write()
+
+        # Extra overloads take additional arguments and forward to the base overload
+        for overload in range(1, self.overloads):
+            extra = self.args(self.arity + overload)
+            self.write(f"def {name}({', '.join(extra)}):")
+            self.write(f"return {name}({', '.join(args)}) + {' + '.join(extra[self.arity:])}", 1)
+            self.write()
+
+    def generate(self):
+        self.lines = []
+
+        for i in range(self.classes):
+            self.generate_class(i)
+
+        levels = self.levels()
+
+        index = 0
+
+        for level, names in enumerate(levels):
+            for position, name in enumerate(names):
+                children = []
+
+                if level + 1 < len(levels) and levels[level + 1]:
+                    below = levels[level + 1]
+                    children = sorted({below[(position * self.fanout + k) % len(below)] for k in range(self.fanout)})
+
+                self.generate_function(name, index, children)
+                index += 1
+
+        self.write("def main():")
+
+        combinations = list(itertools.product(LITERALS, repeat=self.arity))[:self.type_combinations]
+
+        for combination in combinations:
+            for name in levels[0]:
+                self.write(f"print({name}({', '.join(combination)}))", 1)
+
+                for overload in range(1, self.overloads):
+                    extra = ["1"] * overload
+                    self.write(f"print({name}({', '.join(list(combination) + extra)}))", 1)
+
+        self.write()
+
+        return "\n".join(self.lines)
+
+
+def generate(**kwargs):
+    return ProgramGenerator(**kwargs).generate()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Print a synthetic Mylang program")
+    parser.add_argument("--classes", type=int, default=0)
+    parser.add_argument("--functions", type=int, default=10)
+    parser.add_argument("--overloads", type=int, default=1)
+    parser.add_argument("--depth", type=int, default=3)
+    parser.add_argument("--fanout", type=int, default=2)
+    parser.add_argument("--type-combinations", type=int, default=1)
+    args = parser.parse_args(argv)
+
+    print(generate(classes=args.classes, functions=args.functions, overloads=args.overloads, depth=args.depth,
+                   fanout=args.fanout, type_combinations=args.type_combinations))
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
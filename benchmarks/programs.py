@@ -0,0 +1,448 @@
+from collections import OrderedDict
+
+# Runtime benchmark corpus, modelled on the benchmarks game. Each entry maps a name to (source, default size). The
+# source contains the placeholder __N__ which is replaced by the problem size before compiling, so the runner can scale
+# every program with one option. Programs only use what the compiler supports today: there is no recursion, lists are
+# only modified with append and objects are not stored in lists, so helpers such as sqrt are written in Mylang, n-body
+# names its bodies, fannkuch builds new permutations instead of swapping in place and binary-trees is replaced by an
+# allocation workload of short lived objects.
+
+SIZE_PLACEHOLDER = "__N__"
+
+N_BODY = """
+
+class Body:
+    def __init__(x, y, z, vx, vy, vz, mass):
+        self.x = x
+        self.y = y
+        self.z = z
+        self.vx = vx * 365.24
+        self.vy = vy * 365.24
+        self.vz = vz * 365.24
+        self.mass = mass * 39.47841760435743
+
+    def __get_x__():
+        return self.x
+
+    def __get_y__():
+        return self.y
+
+    def __get_z__():
+        return self.z
+
+    def __get_vx__():
+        return self.vx
+
+    def __get_vy__():
+        return self.vy
+
+    def __get_vz__():
+        return self.vz
+
+    def __get_mass__():
+        return self.mass
+
+    def __set_x__(x):
+        self.x = x
+
+    def __set_y__(y):
+        self.y = y
+
+    def __set_z__(z):
+        self.z = z
+
+    def __set_vx__(vx):
+        self.vx = vx
+
+    def __set_vy__(vy):
+        self.vy = vy
+
+    def __set_vz__(vz):
+        self.vz = vz
+
+    def kinetic_energy():
+        return 0.5 * self.mass * (self.vx * self.vx + self.vy * self.vy + self.vz * self.vz)
+
+    def move(dt):
+        self.x = self.x + dt * self.vx
+        self.y = self.y + dt * self.vy
+        self.z = self.z + dt * self.vz
+
+def sqrt(x):
+    r = x
+    i = 0
+    while i < 40:
+        r = (r + x / r) * 0.5
+        i = i + 1
+    return r
+
+def potential_energy(a, b):
+    dx = a.x - b.x
+    dy = a.y - b.y
+    dz = a.z - b.z
+    return a.mass * b.mass / sqrt(dx * dx + dy * dy + dz * dz)
+
+def interact(a, b, dt):
+    dx = a.x - b.x
+    dy = a.y - b.y
+    dz = a.z - b.z
+
+    d2 = dx * dx + dy * dy + dz * dz
+    mag = dt / (d2 * sqrt(d2))
+
+    a.vx = a.vx - dx * b.mass * mag
+    a.vy = a.vy - dy * b.mass * mag
+    a.vz = a.vz - dz * b.mass * mag
+
+    b.vx = b.vx + dx * a.mass * mag
+    b.vy = b.vy + dy * a.mass * mag
+    b.vz = b.vz + dz * a.mass * mag
+
+def energy(sun, jupiter, saturn, uranus, neptune):
+    e = sun.kinetic_energy() + jupiter.kinetic_energy() + saturn.kinetic_energy() + uranus.kinetic_energy() + neptune.kinetic_energy()
+
+    e = e - potential_energy(sun, jupiter) - potential_energy(sun, saturn) - potential_energy(sun, uranus) - potential_energy(sun, neptune)
+    e = e - potential_energy(jupiter, saturn) - potential_energy(jupiter, uranus) - potential_energy(jupiter, neptune)
+    e = e - potential_energy(saturn, uranus) - potential_energy(saturn, neptune)
+    e = e - potential_energy(uranus, neptune)
+
+    return e
+
+def advance(sun, jupiter, saturn, uranus, neptune, dt):
+    interact(sun, jupiter, dt)
+    interact(sun, saturn, dt)
+    interact(sun, uranus, dt)
+    interact(sun, neptune, dt)
+    interact(jupiter, saturn, dt)
+    interact(jupiter, uranus, dt)
+    interact(jupiter, neptune, dt)
+    interact(saturn, uranus, dt)
+    interact(saturn, neptune, dt)
+    interact(uranus, neptune, dt)
+
+    sun.move(dt)
+    jupiter.move(dt)
+    saturn.move(dt)
+    uranus.move(dt)
+    neptune.move(dt)
+
+def main():
+    sun = Body(0.0, 0.0, 0.0, 0.0, 0.0, 0.0, 1.0)
+    jupiter = Body(4.84143144246472090, -1.16032004402742839, -0.103622044471123109, 0.00166007664274403694, 0.00769901118419740425, -0.0000690460016972063023, 0.000954791938424326609)
+    saturn = Body(8.34336671824457987, 4.12479856412430479, -0.403523417114321381, -0.00276742510726862411, 0.00499852801234917238, 0.0000230417297573763929, 0.000285885980666130812)
+    uranus = Body(12.8943695621391310, -15.1111514016986312, -0.223307578892655734, 0.00296460137564761618, 0.00237847173959480950, -0.0000296589568540237556, 0.0000436624404335156298)
+    neptune = Body(15.3796971148509165, -25.9193146099879641, 0.179258772950371181, 0.00268067772490389322, 0.00162824170038242295, -0.0000951592254519715870, 0.0000515138902046611451)
+
+    # Offset the momentum of the sun so the system's total momentum is zero
+    sun.vx = -(jupiter.vx * jupiter.mass + saturn.vx * saturn.mass + uranus.vx * uranus.mass + neptune.vx * neptune.mass) / sun.mass
+    sun.vy = -(jupiter.vy * jupiter.mass + saturn.vy * saturn.mass + uranus.vy * uranus.mass + neptune.vy * neptune.mass) / sun.mass
+    sun.vz = -(jupiter.vz * jupiter.mass + saturn.vz * saturn.mass + uranus.vz * uranus.mass + neptune.vz * neptune.mass) / sun.mass
+
+    print(energy(sun, jupiter, saturn, uranus, neptune))
+
+    n = __N__
+    i = 0
+    while i < n:
+        advance(sun, jupiter, saturn, uranus, neptune, 0.01)
+        i = i + 1
+
+    print(energy(sun, jupiter, saturn, uranus, neptune))
+
+"""
+
+ALLOCATION = """
+
+class Node:
+    def __init__(left, right):
+        self.left = left
+        self.right = right
+
+    def __get_left__():
+        return self.left
+
+    def __get_right__():
+        return self.right
+
+    def check():
+        return self.left + self.right + 1
+
+def churn(depth):
+    count = 1
+    while depth > 0:
+        count = count * 2
+        depth = depth - 1
+
+    total = 0
+    i = 0
+    while i < count:
+        a = Node(i, count - i)
+        b = Node(a.check(), a.left)
+        c = Node(b.check(), a.check())
+        total = (total + c.check()) % 1000000007
+        i = i + 1
+
+    return total
+
+def main():
+    max_depth = __N__
+
+    long_lived = Node(max_depth, max_depth)
+
+    depth = 4
+    while depth <= max_depth:
+        print(f"depth {depth} check: {churn(depth)}")
+        depth = depth + 2
+
+    print(f"long lived check: {long_lived.check()}")
+
+"""
+
+SPECTRAL_NORM = """
+
+def eval_a(i, j):
+    return 1.0 / float((i + j) * (i + j + 1) // 2 + i + 1)
+
+def times(v, n, transpose):
+    result = []
+    i = 0
+    while i < n:
+        total = 0.0
+        j = 0
+        while j < n:
+            a = eval_a(i, j)
+            if transpose:
+                a = eval_a(j, i)
+            total = total + a * v[j]
+            j = j + 1
+        result.append(total)
+        i = i + 1
+    return result
+
+def times_transpose(v, n):
+    return times(times(v, n, False), n, True)
+
+def sqrt(x):
+    r = x
+    i = 0
+    while i < 40:
+        r = (r + x / r) * 0.5
+        i = i + 1
+    return r
+
+def main():
+    n = __N__
+
+    u = []
+    i = 0
+    while i < n:
+        u.append(1.0)
+        i = i + 1
+
+    v = u
+    i = 0
+    while i < 10:
+        v = times_transpose(u, n)
+        u = times_transpose(v, n)
+        i = i + 1
+
+    vbv = 0.0
+    vv = 0.0
+    i = 0
+    while i < n:
+        vbv = vbv + u[i] * v[i]
+        vv = vv + v[i] * v[i]
+        i = i + 1
+
+    print(sqrt(vbv / vv))
+
+"""
+
+FANNKUCH = """
+
+def replace(l, index, value):
+    r = []
+    i = 0
+    while i < len(l):
+        v = l[i] + 0
+        if i == index:
+            v = value
+        r.append(v)
+        i = i + 1
+    return r
+
+def flip(perm, k):
+    r = []
+    i = k
+    while i >= 0:
+        r.append(perm[i])
+        i = i - 1
+    i = k + 1
+    while i < len(perm):
+        r.append(perm[i])
+        i = i + 1
+    return r
+
+def rotate(perm, k):
+    r = []
+    i = 1
+    while i <= k:
+        r.append(perm[i])
+        i = i + 1
+    r.append(perm[0])
+    i = k + 1
+    while i < len(perm):
+        r.append(perm[i])
+        i = i + 1
+    return r
+
+def count_flips(perm):
+    flips = 0
+    k = perm[0] + 0
+    while k != 0:
+        perm = flip(perm, k)
+        flips = flips + 1
+        k = perm[0] + 0
+    return flips
+
+def fannkuch(n):
+    perm = []
+    count = []
+    i = 0
+    while i < n:
+        perm.append(i)
+        count.append(0)
+        i = i + 1
+
+    max_flips = 0
+    checksum = 0
+    permutation = 0
+    r = n
+
+    running = True
+    while running:
+        while r != 1:
+            count = replace(count, r - 1, r)
+            r = r - 1
+
+        flips = count_flips(perm)
+        max_flips = max(max_flips, flips)
+
+        if permutation % 2 == 0:
+            checksum = checksum + flips
+        if permutation % 2 == 1:
+            checksum = checksum - flips
+
+        searching = True
+        while searching:
+            searching = False
+            if r == n:
+                running = False
+            if r < n:
+                perm = rotate(perm, r)
+                remaining = count[r] - 1
+                count = replace(count, r, remaining)
+                if remaining <= 0:
+                    r = r + 1
+                    searching = True
+
+        permutation = permutation + 1
+
+    print(checksum)
+    print(f"Pfannkuchen({n}) = {max_flips}")
+
+def main():
+    fannkuch(__N__)
+
+"""
+
+STRING_BUILDING = """
+
+def main():
+    n = __N__
+
+    s = ""
+    i = 0
+    while i < n:
+        s = s + f"{i},"
+        i = i + 1
+
+    print(len(s))
+
+    total = 0
+    round = 0
+    while round < 10:
+        line = ""
+        j = 0
+        while j < 100:
+            line = line + "ab"
+            j = j + 1
+        total = total + len(line + s)
+        round = round + 1
+
+    print(total)
+
+"""
+
+LIST_HEAVY = """
+
+def build(n):
+    l = []
+    i = 0
+    while i < n:
+        l.append((i * 7919) % 10007)
+        i = i + 1
+    return l
+
+def evens(l):
+    r = []
+    for x in ContainerIterator(l):
+        if x % 2 == 0:
+            r.append(x)
+    return r
+
+def reverse(l):
+    r = []
+    i = len(l) - 1
+    while i >= 0:
+        r.append(l[i])
+        i = i - 1
+    return r
+
+def total(l):
+    t = 0
+    for x in ContainerIterator(l):
+        t = t + x
+    return t
+
+def main():
+    n = __N__
+
+    l = build(n)
+
+    rounds = 0
+    checksum = 0
+    while rounds < 20:
+        e = evens(l)
+        r = reverse(e)
+        checksum = (checksum + total(r) + len(r)) % 1000000007
+        rounds = rounds + 1
+
+    print(len(l))
+    print(checksum)
+
+"""
+
+PROGRAMS = OrderedDict([
+    ("n_body", (N_BODY, 100000)),
+    ("allocation", (ALLOCATION, 16)),
+    ("spectral_norm", (SPECTRAL_NORM, 300)),
+    ("fannkuch", (FANNKUCH, 9)),
+    ("string_building", (STRING_BUILDING, 20000)),
+    ("list_heavy", (LIST_HEAVY, 200000)),
+])
+
+
+# Return the source of the program 'name' with its problem size set to 'size', or its default size if not given
+def source(name, size=None):
+    text, default = PROGRAMS[name]
+    return text.replace(SIZE_PLACEHOLDER, str(default if size is None else size))
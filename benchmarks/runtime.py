@@ -0,0 +1,169 @@
+import argparse
+import hashlib
+import json
+import logging
+import statistics
+import sys
+import time
+
+import utils
+import workspace
+from benchmarks import programs
+
+logger = logging.getLogger(__name__)
+
+# Relative increase in median wall time or max RSS over the baseline that is reported as a regression
+DEFAULT_TOLERANCE = 0.1
+
+
+# Compile the benchmark 'name' in release mode and run the executable 'runs' times. Returns a dict with the problem
+# size, the wall time of every run, the largest max RSS seen (in bytes, None if the platform does not report it), the
+# SHA-256 checksum of stdout and the time spent compiling and building
+def run_benchmark(name, size=None, runs=5, workspace_path=None):
+    source = programs.source(name, size)
+
+    result = utils.analysis(source, compile=True, release=True, workspace_path=workspace_path)
+
+    if result.returncode != 0:
+        raise RuntimeError(f"Benchmark {name} exited with return code {result.returncode}: {result.stderr!r}")
+
+    checksum = hashlib.sha256(result.stdout).hexdigest()
+
+    times = []
+    max_rss = None
+
+    for _ in range(runs):
+        start = time.perf_counter()
+        r = workspace.run_process([result.executable], capture_output=True)
+        times.append(time.perf_counter() - start)
+
+        if r.returncode != 0:
+            raise RuntimeError(f"Benchmark {name} exited with return code {r.returncode}: {r.stderr!r}")
+
+        # The output of a benchmark must not change between runs, otherwise the checksum means nothing
+        if hashlib.sha256(r.stdout).hexdigest() != checksum:
+            raise RuntimeError(f"Benchmark {name} produced different output on different runs")
+
+        if r.max_rss is not None:
+            max_rss = max(max_rss or 0, r.max_rss)
+
+    return {
+        "size": size if size is not None else programs.PROGRAMS[name][1],
+        "times": times,
+        "median": statistics.median(times),
+        "max_rss": max_rss,
+        "checksum": checksum,
+        "compile_time": result.total_time() - result.phases["execution"].wall_time,
+    }
+
+
+# Run every benchmark in 'names', returning a dict of benchmark names to results
+def run_benchmarks(names, sizes=None, runs=5, workspace_path=None):
+    sizes = sizes or {}
+    results = {}
+
+    for name in names:
+        logger.info(f"Running benchmark {name}...")
+        results[name] = run_benchmark(name, sizes.get(name), runs, workspace_path)
+
+    return results
+
+
+# Compare 'results' against 'baseline', returning a list of messages describing regressions. Output checksums must
+# match exactly, times and memory may grow by up to 'tolerance'. Benchmarks run at a different size are skipped
+def compare(results, baseline, tolerance=DEFAULT_TOLERANCE):
+    regressions = []
+
+    for name, result in results.items():
+        if name not in baseline:
+            continue
+
+        base = baseline[name]
+
+        if base["size"] != result["size"]:
+            logger.warning(f"Benchmark {name} ran at size {result['size']} but the baseline used {base['size']}, skipping")
+            continue
+
+        if base["checksum"] != result["checksum"]:
+            regressions.append(f"{name}: output checksum changed")
+
+        if result["median"] > base["median"] * (1 + tolerance):
+            regressions.append(f"{name}: median time {result['median'] * 1000:.2f} ms, baseline {base['median'] * 1000:.2f} ms")
+
+        if result["max_rss"] is not None and base["max_rss"] is not None and result["max_rss"] > base["max_rss"] * (1 + tolerance):
+            regressions.append(f"{name}: max RSS {result['max_rss'] // 1024} KiB, baseline {base['max_rss'] // 1024} KiB")
+
+    return regressions
+
+
+def format_rss(max_rss):
+    return "-" if max_rss is None else f"{max_rss // 1024} KiB"
+
+
+def report(results, baseline=None):
+    print(f"{'benchmark':<18}{'size':>8}{'median':>12}{'min':>12}{'max rss':>14}{'change':>10}  checksum")
+
+    for name, r in results.items():
+        change = ""
+
+        if baseline is not None and name in baseline and baseline[name]["size"] == r["size"]:
+            change = f"{(r['median'] / baseline[name]['median'] - 1) * 100:+.1f}%"
+
+        print(f"{name:<18}{r['size']:>8}{r['median'] * 1000:>9.2f} ms{min(r['times']) * 1000:>9.2f} ms"
+              f"{format_rss(r['max_rss']):>14}{change:>10}  {r['checksum'][:16]}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Compile the runtime benchmark corpus in release mode and time the executables")
+    parser.add_argument("benchmarks", nargs="*", help="benchmarks to run (default: all)")
+    parser.add_argument("--runs", type=int, default=5, help="executions of each benchmark")
+    parser.add_argument("--size", action="append", default=[], metavar="NAME=N", help="override the problem size of a benchmark")
+    parser.add_argument("--record", default=None, help="write the results to this JSON baseline")
+    parser.add_argument("--compare", default=None, help="compare the results against this JSON baseline")
+    parser.add_argument("--tolerance", type=float, default=DEFAULT_TOLERANCE,
+                        help=f"relative slowdown or memory growth reported as a regression (default: {DEFAULT_TOLERANCE})")
+    parser.add_argument("--workspace", default=None, help="cargo workspace used to build the benchmarks")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, stream=sys.stdout)
+
+    names = args.benchmarks or list(programs.PROGRAMS)
+
+    for name in names:
+        if name not in programs.PROGRAMS:
+            parser.error(f"unknown benchmark {name}, choose from {', '.join(programs.PROGRAMS)}")
+
+    sizes = {}
+
+    for override in args.size:
+        name, _, size = override.partition("=")
+        sizes[name] = int(size)
+
+    baseline = None
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+
+    results = run_benchmarks(names, sizes, args.runs, args.workspace)
+
+    report(results, baseline)
+
+    if args.record:
+        with open(args.record, "w") as f:
+            json.dump(results, f, indent=4)
+
+    if baseline is not None:
+        regressions = compare(results, baseline, args.tolerance)
+
+        for regression in regressions:
+            print(f"Regression in {regression}")
+
+        if regressions:
+            return 1
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,46 @@
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Code run in a fresh interpreter to time a single import of the compiler
+IMPORT_SNIPPET = "import time; t = time.perf_counter(); import {module}; print(time.perf_counter() - t)"
+
+
+# Time 'import module' in 'runs' fresh interpreters, returning the list of import times in seconds
+def measure_import(module="utils", runs=10):
+    times = []
+
+    for _ in range(runs):
+        r = subprocess.run([sys.executable, "-c", IMPORT_SNIPPET.format(module=module)], cwd=ROOT, capture_output=True, check=True)
+        times.append(float(r.stdout.decode("utf-8").strip().split("\n")[-1]))
+
+    return times
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Measure the time taken to import the compiler in a new process")
+    parser.add_argument("--module", default="utils", help="module to import (default: utils)")
+    parser.add_argument("--runs", type=int, default=10, help="number of fresh interpreters to time")
+    parser.add_argument("--max", type=float, default=None, help="fail if the median import time exceeds this many milliseconds")
+    args = parser.parse_args(argv)
+
+    times = measure_import(args.module, args.runs)
+
+    median = statistics.median(times) * 1000
+
+    print(f"import {args.module}: min {min(times) * 1000:.2f} ms, median {median:.2f} ms, max {max(times) * 1000:.2f} ms ({args.runs} runs)")
+
+    if args.max is not None and median > args.max:
+        print(f"Median import time {median:.2f} ms exceeds the limit of {args.max:.2f} ms")
+        return 1
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,214 @@
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import time
+
+import parse_template
+import workspace
+
+import logging
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CACHE_DIR = os.path.join(parse_template.CACHE_DIR, "compile")
+
+# Entries are evicted, least recently used first, once the cache grows beyond this many bytes
+DEFAULT_MAX_SIZE = 1 << 30
+
+# Bump this whenever the layout of cache entries changes
+CACHE_VERSION = 1
+
+COMPILER_DIRECTORY = os.path.dirname(os.path.abspath(__file__))
+
+RUST_FILE = "main.rs"
+METADATA_FILE = "entry.json"
+
+_compiler_digest = None
+
+
+# Digest of the compiler's own source. Any change to a module of the compiler may change the generated code, so rather
+# than maintaining a version number by hand every top level module is hashed, once per process
+def compiler_digest():
+    global _compiler_digest
+
+    if _compiler_digest is None:
+        h = hashlib.sha256()
+
+        for name in sorted(os.listdir(COMPILER_DIRECTORY)):
+            if name.endswith(".py"):
+                h.update(name.encode())
+                with open(os.path.join(COMPILER_DIRECTORY, name), "rb") as fh:
+                    h.update(hashlib.sha256(fh.read()).digest())
+
+        _compiler_digest = h.hexdigest()
+
+    return _compiler_digest
+
+
+# Stamps of every file in the Rust template. The built in maps and the runtime linked into the binary are both derived
+# from the template, so the size and modification time of each file stand in for its contents
+def template_stamps(template_path):
+    stamps = []
+
+    for rel in sorted(workspace.Workspace(template_path=template_path).template_files()):
+        s = os.stat(os.path.join(template_path, rel))
+        stamps.append([rel, s.st_size, s.st_mtime_ns])
+
+    return stamps
+
+
+# A content addressed cache of compiled programs. Each entry is a directory named by the key of the program, holding
+# the generated Rust and, if the program was built, its executable. The modification time of an entry's directory is
+# updated on every hit so eviction can remove the least recently used entries first.
+class CompileCache:
+
+    def __init__(self, path=None, max_size=DEFAULT_MAX_SIZE):
+        self.path = path if path is not None else DEFAULT_CACHE_DIR
+        self.max_size = max_size
+
+    # The key of a program: a digest of the user source, the standard library, the template, the compiler and the
+    # build profile
+    def key(self, source, std_source, template_path, release=False):
+        h = hashlib.sha256()
+
+        h.update(json.dumps({
+            "version": CACHE_VERSION,
+            "compiler": compiler_digest(),
+            "template": template_stamps(template_path),
+            "release": release,
+        }).encode())
+
+        h.update(hashlib.sha256(std_source.encode()).digest())
+        h.update(hashlib.sha256(source.encode()).digest())
+
+        return h.hexdigest()
+
+    def entry(self, key):
+        return os.path.join(self.path, key[:2], key)
+
+    # Returns (rust, executable) for 'key', or None on a miss. 'executable' is None if the entry was stored without
+    # one, and if 'need_executable' is set such an entry counts as a miss
+    def get(self, key, need_executable=False):
+        entry = self.entry(key)
+
+        try:
+            with open(os.path.join(entry, METADATA_FILE)) as fh:
+                metadata = json.load(fh)
+
+            with open(os.path.join(entry, RUST_FILE)) as fh:
+                rust = fh.read()
+        except (OSError, ValueError):
+            return None
+
+        executable = None
+
+        if metadata["executable"] is not None:
+            executable = os.path.join(entry, metadata["executable"])
+
+            if not os.path.exists(executable):
+                return None
+
+        if need_executable and executable is None:
+            return None
+
+        # Mark the entry as recently used
+        os.utime(entry)
+
+        return rust, executable
+
+    # Store the generated Rust, and the executable if given, under 'key'. The entry is assembled in a temporary directory
+    # and renamed into place so concurrent readers never see a partial entry. If another process stores the same key
+    # while the old entry is replaced, the rename fails and the entry it stored is used instead. Returns the path of the
+    # stored executable
+    def put(self, key, rust, executable=None):
+        entry = self.entry(key)
+
+        os.makedirs(os.path.dirname(entry), exist_ok=True)
+
+        tmp = tempfile.mkdtemp(dir=os.path.dirname(entry), prefix=".tmp_")
+
+        try:
+            with open(os.path.join(tmp, RUST_FILE), "w") as fh:
+                fh.write(rust)
+
+            name = None
+
+            if executable is not None:
+                name = os.path.basename(executable)
+                shutil.copy2(executable, os.path.join(tmp, name))
+
+            with open(os.path.join(tmp, METADATA_FILE), "w") as fh:
+                json.dump({"executable": name, "created": time.time()}, fh)
+
+            # An existing entry for the same key may lack the executable, so it is replaced
+            if os.path.exists(entry):
+                shutil.rmtree(entry, ignore_errors=True)
+
+            try:
+                os.replace(tmp, entry)
+            except OSError:
+                stored = self.get(key, need_executable=executable is not None)
+
+                if stored is None:
+                    raise
+
+                logger.debug(f"Cache entry {key} was stored by another process, using it")
+
+                shutil.rmtree(tmp, ignore_errors=True)
+
+                return stored[1]
+        except OSError:
+            shutil.rmtree(tmp, ignore_errors=True)
+            raise
+
+        self.evict()
+
+        return os.path.join(entry, name) if name is not None else None
+
+    def entries(self):
+        entries = []
+
+        if not os.path.isdir(self.path):
+            return entries
+
+        for prefix in os.listdir(self.path):
+            directory = os.path.join(self.path, prefix)
+
+            if not os.path.isdir(directory):
+                continue
+
+            for key in os.listdir(directory):
+                if key.startswith(".tmp_"):
+                    continue
+
+                entry = os.path.join(directory, key)
+
+                # Entries may be removed by another process while they are listed
+                try:
+                    size = sum(os.path.getsize(os.path.join(entry, f)) for f in os.listdir(entry))
+                    entries.append((os.stat(entry).st_mtime, size, entry))
+                except OSError:
+                    continue
+
+        return entries
+
+    def size(self):
+        return sum(size for _, size, _ in self.entries())
+
+    # Remove the least recently used entries until the cache fits in max_size
+    def evict(self):
+        entries = sorted(self.entries())
+        total = sum(size for _, size, _ in entries)
+
+        for _, size, entry in entries:
+            if total <= self.max_size:
+                break
+
+            logger.debug(f"Evicting {entry} from the compile cache")
+            shutil.rmtree(entry, ignore_errors=True)
+            total -= size
+
+    def clear(self):
+        shutil.rmtree(self.path, ignore_errors=True)
@@ -0,0 +1,222 @@
+import ast
+import logging
+import math
+import operator
+
+import ir
+import liveness
+import mangle
+
+logger = logging.getLogger(__name__)
+
+# The smallest and largest values of the i64 an Integer holds
+MIN_INTEGER = -2 ** 63
+MAX_INTEGER = 2 ** 63 - 1
+
+
+def _floordiv(a, b):
+    return None if b == 0 else a // b
+
+
+def _mod(a, b):
+    return None if b == 0 else a % b
+
+
+def _truediv(a, b):
+    return None if b == 0 else a / b
+
+
+# Maps the member functions of scalars folded at compile time to their Python equivalent, which gives the same result
+# as the built in for the operand types in the table. None means the call is left for the built in, as when it raises
+# at runtime
+OPERATORS = {
+    "__add__": operator.add,
+    "__sub__": operator.sub,
+    "__mul__": operator.mul,
+    "__truediv__": _truediv,
+    "__eq__": operator.eq,
+    "__ne__": operator.ne,
+    "__lt__": operator.lt,
+    "__le__": operator.le,
+    "__gt__": operator.gt,
+    "__ge__": operator.ge,
+    "__floordiv__": _floordiv,
+    "__mod__": _mod,
+    "__neg__": operator.neg,
+    "__pos__": operator.pos,
+    "__bool__": bool,
+}
+
+# The operand types each member function is folded for, as (receiver type, argument type or None)
+OPERANDS = {}
+
+for _name in ("__add__", "__sub__", "__mul__", "__truediv__", "__eq__", "__ne__", "__lt__", "__le__", "__gt__",
+              "__ge__"):
+    for _left in (int, float):
+        for _right in (int, float):
+            OPERANDS.setdefault(_name, set()).add((_left, _right))
+
+OPERANDS["__eq__"].add((bool, bool))
+OPERANDS["__ne__"].add((bool, bool))
+OPERANDS["__floordiv__"] = {(int, int)}
+OPERANDS["__mod__"] = {(int, int)}
+OPERANDS["__neg__"] = {(int, None), (float, None)}
+OPERANDS["__pos__"] = {(int, None), (float, None)}
+OPERANDS["__bool__"] = {(int, None), (float, None), (bool, None)}
+
+
+# Fold the member functions of constant scalars (see OPERATORS) into constants, so 1 + 1 is emitted as the constant 2
+# rather than a call on two wrappers. Returns the number of calls folded
+def fold_constants(module: ir.Module):
+    folded = sum(_fold_function(f) for f in _functions(module))
+
+    logger.debug(f"Folded {folded} constant expressions")
+
+    return folded
+
+
+# Replace the reads of local variables assigned a constant scalar once, and never reassigned, with the constant, and
+# fold the expressions this makes constant. The assignments are removed once nothing reads them. Strings and None are
+# not propagated, as each read would build a new object rather than share the one assigned. Returns the number of
+# reads replaced
+def propagate_constants(module: ir.Module):
+    propagated = 0
+
+    for f in _functions(module):
+        while True:
+            count = _propagate_function(f)
+
+            if count == 0:
+                break
+
+            propagated += count
+            _fold_function(f)
+
+    logger.debug(f"Propagated {propagated} constants")
+
+    return propagated
+
+
+def _functions(module):
+    functions = list(module.functions)
+
+    for c in module.classes:
+        functions.extend(c.functions)
+
+    return functions
+
+
+# The statements of 'function', and the fields of each holding an expression
+def _expression_fields(function):
+    for s in [n for n in ast.walk(function) if isinstance(n, ir.Statement)]:
+        for field in ("value", "expr", "condition", "iterator"):
+            if isinstance(getattr(s, field, None), ir.Expression):
+                yield s, field
+
+
+def _fold_function(function):
+    folder = _Folder()
+
+    for s, field in _expression_fields(function):
+        setattr(s, field, folder.fold(getattr(s, field)))
+
+    return folder.folded
+
+
+class _Folder:
+
+    def __init__(self):
+        self.folded = 0
+
+    # Returns 'node' with its constant calls folded, folding the expressions within it first
+    def fold(self, node):
+        for field, value in ast.iter_fields(node):
+            if type(value) is list:
+                value[:] = [self.fold(v) if isinstance(v, ir.Expression) else v for v in value]
+            elif isinstance(value, ir.Expression):
+                setattr(node, field, self.fold(value))
+
+        if type(node) is not ir.BuiltInMemberFunction or type(node.expr) is not ir.Constant or len(node.args) > 1:
+            return node
+
+        if node.args and type(node.args[0]) is not ir.Constant:
+            return node
+
+        receiver = node.expr.value
+        argument = node.args[0].value if node.args else None
+
+        if (type(receiver), type(argument) if node.args else None) not in OPERANDS.get(node.id, ()):
+            return node
+
+        result = OPERATORS[node.id](*([receiver, argument] if node.args else [receiver]))
+
+        if not _representable(result):
+            return node
+
+        self.folded += 1
+
+        return ir.Constant(result)
+
+
+# Returns true if 'value' can be held by the built in of its type, so results the built in would overflow or raise on
+# are not folded
+def _representable(value):
+    if type(value) is int:
+        return MIN_INTEGER <= value <= MAX_INTEGER
+    elif type(value) is float:
+        return math.isfinite(value)
+
+    return value is not None
+
+
+def _propagate_function(function):
+    bindings = liveness.Bindings(function)
+
+    # A constructor builds Self from the members assigned in its body, so these are always kept
+    members = set()
+
+    if type(function) is ir.InitFunctionDef:
+        members = {bindings.scope.get(mangle.mangle(mangle.MemberVariable(m))) for m in function.member_list}
+
+    constants = {}
+
+    for b, assignments in bindings.assignments.items():
+        if b in bindings.opaque or b in members or len(assignments) != 1 or type(assignments[0]) is not ir.LetAssign:
+            continue
+
+        value = assignments[0].value
+
+        if type(value) is ir.Constant and type(value.value) in (int, float, bool):
+            constants[b] = assignments[0]
+
+    replaced = 0
+
+    for s, field in _expression_fields(function):
+        for holder, key, node in list(liveness.references(s, field)):
+            b = bindings.bindings.get(node)
+
+            if b in constants:
+                constant = ir.Constant(constants[b].value.value)
+
+                if type(holder) is list:
+                    holder[key] = constant
+                else:
+                    setattr(holder, key, constant)
+
+                replaced += 1
+
+    _remove(function.body, set(constants.values()))
+
+    return replaced
+
+
+# Remove the statements 'removed' from 'statements' and the blocks within them
+def _remove(statements, removed):
+    statements[:] = [s for s in statements if s not in removed]
+
+    for s in statements:
+        if type(s) is ir.IfElse:
+            _remove(s.if_block, removed)
+            _remove(s.else_block or [], removed)
+        elif type(s) is ir.While or type(s) is ir.For:
+            _remove(s.body, removed)
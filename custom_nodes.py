@@ -1,4 +1,5 @@
 import ast
+import copyreg
 
 
 # A Self on its own, without accessing any attributes (for example return self, or x = self)
@@ -100,6 +101,19 @@ class GetterAssign(ast.AST):
         self.value = value
 
 
+# A for loop with the type of its iterator, substituted for the ast.For during deduction
+class TypedFor(ast.AST):
+
+    _fields = ["target", "iter", "body", "iter_type"]
+
+    def __init__(self, target, iter, body, iter_type):
+        super().__init__()
+        self.target = target
+        self.iter = iter
+        self.body = body
+        self.iter_type = iter_type
+
+
 class InitAssign(ast.AST):
 
     _fields = ["id", "value"]
@@ -195,4 +209,20 @@ class SetterFunctionDef(ast.FunctionDef):
         self.returns = returns
         self.type_comment = type_comment
         self.type_params = type_params
-        self.lineno = None
\ No newline at end of file
+        self.lineno = None
+
+# The nodes above take their fields as constructor arguments, which the default pickling of ast nodes does not pass, so
+# they are pickled by restoring their attributes onto an uninitialised instance instead
+def _restore(cls, attributes):
+    node = cls.__new__(cls)
+    node.__dict__.update(attributes)
+    return node
+
+
+def _reduce(node):
+    return _restore, (type(node), node.__dict__)
+
+
+for _node in list(globals().values()):
+    if isinstance(_node, type) and issubclass(_node, ast.AST) and _node.__module__ == __name__:
+        copyreg.pickle(_node, _reduce)
@@ -0,0 +1,170 @@
+import ast
+import logging
+
+import ir
+import m_types
+import mangle
+
+logger = logging.getLogger(__name__)
+
+
+# Choose how the objects of each user class are stored, replacing every class of 'module' with one of:
+#
+#   ir.CyclicClassDef   a crate::heap::CellGc, traced by the cycle collector
+#   ir.AcyclicClassDef  a crate::heap::CellRc, plain reference counting
+#   ir.StackClassDef    the struct itself, held and copied by value
+#
+# The types a class can reach are known from its members, so the classes that can be part of a reference cycle are
+# those in a strongly connected component of the graph with an edge from each class to the classes its members hold,
+# directly or within lists, options and tuples (see "Mylang reference counting.md", Fact 2). These, the classes
+# reached from them (the collector has to trace them), and the classes passing 'self' on as an object (only a CellGc
+# can be recovered from 'self') go on the collected heap. Every other class is reference counted, or stored by value
+# if it is never changed after construction, has no __del__ and is never compared by identity, since copies of such
+# an object cannot be told apart.
+#
+# Returns a map from the mangled name of each class to the ir.ClassDef subclass chosen for it.
+def choose_storage(module: ir.Module):
+    classes = {mangle.mangle(c): c for c in module.classes}
+    graph = {name: sorted(_held(c) & classes.keys()) for name, c in classes.items()}
+
+    cyclic = set()
+
+    for component in _components(graph):
+        if len(component) > 1 or component[0] in graph[component[0]]:
+            cyclic.update(component)
+
+    collected = _reachable(graph, cyclic | {name for name, c in classes.items() if _uses_self(c)})
+    compared = _compared(module)
+
+    storage = {}
+
+    for name, c in classes.items():
+        if name in collected:
+            storage[name] = ir.CyclicClassDef
+        elif c.mutable or name in compared or any(type(f) is ir.DelFunctionDef for f in c.functions):
+            storage[name] = ir.AcyclicClassDef
+        else:
+            storage[name] = ir.StackClassDef
+
+    for i, c in enumerate(module.classes):
+        chosen = storage[mangle.mangle(c)](c)
+        chosen.mutable = c.mutable
+        module.classes[i] = chosen
+
+    logger.debug(f"Class storage: {len(cyclic)} cyclic, {len(collected)} collected, "
+                 f"{sum(s is ir.AcyclicClassDef for s in storage.values())} reference counted, "
+                 f"{sum(s is ir.StackClassDef for s in storage.values())} by value")
+
+    return storage
+
+
+# Returns the mangled names of the user classes held by the members of 'c', through any number of containers
+def _held(c):
+    held = set()
+    pending = [m.annotation for m in c.member_map]
+    seen = set()
+
+    while pending:
+        t = pending.pop()
+
+        if id(t) in seen:
+            continue
+
+        seen.add(id(t))
+
+        if type(t) is m_types.UserClass:
+            held.add(mangle.mangle(t))
+        else:
+            pending.extend(t.components())
+
+    return held
+
+
+# Tarjan's algorithm. Returns the strongly connected components of 'graph', which maps each node to its successors
+def _components(graph):
+    index = {}
+    low = {}
+    stack = []
+    on_stack = set()
+    components = []
+
+    def connect(node):
+        index[node] = low[node] = len(index)
+        stack.append(node)
+        on_stack.add(node)
+
+        for successor in graph[node]:
+            if successor not in index:
+                connect(successor)
+                low[node] = min(low[node], low[successor])
+            elif successor in on_stack:
+                low[node] = min(low[node], index[successor])
+
+        if low[node] == index[node]:
+            component = []
+
+            while True:
+                n = stack.pop()
+                on_stack.discard(n)
+                component.append(n)
+
+                if n == node:
+                    break
+
+            components.append(component)
+
+    for node in sorted(graph):
+        if node not in index:
+            connect(node)
+
+    return components
+
+
+# Returns 'nodes' and every node reachable from them in 'graph'
+def _reachable(graph, nodes):
+    reached = set()
+    pending = list(nodes)
+
+    while pending:
+        node = pending.pop()
+
+        if node not in reached:
+            reached.add(node)
+            pending.extend(graph[node])
+
+    return reached
+
+
+# Returns true if a member function of 'c' uses 'self' as an object in its own right
+def _uses_self(c):
+    return any(type(n) is ir.SolitarySelf for f in c.functions for n in ast.walk(f))
+
+
+# Returns the mangled names of the user classes whose objects are compared by identity, through __id__
+def _compared(module: ir.Module):
+    functions = list(module.functions)
+
+    for c in module.classes:
+        functions.extend(c.functions)
+
+    compared = set()
+
+    for f in functions:
+        for n in ast.walk(f):
+            if type(n) is ir.UserClassMemberFunction and n.id == "__id__":
+                t = _inner(n.exp_type)
+
+                if type(t) is m_types.UserClass:
+                    compared.add(mangle.mangle(t))
+                else:
+                    # The class is not known, so no class may be stored by value
+                    compared.update(mangle.mangle(c) for c in module.classes)
+
+    return compared
+
+
+def _inner(t):
+    while type(t) is m_types.Unknown and t.has_inner():
+        t = t.inner()
+
+    return t
@@ -0,0 +1,311 @@
+import argparse
+import concurrent.futures
+import concurrent.futures.process
+import json
+import logging
+import multiprocessing
+import os
+import socket
+import socketserver
+import sys
+import tempfile
+import threading
+import traceback
+
+import parse_template
+import session
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_SOCKET = os.path.join(parse_template.CACHE_DIR, "daemon.sock")
+
+DEFAULT_WORKSPACE_ROOT = os.path.join(tempfile.gettempdir(), "mylang_daemon_workspaces")
+
+# The Session of the current worker process, created once by _init_worker
+_worker_session = None
+
+# Collects the warnings and errors logged while the current worker compiles a request
+_worker_diagnostics = None
+
+
+# A logging handler keeping the records it receives, so they can be returned to the client as diagnostics
+class _Diagnostics(logging.Handler):
+
+    def __init__(self):
+        super().__init__(logging.WARNING)
+        self.records = []
+
+    def emit(self, record):
+        self.records.append({"severity": record.levelname.lower(), "source": record.name, "message": record.getMessage()})
+
+    def take(self):
+        records, self.records = self.records, []
+        return records
+
+
+# Each worker takes a slot number from the queue and builds in its own workspace for its whole lifetime, as in
+# runner.py, and keeps one warm Session for every request it serves. Workers are separate processes, so the handler
+# added to their root logger does not affect the daemon or other workers.
+def _init_worker(slots, workspace_root, template_path, cache):
+    global _worker_session, _worker_diagnostics
+
+    _worker_diagnostics = _Diagnostics()
+    logging.root.addHandler(_worker_diagnostics)
+
+    workspace_path = os.path.join(workspace_root, f"worker_{slots.get()}")
+
+    _worker_session = session.Session(template_path, workspace_path=workspace_path, cache=cache)
+    _worker_session.warm()
+
+
+# Serve one compile request in a worker, returning the response. See Server for the protocol
+def compile_request(request):
+    _worker_diagnostics.take()
+
+    response = {"ok": False, "rust": None, "executable": None, "cache_hit": False, "phases": {}}
+
+    try:
+        result = _worker_session.compile(request["source"], build=request.get("build", False), exe=request.get("output"),
+                                         run=request.get("run", False), release=request.get("release"))
+    except BaseException as e:
+        diagnostics = _worker_diagnostics.take()
+        diagnostics.append({"severity": "error", "source": type(e).__name__, "message": str(e),
+                            "traceback": traceback.format_exc()})
+        response["diagnostics"] = diagnostics
+        return response
+
+    response.update({
+        "ok": result.returncode in (None, 0),
+        "rust": result.rust,
+        "executable": request.get("output") or result.executable,
+        "cache_hit": result.cache_hit,
+        "phases": {name: p.wall_time for name, p in result.phases.items()},
+        "diagnostics": _worker_diagnostics.take(),
+    })
+
+    if result.returncode is not None:
+        response["returncode"] = result.returncode
+        response["stdout"] = result.stdout.decode("utf-8", "replace")
+        response["stderr"] = result.stderr.decode("utf-8", "replace")
+
+    return response
+
+
+class _Handler(socketserver.StreamRequestHandler):
+
+    def handle(self):
+        for line in self.rfile:
+            if not line.strip():
+                continue
+
+            try:
+                request = json.loads(line)
+                response = self.server.serve(request)
+            except ValueError as e:
+                request = {}
+                response = {"ok": False, "diagnostics": [{"severity": "error", "source": "daemon", "message": f"Invalid request: {e}"}]}
+
+            if "id" in request:
+                response["id"] = request["id"]
+
+            self.wfile.write(json.dumps(response).encode("utf-8") + b"\n")
+            self.wfile.flush()
+
+
+# Serves compile requests on a Unix socket. Clients send one JSON object per line and receive one JSON object per line
+# in reply, in order. Requests are
+#
+#     {"command": "compile", "source": "...", "build": false, "run": false, "release": false, "output": null, "id": ...}
+#     {"command": "ping"}
+#     {"command": "shutdown"}
+#
+# where everything but "source" is optional, and "command" defaults to "compile". A compile response holds "ok",
+# "rust", "diagnostics" (the warnings and errors logged while compiling, and the exception if compiling failed),
+# "executable" (the built program if "build" was set, copied to "output" if given), "cache_hit" and the wall time of
+# each phase in "phases". If "run" is set, "returncode", "stdout" and "stderr" of the program are included as well.
+#
+# Each connection is served on its own thread and compiles are run on a pool of worker processes, so requests from
+# different connections are compiled concurrently. If a worker exits abruptly (killed for running out of memory, or
+# crashing in native code) the pool is broken, so the request gets an error response and the pool is replaced.
+class Server(socketserver.ThreadingUnixStreamServer):
+
+    daemon_threads = True
+
+    def __init__(self, path=DEFAULT_SOCKET, jobs=None, workspace_root=DEFAULT_WORKSPACE_ROOT, template_path=None,
+                 cache=True):
+        self.path = path
+        self.jobs = jobs if jobs is not None else (os.cpu_count() or 1)
+        self.workspace_root = workspace_root
+        self.template_path = template_path
+        self.cache = cache
+
+        remove_stale_socket(path)
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+
+        self.pool_lock = threading.Lock()
+        self.pool = self.new_pool()
+
+        super().__init__(path, _Handler)
+
+    # Each pool has its own queue of slots, so the workspaces of its workers are unique
+    def new_pool(self):
+        slots = multiprocessing.Queue()
+        for i in range(self.jobs):
+            slots.put(i)
+
+        return concurrent.futures.ProcessPoolExecutor(self.jobs, initializer=_init_worker,
+                                                      initargs=(slots, self.workspace_root, self.template_path, self.cache))
+
+    # Replace 'broken' with a new pool, unless a request that failed on it at the same time already did
+    def replace_pool(self, broken):
+        with self.pool_lock:
+            if self.pool is broken:
+                logger.warning("A worker process exited abruptly, restarting the workers")
+                self.pool = self.new_pool()
+
+        broken.shutdown(wait=False)
+
+    # Compile on the pool, returning an error response if the request could not be served
+    def compile(self, request):
+        pool = self.pool
+
+        try:
+            return pool.submit(compile_request, request).result()
+        except concurrent.futures.process.BrokenProcessPool as e:
+            self.replace_pool(pool)
+            message = f"A worker process exited abruptly while compiling: {e}"
+        except Exception as e:
+            message = f"{type(e).__name__}: {e}"
+
+        return {"ok": False, "diagnostics": [{"severity": "error", "source": "daemon", "message": message}]}
+
+    def serve(self, request):
+        command = request.get("command", "compile")
+
+        if command == "ping":
+            return {"ok": True, "jobs": self.jobs}
+        elif command == "shutdown":
+            # shutdown waits for serve_forever to return, so it cannot be called from the thread serving the request
+            threading.Thread(target=self.shutdown, daemon=True).start()
+            return {"ok": True}
+        elif command == "compile":
+            if "source" not in request:
+                return {"ok": False, "diagnostics": [{"severity": "error", "source": "daemon", "message": "A compile request needs a 'source'"}]}
+            return self.compile(request)
+        else:
+            return {"ok": False, "diagnostics": [{"severity": "error", "source": "daemon", "message": f"Unknown command '{command}'"}]}
+
+    def server_close(self):
+        super().server_close()
+        self.pool.shutdown()
+
+        if os.path.exists(self.path):
+            os.unlink(self.path)
+
+
+# A socket file left behind by a daemon that did not exit cleanly is removed. One that is still accepting connections
+# belongs to a running daemon, and is left alone
+def remove_stale_socket(path):
+    if not os.path.exists(path):
+        return
+
+    try:
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as s:
+            s.connect(path)
+    except OSError:
+        os.unlink(path)
+        return
+
+    raise OSError(f"A daemon is already listening on '{path}'")
+
+
+# A connection to a running daemon. Requests on one connection are answered in order
+class Client:
+
+    def __init__(self, path=DEFAULT_SOCKET):
+        self.socket = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.socket.connect(path)
+        self.file = self.socket.makefile("rwb")
+
+    def request(self, request):
+        self.file.write(json.dumps(request).encode("utf-8") + b"\n")
+        self.file.flush()
+
+        line = self.file.readline()
+
+        if not line:
+            raise ConnectionError("The daemon closed the connection")
+
+        return json.loads(line)
+
+    def compile(self, source, **options):
+        return self.request({"command": "compile", "source": source, **options})
+
+    def close(self):
+        self.file.close()
+        self.socket.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Serve Mylang compile requests on a Unix socket, or send requests to a running daemon")
+    parser.add_argument("--socket", default=DEFAULT_SOCKET, help=f"path of the Unix socket (default: {DEFAULT_SOCKET})")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    serve = commands.add_parser("serve", help="start the daemon")
+    serve.add_argument("-j", "--jobs", type=int, default=None, help="number of worker processes (default: number of cores)")
+    serve.add_argument("--workspace-root", default=DEFAULT_WORKSPACE_ROOT, help="directory holding one cargo workspace per worker")
+    serve.add_argument("--template", default=None, help="Rust template to compile against (default: MYLANG_TEMPLATE)")
+    serve.add_argument("--no-cache", action="store_true", help="do not use the compile cache")
+
+    compile = commands.add_parser("compile", help="compile a file with a running daemon and print the Rust")
+    compile.add_argument("file")
+    compile.add_argument("--build", action="store_true", help="also build the program and print the path of the executable")
+    compile.add_argument("--release", action="store_true", help="build in the release profile")
+    compile.add_argument("-o", "--output", default=None, help="copy the built executable here")
+
+    commands.add_parser("ping", help="check that a daemon is running")
+    commands.add_parser("stop", help="stop a running daemon")
+
+    args = parser.parse_args(argv)
+
+    if args.command == "serve":
+        logging.basicConfig(level=logging.INFO, stream=sys.stdout)
+
+        with Server(args.socket, args.jobs, args.workspace_root, args.template, not args.no_cache) as server:
+            logger.info(f"Serving on '{args.socket}' with {server.jobs} workers")
+            server.serve_forever()
+
+        return 0
+
+    with Client(args.socket) as client:
+        if args.command == "ping":
+            print(client.request({"command": "ping"}))
+            return 0
+
+        if args.command == "stop":
+            client.request({"command": "shutdown"})
+            return 0
+
+        with open(args.file) as fh:
+            response = client.compile(fh.read(), build=args.build, release=args.release, output=args.output)
+
+    for d in response.get("diagnostics", []):
+        print(f"{d['severity']}: {d['message']}", file=sys.stderr)
+
+    if response["ok"]:
+        if args.build:
+            print(response["executable"])
+        else:
+            print(response["rust"])
+
+    return 0 if response["ok"] else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -11,10 +11,34 @@ import logging
 
 logger = logging.getLogger(__name__)
 
-def deduce(table: symbol_table.Table):
-    t = _Deduction(table)
+# Deduce the types of a program, returning the TypeTree rooted at main. 'reusable' maps instantiation keys to
+# Specialisations deduced by an earlier compile that are still valid for this program. Their type trees are attached
+# to the new tree instead of being deduced again
+def deduce(table: symbol_table.Table, reusable=None):
+    t = _Deduction(table, reusable)
     t.visit_FunctionDef(table.get_main().ast_node)
-    return t.manager.working_tree_node
+    tree = t.manager.working_tree_node
+
+    # Unknowns keep a reference to the deduction that created them. Nothing is filled in once deduction has finished,
+    # so the table and tree are released to let type trees kept for a later compile outlive them
+    t.whole_table = None
+    t.manager = None
+
+    return tree
+
+
+# An instantiation of a function for a list of argument types: the type it deduced to (the return type, or the class
+# type for a constructor) and the TypeTree of its body
+class Specialisation:
+    def __init__(self, key, result, tree):
+        self.key = key
+        self.result = result
+        self.tree = tree
+
+        # Maps the names in tree.dependencies to the fingerprints of the definitions they named when this
+        # instantiation was deduced. Filled in by incremental compilation
+        self.signatures = None
+
 
 class TreeManager:
 
@@ -29,8 +53,24 @@ class TreeManager:
         tt = TypeTree(ast_node.name, arg_types, ast_node, self.working_tree_node, parent_class_type, parent_class_node)
         self.working_tree_node.child_trees.append(tt)
         self.working_tree_node = tt
-        yield
+        yield tt
         self.working_tree_node = self.working_tree_node.parent
+        self.working_tree_node.dependencies |= tt.dependencies
+
+    # Attach a type tree deduced by an earlier compile as a child of the working tree
+    def attach(self, tree):
+        tree.parent = self.working_tree_node
+        self.working_tree_node.child_trees.append(tree)
+        self.working_tree_node.dependencies |= tree.dependencies
+
+    # Record that the working tree looked up the top level definitions called 'name'
+    def depend(self, name):
+        self.working_tree_node.dependencies.add(name)
+
+    # Record that the working tree used an instantiation deduced elsewhere in the tree
+    def reference(self, specialisation):
+        self.working_tree_node.references.append(specialisation)
+        self.working_tree_node.dependencies |= specialisation.tree.dependencies
 
     def substitute_node(self, node, sub):
         self.working_tree_node.subs[node] = sub
@@ -100,6 +140,16 @@ class TypeTree(ast.AST):
         # Maps nodes to substitute to nodes to substitute with
         self.subs = {}
 
+        # Names of the top level functions and classes looked up while deducing this tree and its children
+        self.dependencies = set()
+
+        # Specialisations used by this tree whose trees are elsewhere, because they had already been deduced
+        self.references = []
+
+        # The Specialisation this tree was deduced for, and the IR it was translated to
+        self.specialisation = None
+        self.translation = None
+
     def get_member_map(self):
         pass
 
@@ -117,13 +167,20 @@ class _Deduction(ast.NodeVisitor):
         "panic_string": m_types.Ntuple([]),
     }
 
-    def __init__(self, table: symbol_table.Table):
+    def __init__(self, table: symbol_table.Table, reusable=None):
         self.whole_table = table
 
         self.biumap = {}
 
         self.manager = TreeManager(table)
 
+        # Maps a (function node, argument types, parent class type, parent class node) key to the Specialisation of an
+        # instantiation that has already been deduced, so each specialisation is only traversed once
+        self.instantiations = {}
+
+        # Specialisations from an earlier compile that may be reused, see deduce
+        self.reusable = reusable if reusable is not None else {}
+
 
     # Assert that all the expressions in args are the same type, then return this type. Otherwise raise an exception
     def assert_same_type(self, *args):
@@ -135,6 +192,81 @@ class _Deduction(ast.NodeVisitor):
         else:
             return self.visit(node)
 
+    # Returns true if the type contains no unresolved unknowns, and can therefore be hashed
+    def is_resolved(self, t):
+        if type(t) is m_types.Unknown and not t.has_inner():
+            return False
+        if t.is_closed():
+            return True
+        return all(self.is_resolved(c) for c in t.components())
+
+    # Returns the key used to identify an instantiation in the instantiation cache, or None if the instantiation
+    # cannot be cached (because some types are not yet known)
+    def instantiation_key(self, arg_types, ast_node, parent_class_type, parent_class_node):
+        if not all(self.is_resolved(t) for t in arg_types):
+            return None
+
+        if parent_class_type is not None and not self.is_resolved(parent_class_type):
+            return None
+
+        return ast_node, parse_template.Parser.HashableList(arg_types), parent_class_type, parent_class_node
+
+    # Returns the Specialisation for 'key' if it has already been deduced in this compile or can be reused from an
+    # earlier one, otherwise None
+    def lookup(self, key):
+        if key is None:
+            return None
+
+        if key in self.instantiations:
+            specialisation = self.instantiations[key]
+            self.manager.reference(specialisation)
+            return specialisation
+
+        if key in self.reusable:
+            specialisation = self.reusable[key]
+            self.manager.attach(specialisation.tree)
+            self.register(specialisation.tree)
+            return specialisation
+
+        return None
+
+    # Register the specialisations in a reused type tree, so they are not deduced again. Specialisations the tree only
+    # references were emitted with another tree in the earlier compile, so their trees are attached as well
+    def register(self, tree):
+        if tree.specialisation is not None:
+            self.instantiations.setdefault(tree.specialisation.key, tree.specialisation)
+
+        for child in tree.child_trees:
+            self.register(child)
+
+        for specialisation in tree.references:
+            if specialisation.key not in self.instantiations:
+                self.manager.attach(specialisation.tree)
+                self.register(specialisation.tree)
+
+    # Deduce the body of a function for a given list of argument types and return the return type. If the same
+    # instantiation has already been deduced, the cached return type is used instead of traversing the body again
+    def instantiate(self, arg_types, function_table, parent_class_type, parent_class_node):
+
+        key = self.instantiation_key(arg_types, function_table.ast_node, parent_class_type, parent_class_node)
+
+        specialisation = self.lookup(key)
+
+        if specialisation is not None:
+            return specialisation.result
+
+        with self.manager.new_child_tree(arg_types, function_table.ast_node, parent_class_type, parent_class_node) as tree:
+            # Traverse the FunctionDef
+            self.traverse(function_table.ast_node)
+
+            ret_type = self.manager.get_ret_type()
+
+        if key is not None and self.is_resolved(ret_type):
+            tree.specialisation = Specialisation(key, ret_type, tree)
+            self.instantiations[key] = tree.specialisation
+
+        return ret_type
+
 
     def recursive_compare(self, arg, annotation):
 
@@ -208,7 +340,8 @@ class _Deduction(ast.NodeVisitor):
             logger.debug("    **********")
             logger.debug("    Candidate")
             logger.debug("    **********")
-            logger.debug("    " + ast.dump(candidate.ast_node))
+            if logger.isEnabledFor(logging.DEBUG):
+                logger.debug("    " + ast.dump(candidate.ast_node))
             score = self.get_score(arg_list, candidate.ast_node)
             logger.debug("    Candidate Score: " + str(score))
             if score is not None:
@@ -222,7 +355,8 @@ class _Deduction(ast.NodeVisitor):
             raise "A suitable candidate could not be found"
 
         logger.debug("Best score: " + str(best_score))
-        logger.debug("Best Candidate: " + str(ast.dump(best_choice.ast_node)))
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("Best Candidate: " + str(ast.dump(best_choice.ast_node)))
 
         return best_choice
 
@@ -296,6 +430,9 @@ class _Deduction(ast.NodeVisitor):
             return m_types.Bytes()
 
 
+        # Adding or changing a definition with this name may change how the call resolves
+        self.manager.depend(node.id)
+
         if node.id in self.whole_table:
 
             table_entry = self.whole_table[node.id]
@@ -312,12 +449,7 @@ class _Deduction(ast.NodeVisitor):
                     # Get the function table entry for the function being called
                     function_table = self.match_function(arg_types, table_entry)
 
-                    with self.manager.new_child_tree(arg_types, function_table.ast_node, None, None):
-
-                        # Traverse the FunctionDef
-                        self.traverse(function_table.ast_node)
-
-                        ret_type = self.manager.get_ret_type()
+                    ret_type = self.instantiate(arg_types, function_table, None, None)
 
                     self.manager.substitute_node(node, custom_nodes.MyCall(node.id, node.args, arg_types))
 
@@ -333,24 +465,36 @@ class _Deduction(ast.NodeVisitor):
                 # Get the function table entry for the __init__ function of the class being constructed
                 function_table = self.match_function(arg_types, class_entry["__init__"])
 
-                with self.manager.new_child_tree(arg_types, function_table.ast_node, None, class_entry.node):
+                key = self.instantiation_key(arg_types, function_table.ast_node, None, class_entry.node)
+
+                specialisation = self.lookup(key)
+
+                if specialisation is not None:
+                    usr_class = specialisation.result
+                else:
+
+                    with self.manager.new_child_tree(arg_types, function_table.ast_node, None, class_entry.node) as tree:
+
+                        # Traverse the FunctionDef
+                        self.traverse(function_table.ast_node)
 
-                    # Traverse the FunctionDef
-                    self.traverse(function_table.ast_node)
+                        m = self.manager.get_map()
 
-                    m = self.manager.get_map()
+                        member_var_types = []
 
-                    member_var_types = []
+                        for mem in self.whole_table[node.id].member_variables:
+                            member_var_types.append(ir.Member("self." + mem.name, m["self." + mem.name]))
 
-                    for mem in self.whole_table[node.id].member_variables:
-                        member_var_types.append(ir.Member("self." + mem.name, m["self." + mem.name]))
+                        usr_class = m_types.UserClass(node.id, member_var_types)
 
-                    usr_class = m_types.UserClass(node.id, member_var_types)
+                        logger.debug("Arg types")
+                        logger.debug(arg_types)
 
-                    logger.debug("Arg types")
-                    logger.debug(arg_types)
+                        self.manager.set_parent_class_type(usr_class)
 
-                    self.manager.set_parent_class_type(usr_class)
+                    if key is not None and self.is_resolved(usr_class):
+                        tree.specialisation = Specialisation(key, usr_class, tree)
+                        self.instantiations[key] = tree.specialisation
 
                 self.manager.substitute_node(node, custom_nodes.ConstructorCall(usr_class, node.args, arg_types))
 
@@ -363,9 +507,7 @@ class _Deduction(ast.NodeVisitor):
 
                     print(function_table_del)
 
-                    with self.manager.new_child_tree([], function_table_del.ast_node, usr_class, class_entry.node):
-                        # Traverse the FunctionDef
-                        self.traverse(function_table_del.ast_node)
+                    self.instantiate([], function_table_del, usr_class, class_entry.node)
 
 
                 return usr_class
@@ -385,7 +527,7 @@ class _Deduction(ast.NodeVisitor):
 
         print(node.id)
 
-        if m_types.BuiltInClass(node.id) in parse_template.built_in_classes:
+        if m_types.BuiltInClass(node.id) in parse_template.built_in_classes():
             arg_types = self.traverse(node.args)
 
             self.manager.substitute_node(node, custom_nodes.BuiltInClassConstructor(node.id, node.args, arg_types))
@@ -409,14 +551,11 @@ class _Deduction(ast.NodeVisitor):
 
         user_class = self.manager.get_parent_class_type()
 
+        self.manager.depend(user_class.identifier)
         class_table = self.whole_table[user_class.identifier]
         function_table = self.match_function(arg_types, class_table[node.id])
 
-        with self.manager.new_child_tree(arg_types, function_table.ast_node, user_class, class_table.node):
-            # Traverse the FunctionDef
-            self.traverse(function_table.ast_node)
-
-            ret_type = self.manager.get_ret_type()
+        ret_type = self.instantiate(arg_types, function_table, user_class, class_table.node)
 
         self.manager.substitute_node(node, custom_nodes.SelfMemberFunction(node.id, node.args, arg_types))
 
@@ -463,7 +602,7 @@ class _Deduction(ast.NodeVisitor):
 
         # Expression is a built-in type, so to get the return type we look to the built_in_returns map
 
-        b = parse_template.bim.get_item(type(ex_type), node.id, arg_types)
+        b = parse_template.built_ins().get_item(type(ex_type), node.id, arg_types)
 
         # If the lookup returns a string, this represents an associated type. We access this type via getattr on the extype:
         if type(b) is str:
@@ -504,21 +643,18 @@ class _Deduction(ast.NodeVisitor):
                 return m_types.ID()
 
             class_name = ex_type.identifier
+            self.manager.depend(class_name)
             class_table = self.whole_table[class_name]
             function_table = self.match_function(arg_types, class_table[node.id])
 
-            with self.manager.new_child_tree(arg_types, function_table.ast_node, ex_type, class_table.node):
-                # Traverse the FunctionDef
-                self.traverse(function_table.ast_node)
-
-                ret_type = self.manager.get_ret_type()
+            ret_type = self.instantiate(arg_types, function_table, ex_type, class_table.node)
 
             self.manager.substitute_node(node, custom_nodes.MemberFunction(node.exp, node.id, node.args, arg_types, ex_type))
 
             return ret_type
         elif type(ex_type) is m_types.BuiltInClass:
 
-            b = parse_template.built_in_classes.get_item(ex_type, node.id, arg_types)
+            b = parse_template.built_in_classes().get_item(ex_type, node.id, arg_types)
 
             self.manager.substitute_node(node, custom_nodes.MemberFunction(node.exp, node.id, node.args,
                                                                             arg_types, ex_type))
@@ -580,6 +716,7 @@ class _Deduction(ast.NodeVisitor):
 
         if type(node.target) is ast.Name:
             ex_type = self.traverse(node.iter)
+            self.manager.substitute_node(node, custom_nodes.TypedFor(node.target, node.iter, node.body, ex_type))
             logger.warning("Must add expr_type to MemberFunction")
             self.manager.insert_symbol(node.target.id, self.traverse(custom_nodes.MemberFunction(node.iter, "__next__", [])).contained_type)
         else:
@@ -52,4 +52,22 @@ class VariableUsedBeforeAssignment(Exception):
         self.variable_id = variable_id
 
     def __str__(self):
-        return f"Variable '{self.variable_id}' is used before it is assigned to"
\ No newline at end of file
+        return f"Variable '{self.variable_id}' is used before it is assigned to"
+
+class CargoBuildFailed(Exception):
+
+    def __init__(self, workspace, returncode):
+        self.workspace = workspace
+        self.returncode = returncode
+
+    def __str__(self):
+        return f"Cargo build failed in '{self.workspace}' with return code {self.returncode}"
+
+
+class DuplicateClassDeclaration(Exception):
+
+    def __init__(self, name):
+        self.name = name
+
+    def __str__(self):
+        return f"Class '{self.name}' is declared more than once"
@@ -0,0 +1,158 @@
+import ast
+import logging
+
+import ir
+import liveness
+import mangle
+
+logger = logging.getLogger(__name__)
+
+
+# Construct objects that cannot outlive the expression or function constructing them as plain Rust values, rather
+# than on the heap (see cycles.choose_storage). An object constructed by an ir.ClassConstructor does not escape if it
+# is only ever used to call member functions on, or to iterate over, either directly or through a local variable
+# assigned it once. Using it in any other way (as an argument, a return value, a value stored in a member or a
+# container, or assigned to another variable) may share it, as may calling a member function that uses 'self' on its
+# own (ir.SolitarySelf), directly or through the member functions it calls. A member function that only returns self,
+# such as the __iter__ of an iterator, returns the same object, so its result is followed instead.
+#
+# Each function is given 'on_stack', the set of constructors evaluated by value, and of the reads of the local
+# variables holding them and the calls returning them, which are used in place. Each constructor of a class
+# constructed by value somewhere is given 'by_value', so a constructor returning the object by value is emitted for
+# it. Returns the number of constructors evaluated by value.
+def stack_allocate(module: ir.Module):
+    functions = list(module.functions)
+
+    for c in module.classes:
+        functions.extend(c.functions)
+
+    classes = {mangle.mangle(c): c for c in module.classes if type(c) is not ir.StackClassDef}
+    sharing = {name: (_sharing(c), _identities(c)) for name, c in classes.items()}
+
+    constructed = set()
+    count = 0
+
+    for f in functions:
+        f.on_stack = frozenset(_Escape(f, sharing).on_stack)
+
+        for node in f.on_stack:
+            if type(node) is ir.ClassConstructor:
+                constructed.add((mangle.mangle(node.usr_class), mangle.mangle(ir.FunctionDef("__init__", node.types))))
+                count += 1
+
+    for name, c in classes.items():
+        for f in c.functions:
+            if type(f) is ir.InitFunctionDef:
+                f.by_value = (name, mangle.mangle(f)) in constructed
+
+    logger.debug(f"Constructed {count} objects by value")
+
+    return count
+
+
+# Returns the mangled names of the member functions of 'c' that use 'self' on its own, directly or through the member
+# functions they call
+def _sharing(c):
+    calls = {}
+    sharing = set()
+
+    for f in c.functions:
+        name = mangle.mangle(f)
+        calls[name] = set()
+
+        for node in ast.walk(f):
+            if type(node) is ir.SolitarySelf:
+                sharing.add(name)
+            elif type(node) is ir.SelfFunction:
+                calls[name].add(mangle.mangle(node))
+
+    changed = True
+
+    while changed:
+        changed = False
+
+        for name, called in calls.items():
+            if name not in sharing and called & sharing:
+                sharing.add(name)
+                changed = True
+
+    return sharing
+
+
+# Returns the mangled names of the member functions of 'c' that only return self
+def _identities(c):
+    return {mangle.mangle(f) for f in c.functions
+            if len(f.body) == 1 and type(f.body[0]) is ir.Return and type(f.body[0].expr) is ir.SolitarySelf}
+
+
+# Finds the objects constructed by one function that do not escape it, given the member functions that share 'self',
+# and those that return it, of each class not already stored by value
+class _Escape:
+
+    def __init__(self, function: ir.FunctionDef, sharing):
+        self.sharing = sharing
+        self.on_stack = set()
+
+        # Maps the expressions of the function to the (node, field) holding them
+        self.holders = {}
+
+        for node in ast.walk(function):
+            for field, value in ast.iter_fields(node):
+                for element in (value if type(value) is list else [value]):
+                    if isinstance(element, ir.Expression):
+                        self.holders[element] = node, field
+
+        bindings = liveness.Bindings(function)
+        reads = {}
+
+        for node, binding in bindings.bindings.items():
+            reads.setdefault(binding, []).append(node)
+
+        for node in self.holders:
+            if type(node) is not ir.ClassConstructor or mangle.mangle(node.usr_class) not in self.sharing:
+                continue
+
+            shares = self.sharing[mangle.mangle(node.usr_class)]
+            holder, field = self.holders[node]
+            calls = self.used_in_place(node, shares)
+
+            if calls is not None:
+                self.on_stack.add(node)
+                self.on_stack.update(calls)
+            elif type(holder) is ir.LetAssign and field == "value" and holder.target in bindings.bindings:
+                binding = bindings[holder.target]
+
+                if binding in bindings.opaque or bindings.assignments.get(binding) != [holder]:
+                    continue
+
+                uses = [n for n in reads[binding] if n is not holder.target]
+                calls = [self.used_in_place(n, shares) for n in uses]
+
+                if None not in calls:
+                    self.on_stack.add(node)
+                    self.on_stack.update(uses)
+
+                    for c in calls:
+                        self.on_stack.update(c)
+
+    # Returns the calls returning the object 'node' evaluates to if it is only used in place, as the receiver of member
+    # functions that do not share 'self' or as the iterator of a for loop, given the member functions of its class that
+    # share 'self' and that return it. Returns None if it may escape
+    def used_in_place(self, node, shares):
+        sharing, identities = shares
+
+        if node not in self.holders:
+            return None
+
+        holder, field = self.holders[node]
+
+        if type(holder) is ir.UserClassMemberFunction and field == "expr":
+            if mangle.mangle(holder) in identities:
+                calls = self.used_in_place(holder, shares)
+                return None if calls is None else [holder] + calls
+
+            return [] if mangle.mangle(holder) not in sharing else None
+        elif type(holder) is ir.For and field == "iterator":
+            return [] if mangle.mangle(ir.FunctionDef("__next__", [])) not in sharing else None
+
+        return None
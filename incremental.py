@@ -0,0 +1,130 @@
+import ast
+import hashlib
+
+import sugar
+
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+# Fingerprint of a top level function or class: a digest of its AST, without source positions. Sugaring is a pure
+# function of the definition, so the fingerprint of the parsed definition identifies the sugared definition as well,
+# and unchanged definitions do not need to be sugared again
+def fingerprint(node):
+    return hashlib.sha256(ast.dump(node, include_attributes=False).encode()).hexdigest()
+
+
+# State kept between compiles of successive versions of one program, so an edit only recompiles what it affects.
+#
+# Every top level function and class is fingerprinted. A definition whose fingerprint is unchanged keeps its sugared
+# AST node from the previous compile, and since deduction identifies instantiations by their AST node, the
+# Specialisations deduced for it can be reused along with their type trees. The IR each tree was translated to is kept
+# in the tree, and the Rust emitted for each IR function in 'rust'.
+#
+# A Specialisation is only reused if every top level name looked up while deducing it, directly or through the
+# functions it called, still names definitions with the same fingerprints. Editing a function therefore re-deduces
+# its own specialisations and those of the functions that call it, directly or indirectly, while calls from those back
+# into unchanged functions are still reused.
+class State:
+
+    def __init__(self):
+        # Maps fingerprints to the sugared definitions of the last successful compile
+        self.definitions = {}
+
+        # The definitions of the compile in progress, kept in 'definitions' once it succeeds
+        self.pending = {}
+
+        # Maps the names of top level definitions in the program being compiled to the fingerprints of the definitions
+        # with that name, in order
+        self.signatures = {}
+
+        # Maps instantiation keys to the Specialisations of the last successful compile
+        self.specialisations = {}
+
+        # Maps IR function definitions to the primitive lowering and class storage they were emitted with and the Rust
+        # emitted for them
+        self.rust = {}
+
+        # The standard library the last program was compiled against
+        self.prelude = None
+
+        self.reused_definitions = 0
+        self.reused_specialisations = 0
+
+    # Sugar the top level definitions of 'module' in place, reusing the sugared nodes of unchanged definitions. The
+    # program is compiled against 'std', a prelude.Prelude, and if that changes nothing deduced before is reused
+    def sugar(self, module: ast.Module, std=None):
+        if std is not self.prelude:
+            self.prelude = std
+            self.specialisations = {}
+
+        self.pending = {}
+        self.signatures = {}
+        self.reused_definitions = 0
+
+        body = []
+
+        for statement in module.body:
+            f = fingerprint(statement)
+
+            previous = self.definitions.get(f, [])
+            defined = self.pending.setdefault(f, [])
+
+            # A program may contain identical definitions (overloads cannot be identical, but a class and a function
+            # could be), so they are matched up in order
+            if len(defined) < len(previous):
+                node = previous[len(defined)]
+                self.reused_definitions += 1
+            else:
+                node = sugar.sugar(statement)
+
+            defined.append(node)
+            body.append(node)
+
+            if hasattr(statement, "name"):
+                self.signatures.setdefault(statement.name, []).append(f)
+
+        module.body = body
+
+    # The Specialisations of the last compile that are still valid for the program being compiled
+    def reusable(self):
+        return {key: s for key, s in self.specialisations.items() if self.is_current(s)}
+
+    def is_current(self, specialisation):
+        return all(self.signatures.get(name, []) == fingerprints
+                   for name, fingerprints in specialisation.signatures.items())
+
+    # Keep the definitions and Specialisations of a successfully deduced type tree for the next compile
+    def record(self, tree):
+        specialisations = {}
+        self.collect(tree, specialisations)
+
+        self.reused_specialisations = 0
+
+        for key, s in specialisations.items():
+            if self.specialisations.get(key) is s:
+                self.reused_specialisations += 1
+            else:
+                s.signatures = {name: self.signatures.get(name, []) for name in s.tree.dependencies}
+
+        logger.debug(f"Reused {self.reused_specialisations} of {len(specialisations)} specialisations")
+
+        self.definitions = self.pending
+        self.specialisations = specialisations
+
+    def collect(self, tree, specialisations):
+        if tree.specialisation is not None:
+            specialisations.setdefault(tree.specialisation.key, tree.specialisation)
+
+        for child in tree.child_trees:
+            self.collect(child, specialisations)
+
+    # Forget the Rust of IR functions that are no longer part of the program
+    def prune(self, module):
+        functions = list(module.functions)
+
+        for c in module.classes:
+            functions.extend(c.functions)
+
+        self.rust = {f: self.rust[f] for f in functions if f in self.rust}
@@ -84,9 +84,11 @@ class JoinedString(Expression):
 
     _fields = ["values"]
 
-    def __init__(self, values):
+    # 'index' numbers the f-strings of the enclosing function, and is used to name the string each is built in
+    def __init__(self, values, index=0):
         super().__init__()
         self.values = values
+        self.index = index
 
 
 class FormattedValue(Expression):
@@ -119,12 +121,14 @@ class UserClassMemberFunction(FunctionCall):
 
     _fields = ["expr", "id", "args", "types"]
 
-    def __init__(self, expr: Expression, _id: str, args: list[Expression], types):
+    # 'exp_type' is the class of 'expr', which decides how the object is reached (see cycles.choose_storage)
+    def __init__(self, expr: Expression, _id: str, args: list[Expression], types, exp_type=None):
         super().__init__()
         self.expr = expr
         self.id = _id
         self.args = args
         self.types = types
+        self.exp_type = exp_type
 
 
 class SelfFunction(FunctionCall):
@@ -233,11 +237,13 @@ class For(Statement):
 
     _fields = ["target", "iterator", "body"]
 
-    def __init__(self, target, iterator, body: list[Statement]):
+    # 'iterator_type' is the type of 'iterator', or None if it is not known
+    def __init__(self, target, iterator, body: list[Statement], iterator_type=None):
         super().__init__()
         self.target = target
         self.iterator = iterator
         self.body = body
+        self.iterator_type = iterator_type
 
 
 class Return(Statement):
@@ -0,0 +1,327 @@
+import ast
+import logging
+
+import ir
+import mangle
+
+logger = logging.getLogger(__name__)
+
+
+# Remove the clones of variables that are not needed again. Every read of a local variable is translated to an
+# ir.CloneIdentifier, and of a member to a cloning ir.SelfVariable. A liveness analysis over each function finds the
+# reads after which a local is dead, and these move the variable instead of cloning it. Reads that the callee only
+# borrows (the receiver of a member function, or a formatted value) borrow the variable rather than clone it. Returns
+# the number of clones removed.
+#
+# Each function is analysed on its own, and analysing a function again leaves it unchanged, so IR reused from an
+# earlier compile can be passed through again.
+def eliminate_clones(module: ir.Module):
+    functions = list(module.functions)
+
+    for c in module.classes:
+        functions.extend(c.functions)
+
+    removed = 0
+
+    for function in functions:
+        removed += _Liveness(function).run()
+
+    logger.debug(f"Removed {removed} clones")
+
+    return removed
+
+
+# Returns the (holder, key, node) of every read of a local variable in the expression 'holder[key]' (or
+# 'holder.key' if holder is a node), in evaluation order. Only expressions are searched, not the types they refer to
+def references(holder, key):
+    node = holder[key] if type(holder) is list else getattr(holder, key)
+
+    if type(node) is ir.CloneIdentifier or type(node) is ir.Identifier:
+        yield holder, key, node
+    elif isinstance(node, ir.Expression):
+        for field, value in ast.iter_fields(node):
+            if type(value) is list:
+                for i, element in enumerate(value):
+                    if isinstance(element, ir.Expression):
+                        yield from references(value, i)
+            elif isinstance(value, ir.Expression):
+                yield from references(node, field)
+
+
+# Returns the number of reads of 'self' in the expression 'node': member variables, member functions and self itself
+def _self_references(node):
+    count = 0
+
+    if type(node) in (ir.SelfVariable, ir.SelfFunction, ir.SolitarySelf):
+        count += 1
+
+    for field, value in ast.iter_fields(node):
+        for element in (value if type(value) is list else [value]):
+            if isinstance(element, ir.Expression):
+                count += _self_references(element)
+
+    return count
+
+
+# The bindings of the local variables of one function.
+#
+# Rust scopes a 'let' to its block and allows it to shadow a variable of an enclosing block, and the translator emits
+# a new 'let' when a variable is assigned a value of a different type. A name may therefore refer to different
+# variables in different parts of a function, so analyses of local variables work on bindings rather than names.
+class Bindings:
+
+    def __init__(self, function: ir.FunctionDef):
+        # Maps the IR nodes reading or assigning a local variable to its binding, a (name, number) pair. Names that are
+        # not locals of the function have the number 0
+        self.bindings = {}
+        self.count = 0
+
+        # Maps bindings to the LetAssign and Reassign statements assigning them
+        self.assignments = {}
+
+        # Bindings that are assigned other than by a statement in 'assignments': arguments, for loop targets and the
+        # elements of tuple targets
+        self.opaque = set()
+
+        scope = {}
+
+        for arg in function.args:
+            self.count += 1
+            scope[arg.id] = arg.id, self.count
+            self.opaque.add(scope[arg.id])
+
+        # The body is resolved in the scope of the arguments, so 'scope' ends up holding the bindings of the body
+        for s in function.body:
+            self.resolve_statement(s, [scope])
+
+        self.scope = scope
+
+    def __getitem__(self, node):
+        return self.bindings[node]
+
+    def bind(self, scopes, node, statement=None):
+        if type(node) is ir.Identifier or type(node) is ir.CloneIdentifier:
+            self.count += 1
+            scopes[-1][node.id] = node.id, self.count
+            self.bindings[node] = scopes[-1][node.id]
+            self.assign(node, statement)
+        elif type(node) is ir.Tuple or type(node) is ir.IRTuple:
+            for element in node.elements:
+                self.bind(scopes, element)
+
+    def resolve(self, scopes, node, statement=None):
+        if type(node) is ir.Identifier or type(node) is ir.CloneIdentifier:
+            self.bindings[node] = node.id, 0
+
+            for scope in reversed(scopes):
+                if node.id in scope:
+                    self.bindings[node] = scope[node.id]
+                    break
+        elif type(node) is ir.Tuple or type(node) is ir.IRTuple:
+            for element in node.elements:
+                self.resolve(scopes, element)
+                self.assign(element, None)
+
+    def assign(self, node, statement):
+        if statement is not None:
+            self.assignments.setdefault(self.bindings[node], []).append(statement)
+        elif node in self.bindings:
+            self.opaque.add(self.bindings[node])
+
+    def resolve_expression(self, scopes, holder, key):
+        for _, _, node in references(holder, key):
+            self.resolve(scopes, node)
+
+    def resolve_block(self, statements, scopes):
+        scopes.append({})
+
+        for s in statements:
+            self.resolve_statement(s, scopes)
+
+        scopes.pop()
+
+    def resolve_statement(self, s, scopes):
+        t = type(s)
+
+        if t is ir.LetAssign:
+            self.resolve_expression(scopes, s, "value")
+            self.bind(scopes, s.target, s)
+        elif t is ir.Reassign:
+            self.resolve_expression(scopes, s, "value")
+            self.resolve(scopes, s.target)
+
+            if type(s.target) is ir.Identifier or type(s.target) is ir.CloneIdentifier:
+                self.assign(s.target, s)
+        elif t is ir.Expr or t is ir.Return:
+            if s.expr is not None:
+                self.resolve_expression(scopes, s, "expr")
+        elif t is ir.IfElse:
+            self.resolve_expression(scopes, s, "condition")
+            self.resolve_block(s.if_block, scopes)
+            self.resolve_block(s.else_block or [], scopes)
+        elif t is ir.While:
+            self.resolve_expression(scopes, s, "condition")
+            self.resolve_block(s.body, scopes)
+        elif t is ir.For:
+            self.resolve_expression(scopes, s, "iterator")
+            scopes.append({})
+            self.bind(scopes, s.target)
+            self.resolve_block(s.body, scopes)
+            scopes.pop()
+
+
+# Liveness of the local variables of one function, computed over their Bindings
+class _Liveness:
+
+    def __init__(self, function: ir.FunctionDef):
+        self.function = function
+        self.bindings = Bindings(function)
+
+        # The live bindings at the targets of 'break' and 'continue' in the innermost loop
+        self.breaks = []
+        self.continues = []
+
+        # Whether reads are marked as moves, which is only done once the liveness of every loop has been found
+        self.annotate = True
+        self.moves = []
+        self.borrows = []
+
+    def run(self):
+        # A constructor builds Self from the members assigned in its body once the body has finished
+        live = set()
+
+        if type(self.function) is ir.InitFunctionDef:
+            for member in self.function.member_list:
+                name = mangle.mangle(mangle.MemberVariable(member))
+                live.add(self.bindings.scope.get(name, (name, 0)))
+
+        self.block(self.function.body, live)
+
+        for holder, key in self.moves:
+            node = holder[key] if type(holder) is list else getattr(holder, key)
+            identifier = ir.Identifier(node.id)
+
+            if type(holder) is list:
+                holder[key] = identifier
+            else:
+                setattr(holder, key, identifier)
+
+        for node in self.borrows:
+            node.to_clone = False
+
+        return len(self.moves) + len(self.borrows)
+
+    # Liveness, in reverse program order. Each method takes the bindings live after a statement and returns those live
+    # before it
+
+    def block(self, statements, live):
+        for s in reversed(statements):
+            live = self.statement(s, live)
+
+        return live
+
+    def statement(self, s, live):
+        t = type(s)
+
+        if t is ir.LetAssign or t is ir.Reassign:
+            return self.use(s, "value", live - self.defined(s.target))
+        elif t is ir.Expr:
+            return self.use(s, "expr", live)
+        elif t is ir.Return:
+            return self.use(s, "expr", set()) if s.expr is not None else set()
+        elif t is ir.IfElse:
+            branches = self.block(s.if_block, live) | self.block(s.else_block or [], live)
+            return self.use(s, "condition", branches)
+        elif t is ir.While:
+            return self.fixpoint(lambda head: self.use(s, "condition", live | self.loop(s.body, head, live)), live)
+        elif t is ir.For:
+            head = self.fixpoint(lambda head: live | (self.loop(s.body, head, live) - self.defined(s.target)), live)
+            return self.use(s, "iterator", head)
+        elif t is ir.Break:
+            return set(self.breaks[-1])
+        elif t is ir.Continue:
+            return set(self.continues[-1])
+        else:
+            return live
+
+    def defined(self, target):
+        if type(target) is ir.Identifier or type(target) is ir.CloneIdentifier:
+            return {self.bindings[target]}
+        elif type(target) is ir.Tuple or type(target) is ir.IRTuple:
+            return set().union(*(self.defined(element) for element in target.elements))
+        else:
+            return set()
+
+    def loop(self, body, head, after):
+        self.breaks.append(after)
+        self.continues.append(head)
+
+        live = self.block(body, head)
+
+        self.breaks.pop()
+        self.continues.pop()
+
+        return live
+
+    # Returns the bindings live at the head of a loop, given by the least fixed point of 'step', which maps the
+    # bindings live at the head to those live before it
+    def fixpoint(self, step, head):
+        annotate, self.annotate = self.annotate, False
+
+        while True:
+            before = step(head)
+
+            if before == head:
+                break
+
+            head = before
+
+        self.annotate = annotate
+
+        if annotate:
+            step(head)
+
+        return head
+
+    # Returns the bindings live before the expression 'holder.key', given those live after it, marking the reads that
+    # can move or borrow instead of cloning
+    def use(self, holder, key, live):
+        reads = list(references(holder, key))
+        bindings = [self.bindings[node] for _, _, node in reads]
+
+        if self.annotate:
+            expression = getattr(holder, key)
+
+            for (h, k, node), binding in zip(reads, bindings):
+                # A variable read elsewhere in the same expression may be borrowed while this read is evaluated, so
+                # it cannot be moved. The iterator of a for loop is borrowed for the whole loop, so is never moved
+                if type(node) is not ir.CloneIdentifier or bindings.count(binding) > 1 or type(h) is ir.For:
+                    continue
+
+                if binding not in live or type(h) is ir.FormattedValue:
+                    self.moves.append((h, k))
+
+            self.borrow_members(expression)
+
+        return live | set(bindings)
+
+    # The receiver of a member function is borrowed by the call, so a member variable does not need to be cloned to
+    # call a function on it, unless the expression borrows self elsewhere
+    def borrow_members(self, expression):
+        if _self_references(expression) != 1:
+            return
+
+        for node in _expressions(expression):
+            if type(node) is ir.BuiltInMemberFunction or type(node) is ir.UserClassMemberFunction:
+                if type(node.expr) is ir.SelfVariable and node.expr.to_clone:
+                    self.borrows.append(node.expr)
+
+
+# Yields 'node' and every expression within it
+def _expressions(node):
+    yield node
+
+    for field, value in ast.iter_fields(node):
+        for element in (value if type(value) is list else [value]):
+            if isinstance(element, ir.Expression):
+                yield from _expressions(element)
@@ -1,35 +1,156 @@
 from collections import OrderedDict
 import ast
+import weakref
 
 import ir
 import mangle
 
 
+# Converts the arguments of a type constructor into a hashable key. Child types are identified by identity, which is
+# only valid because the key is only used when every child is itself a canonical (interned) type
+def _freeze(value):
+    if isinstance(value, (list, tuple)):
+        return tuple(_freeze(v) for v in value)
+    elif isinstance(value, ir.Member):
+        return value.id, _freeze(value.annotation)
+    elif isinstance(value, MType):
+        return id(value)
+    else:
+        return value
+
+
+# Metaclass that hash-conses types. Calling a type constructor such as Integer() or Vector(Integer()) returns the one
+# canonical instance for that structure. Types that contain an Unknown can still change once the Unknown is filled, so
+# these are never interned and a new object is returned each time.
+#
+# Instances are held weakly, so a long running process (the daemon, or the watcher) does not keep every type of every
+# program it has compiled. An interned type holds its children, so the identities in the key of a live instance cannot
+# be reused by another type.
+class _Interned(type):
+
+    def __init__(cls, name, bases, namespace):
+        super().__init__(name, bases, namespace)
+        cls._instances = weakref.WeakValueDictionary()
+
+    def __call__(cls, *args):
+        if not cls._interned:
+            return super().__call__(*args)
+
+        key = _freeze(args)
+
+        try:
+            return cls._instances[key]
+        except KeyError:
+            pass
+        except TypeError:
+            # Unhashable constructor arguments, cannot be interned
+            return super().__call__(*args)
+
+        instance = super().__call__(*args)
+
+        if instance.is_closed():
+            cls._instances[key] = instance
+
+        return instance
+
+
 # The following classes represent all the 'types' that Mylang objects can be
 
-class MType(ast.AST):
+class MType(metaclass=_Interned):
+
+    __slots__ = ("_hash", "_closed", "__weakref__")
+
+    _fields = []
+
+    _interned = True
+
+    def __init__(self, *args):
+        for field, value in zip(self._fields, args):
+            if isinstance(value, list):
+                value = tuple(value)
+            object.__setattr__(self, field, value)
+
+        object.__setattr__(self, "_hash", None)
+        object.__setattr__(self, "_closed", all(c.is_closed() for c in self.components()))
+
+    def __setattr__(self, key, value):
+        raise AttributeError(f"{type(self).__name__} is immutable")
+
+    def __reduce__(self):
+        return type(self), tuple(getattr(self, f) for f in self._fields)
+
     def __hash__(self):
+        if self._closed:
+            if self._hash is None:
+                object.__setattr__(self, "_hash", hash(mangle.mangle(self)))
+            return self._hash
+
         return hash(mangle.mangle(self))
 
     def __eq__(self, other):
+        if self is other:
+            return True
+
+        if not isinstance(other, MType):
+            return NotImplemented
+
+        # Interned types are canonical, so two distinct closed types can never be equal
+        if self.is_closed() and other.is_closed():
+            return False
+
         return mangle.mangle(self) == mangle.mangle(other)
 
+    def __repr__(self):
+        return f"{type(self).__name__}({', '.join(f'{f}={_repr_field(getattr(self, f))}' for f in self._fields)})"
+
+    # Returns true if the type contains no Unknowns, in which case it is the canonical instance for its structure
+    def is_closed(self):
+        return self._closed
+
+    # Yields the types directly contained within this type
+    def components(self):
+        for field in self._fields:
+            value = getattr(self, field)
+            for v in (value if isinstance(value, tuple) else (value,)):
+                if isinstance(v, ir.Member):
+                    v = v.annotation
+                if isinstance(v, MType):
+                    yield v
+
     def get_type(self):
         return self
 
 
+def _repr_field(value):
+    if isinstance(value, ast.AST):
+        return ast.dump(value)
+    elif isinstance(value, tuple):
+        return "[" + ", ".join(_repr_field(v) for v in value) + "]"
+    elif isinstance(value, type):
+        return value.__name__
+    else:
+        return repr(value)
+
+
 # Convenience function. Used when the type is not immediately know, for example when declaring an empty array the
 # type would be Vector(Unknown)
 class Unknown(MType):
 
+    __slots__ = ("_inner", "deductor", "_depends")
+
     _fields = []
 
+    _interned = False
+
     class Dependant:
         def __init__(self, unknown, node, arg_types):
             self.unknown = unknown
             self.node = node
             self.arg_types = arg_types
 
+    # Unknowns are the only mutable types, they are filled in as deduction progresses
+    __setattr__ = object.__setattr__
+
     def __init__(self, deductor, inner=None):
         self._inner = inner
         self.deductor = deductor
@@ -56,6 +177,16 @@ class Unknown(MType):
     def __hash__(self):
         return hash(id(self))
 
+    def __reduce__(self):
+        raise TypeError("Unknown types cannot be serialised")
+
+    def is_closed(self):
+        return False
+
+    def components(self):
+        if self._inner is not None:
+            yield self._inner
+
     def has_inner(self):
         return self._inner is not None
 
@@ -64,7 +195,7 @@ class Unknown(MType):
 
     def __repr__(self):
         if self._inner:
-            return f"Unknown({ast.dump(self._inner)})"
+            return f"Unknown({repr(self._inner)})"
         else:
             return "Unknown()"
 
@@ -79,35 +210,47 @@ class Unknown(MType):
 
 class Boolean(MType):
 
+    __slots__ = ()
+
     _fields = []
 
 
 class Integer(MType):
 
+    __slots__ = ()
+
     _fields = []
 
 
 class Char(MType):
 
+    __slots__ = ()
+
     _fields = []
 
 
 class Floating(MType):
 
+    __slots__ = ()
+
     _fields = []
 
 
 class ID(MType):
 
+    __slots__ = ()
+
     _fields = []
 
 
 class Ntuple(MType):
 
+    __slots__ = ("tuple_types",)
+
     _fields = ["tuple_types"]
 
     def __init__(self, tuple_types):
-        self.tuple_types = tuple_types
+        super().__init__(tuple_types)
 
     def get_type(self):
         return Ntuple([x.get_type() for x in self.tuple_types])
@@ -115,10 +258,12 @@ class Ntuple(MType):
 
 class Vector(MType):
 
+    __slots__ = ("element_type",)
+
     _fields = ["element_type"]
 
     def __init__(self, element_type: MType):
-        self.element_type = element_type
+        super().__init__(element_type)
 
     def get_type(self):
         return Vector(self.element_type.get_type())
@@ -126,21 +271,26 @@ class Vector(MType):
 
 class String(MType):
 
+    __slots__ = ()
+
     _fields = []
 
 
 class Bytes(MType):
 
+    __slots__ = ()
+
     _fields = []
 
 
 class Dictionary(MType):
 
+    __slots__ = ("key_type", "value_type")
+
     _fields = ["key_type", "value_type"]
 
     def __init__(self, key_type: MType, value_type: MType):
-        self.key_type = key_type
-        self.value_type = value_type
+        super().__init__(key_type, value_type)
 
     def get_type(self):
         return Dictionary(self.key_type.get_type(), self.value_type.get_type())
@@ -148,10 +298,12 @@ class Dictionary(MType):
 
 class DynamicSet(MType):
 
+    __slots__ = ("element_type",)
+
     _fields = ["element_type"]
 
     def __init__(self, element_type: MType):
-        self.element_type = element_type
+        super().__init__(element_type)
 
     def get_type(self):
         return DynamicSet(self.element_type.get_type())
@@ -159,10 +311,12 @@ class DynamicSet(MType):
 
 class Option(MType):
 
+    __slots__ = ("contained_type",)
+
     _fields = ["contained_type"]
 
     def __init__(self, contained_type: MType):
-        self.contained_type = contained_type
+        super().__init__(contained_type)
 
     def get_type(self):
         return Option(self.contained_type.get_type())
@@ -170,11 +324,12 @@ class Option(MType):
 
 class Result(MType):
 
+    __slots__ = ("ok_type", "err_type")
+
     _fields = ["ok_type", "err_type"]
 
     def __init__(self, ok_type: MType, err_type: MType):
-        self.ok_type = ok_type
-        self.err_type = err_type
+        super().__init__(ok_type, err_type)
 
     def get_type(self):
         return Result(self.ok_type.get_type(), self.err_type.get_type())
@@ -183,31 +338,29 @@ class Result(MType):
 # Used when no annotation is provided for a type, and can match any type
 class WildCard(MType):
 
+    __slots__ = ()
+
     _fields = []
 
 
 # Represents a code-generated user class complete with mangled name and dictionary of variable names to types
 class UserClass(MType):
 
+    __slots__ = ("identifier", "member_types")
+
     _fields = ["identifier", "member_types"]
 
     def __init__(self, identifier, member_types):
-        self.identifier = identifier
-        self.member_types = member_types
+        super().__init__(identifier, member_types)
 
 class BuiltInClass(MType):
 
-    _fields = []
-
-    def __init__(self, class_name):
-        super().__init__()
-        self.class_name = class_name
+    __slots__ = ("class_name",)
 
-    def __hash__(self):
-        return hash(hash("built_in_class") ^ hash(self.class_name))
+    _fields = ["class_name"]
 
-    def __eq__(self, other):
-        return type(self) == type(other) and self.class_name == other.class_name
+    def __init__(self, class_name):
+        super().__init__(class_name)
 
     def __repr__(self):
         return f"BuiltInClass({repr(self.class_name)})"
\ No newline at end of file
@@ -9,6 +9,14 @@ class MemberVariable:
     def __init__(self, id):
         self.id = id
 
+
+# A temporary variable introduced by the compiler. 'index' counts the temporaries of one kind in the enclosing
+# function, so a temporary's name does not change when code elsewhere in the program is edited
+class Temporary:
+    def __init__(self, kind, index):
+        self.kind = kind
+        self.index = index
+
 def mangle(obj):
 
     # Following segment allows us to prevent mangling in certain special cases (main function for example)
@@ -225,17 +233,21 @@ class _Mangle:
     def visit_ClassDef(self, node):
         self.generic_class(node.name, node.member_map)
 
+    def visit_CyclicClassDef(self, node):
+        self.generic_class(node.name, node.member_map)
+
     def visit_AcyclicClassDef(self, node):
         self.generic_class(node.name, node.member_map)
 
     def visit_StackClassDef(self, node):
         self.generic_class(node.name, node.member_map)
 
-    def visit_Assign(self, node):
-        self.generic_variable(["assign", "var", "mangled"], id(node))
+    # Temporaries are numbered within their function, so identical functions always produce identical names
+    def visit_Temporary(self, node):
+        self.generic_variable([node.kind, "var", "mangled"], node.index)
 
     def visit_JoinedString(self, node):
-        self.generic_variable(["formatted_value", "var", "mangled"], id(node))
+        self.generic_variable(["formatted_value", "var", "mangled"], node.index)
 
     def generic_memberassign(self, id):
         # Here we use a 'unique' value of 0 because the name [self, node.id] is enough to guarantee uniqueness
@@ -287,7 +299,16 @@ def mangler_test_function(obj, verbose=False):
         return mangled
 
 
+# Set once the mangler tests have passed. The mangler cannot change while the process runs, so later calls return at once
+_tests_passed = False
+
+
 def run_mangler_tests(verbose=False):
+    global _tests_passed
+
+    if _tests_passed and not verbose:
+        return
+
     import ir
     from collections import OrderedDict
 
@@ -376,5 +397,7 @@ def run_mangler_tests(verbose=False):
 
     logger.debug("All tests passed")
 
+    _tests_passed = True
+
 
 
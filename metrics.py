@@ -0,0 +1,126 @@
+import ast
+import time
+import tracemalloc
+from collections import OrderedDict
+from contextlib import contextmanager
+
+
+# Wall time (seconds) and peak memory (bytes) of one phase of a compilation. For phases run in this process the peak
+# memory is the peak Python heap allocated during the phase and is only recorded when memory tracing is enabled. For phases run as a child
+# process (cargo build, execution) it is the maximum resident set size of the child, where the platform reports it
+class PhaseMetrics:
+    def __init__(self, wall_time, peak_memory=None):
+        self.wall_time = wall_time
+        self.peak_memory = peak_memory
+
+    def as_dict(self):
+        return {"wall_time": self.wall_time, "peak_memory": self.peak_memory}
+
+    def __repr__(self):
+        return f"PhaseMetrics(wall_time={self.wall_time:.6f}, peak_memory={self.peak_memory})"
+
+
+# The result of compiling a Mylang program with utils.analysis. Holds the generated Rust, the metrics of each phase in
+# the order they ran, the wall time of each optimisation pass run in the post phase (see post.PASSES), size counts (AST nodes, TypeTree nodes, IR nodes, emitted Rust bytes, monomorphized functions)
+# and, if the program was built and run, the executable and its output
+class CompileResult:
+
+    def __init__(self, trace_memory=False):
+        self.trace_memory = trace_memory
+
+        self.rust = None
+        self.phases = OrderedDict()
+        self.passes = OrderedDict()
+        self.counts = OrderedDict()
+
+        # Set if the program was found in the compile cache, in which case only the execution phase was run
+        self.cache_hit = False
+
+        self.executable = None
+        self.stdout = None
+        self.stderr = None
+        self.returncode = None
+
+    # Time the body of the with statement as the phase 'name'. Tracing is started and stopped around the phase rather
+    # than for the whole compilation so the untraced phases run at full speed
+    @contextmanager
+    def phase(self, name):
+
+        started_tracing = False
+
+        if self.trace_memory:
+            if not tracemalloc.is_tracing():
+                tracemalloc.start()
+                started_tracing = True
+            tracemalloc.reset_peak()
+
+        start = time.perf_counter()
+
+        try:
+            yield
+        finally:
+            wall_time = time.perf_counter() - start
+
+            peak = None
+
+            if self.trace_memory:
+                peak = tracemalloc.get_traced_memory()[1]
+
+                if started_tracing:
+                    tracemalloc.stop()
+
+            self.phases[name] = PhaseMetrics(wall_time, peak)
+
+    # Record a phase that ran in a child process, with the child's maximum resident set size if known
+    def add_process_phase(self, name, wall_time, max_rss):
+        self.phases[name] = PhaseMetrics(wall_time, max_rss)
+
+    # Record the wall time of a pass of the post phase, which is already included in the time of that phase
+    def add_pass(self, name, wall_time):
+        self.passes[name] = PhaseMetrics(wall_time)
+
+    def count(self, name, value):
+        self.counts[name] = value
+
+    def total_time(self):
+        return sum(p.wall_time for p in self.phases.values())
+
+    def as_dict(self):
+        return {
+            "phases": {name: p.as_dict() for name, p in self.phases.items()},
+            "passes": {name: p.as_dict() for name, p in self.passes.items()},
+            "counts": dict(self.counts),
+            "total_time": self.total_time(),
+            "cache_hit": self.cache_hit,
+            "returncode": self.returncode,
+        }
+
+    def __str__(self):
+        lines = []
+
+        for name, p in self.phases.items():
+            memory = "" if p.peak_memory is None else f" {p.peak_memory / 1024:12.1f} KiB"
+            lines.append(f"{name:14} {p.wall_time * 1000:10.2f} ms{memory}")
+
+        lines.append(f"{'total':14} {self.total_time() * 1000:10.2f} ms")
+
+        for name, p in self.passes.items():
+            lines.append(f"  {name:22} {p.wall_time * 1000:10.2f} ms")
+
+        for name, value in self.counts.items():
+            lines.append(f"{name:24} {value}")
+
+        return "\n".join(lines)
+
+
+def count_nodes(node):
+    return sum(1 for _ in ast.walk(node))
+
+
+def count_type_trees(tree):
+    return 1 + sum(count_type_trees(child) for child in tree.child_trees)
+
+
+# Count the functions emitted in an IR module, one per monomorphized instantiation
+def count_functions(module):
+    return len(module.functions) + sum(len(c.functions) for c in module.classes)
@@ -3,12 +3,23 @@ import os
 import logging
 import re
 import ast
+import hashlib
+import pickle
+from contextlib import contextmanager
 
 import ir
 import m_types
 
 logger = logging.getLogger(__name__)
 
+# Directory used to store the parsed built in maps between runs
+CACHE_DIR = os.path.join(os.path.expanduser("~"), ".cache", "mylang")
+
+# Bump this whenever the parser or the types it produces change, so stale caches are discarded
+CACHE_VERSION = 1
+
+BRACE_REGEX = re.compile("[{}]")
+
 # Used to convert rust template code into a the built_in_map used to obtain return types for built in functions
 class Parser:
 
@@ -36,23 +47,116 @@ class Parser:
             return f"HashableList({repr(self.l)})"
 
 
-    def __init__(self, path):
+    def __init__(self, path, cache_dir=CACHE_DIR):
 
         self.map = {}
 
         self.path = path
 
-        for file in os.listdir(self.path):
-            print(file)
-            if os.path.isfile(self.path + "/" + file):
-                class_name = file[:-3]
+        files = self.get_files()
 
-                self.parse_file(class_name)
+        if cache_dir is not None:
+            cache_path = os.path.join(cache_dir, "template_" + hashlib.sha1(os.path.abspath(path).encode()).hexdigest()[:16] + ".pickle")
+
+            if self.load_cache(cache_path, files):
+                return
+
+        for file in files:
+            logger.debug(f"Parsing template file {file}")
+            class_name = file[:-3]
+
+            self.parse_file(class_name)
 
 
 
         self.add_exceptions()
 
+        if cache_dir is not None:
+            self.save_cache(cache_path, files)
+
+    # Returns the sorted names of the files in the template directory
+    def get_files(self):
+        return sorted(file for file in os.listdir(self.path) if os.path.isfile(os.path.join(self.path, file)))
+
+    def file_digest(self, file):
+        with open(os.path.join(self.path, file), "rb") as fh:
+            return hashlib.sha256(fh.read()).hexdigest()
+
+    # Describes the state of each file in the template as a (name, mtime, content hash) triple. Content hashes are
+    # only computed when the mtime differs from the cached entry, so an unchanged template only needs a stat per file
+    def file_stamps(self, files, cached_stamps=None):
+
+        cached = {name: (mtime, digest) for name, mtime, digest in cached_stamps or []}
+
+        stamps = []
+
+        for file in files:
+            mtime = os.stat(os.path.join(self.path, file)).st_mtime_ns
+
+            if file in cached and cached[file][0] == mtime:
+                digest = cached[file][1]
+            else:
+                digest = self.file_digest(file)
+
+            stamps.append((file, mtime, digest))
+
+        return stamps
+
+    # Attempt to fill the map from the cache at 'cache_path'. Returns False if the cache is missing or out of date
+    def load_cache(self, cache_path, files):
+
+        try:
+            with open(cache_path, "rb") as fh:
+                cache = pickle.load(fh)
+        except FileNotFoundError:
+            return False
+        except Exception as e:
+            logger.warning(f"Could not read template cache '{cache_path}' ({e}), reparsing template")
+            return False
+
+        if cache.get("version") != CACHE_VERSION:
+            return False
+
+        cached_stamps = cache["stamps"]
+
+        # A file has been added or removed
+        if [name for name, _, _ in cached_stamps] != files:
+            return False
+
+        stamps = self.file_stamps(files, cached_stamps)
+
+        # Compare names and content hashes, so a file that was touched but not modified is still a hit
+        if [(name, digest) for name, _, digest in stamps] != [(name, digest) for name, _, digest in cached_stamps]:
+            return False
+
+        self.map = cache["map"]
+
+        # Refresh the cache so the new mtimes avoid rehashing next time
+        if stamps != cached_stamps:
+            self.save_cache(cache_path, files, stamps)
+
+        logger.debug(f"Loaded built in map for '{self.path}' from cache '{cache_path}'")
+
+        return True
+
+    def save_cache(self, cache_path, files, stamps=None):
+
+        if stamps is None:
+            stamps = self.file_stamps(files)
+
+        cache = {"version": CACHE_VERSION, "stamps": stamps, "map": self.map}
+
+        try:
+            os.makedirs(os.path.dirname(cache_path), exist_ok=True)
+
+            # Write to a temporary file first so a concurrent reader never sees a partially written cache
+            tmp_path = f"{cache_path}.{os.getpid()}.tmp"
+            with open(tmp_path, "wb") as fh:
+                pickle.dump(cache, fh)
+            os.replace(tmp_path, cache_path)
+        except OSError as e:
+            logger.warning(f"Could not write template cache '{cache_path}' ({e})")
+
 
 
 
@@ -62,26 +166,27 @@ class Parser:
         #self.add_item(m_types.Integer, "__hash__", [m_types.UserClass("_Hasher", [ir.Member("self.digest", m_types.Integer())])], [])
         pass
 
-    def get_closing_brace(self, string):
+    # Find the first brace delimited block in 'string' at or after 'start'. Returns the contents of the block, the text
+    # between 'start' and the opening brace and the index just after the closing brace
+    def get_closing_brace(self, string, start=0):
         tracker = 0
-        index = 0
 
         open_brace = None
 
-        for i, ch in enumerate(string):
-            if ch == "{":
+        for m in BRACE_REGEX.finditer(string, start):
+            i = m.start()
+
+            if string[i] == "{":
 
                 if open_brace is None:
                     open_brace = i
-                    tracker += 1
-                    continue
 
                 tracker += 1
-            elif ch == "}":
+            else:
                 tracker -= 1
 
             if tracker == 0 and open_brace is not None:
-                return string[open_brace+1:i], string[:open_brace], i+1
+                return string[open_brace+1:i], string[start:open_brace], i+1
 
         return None
 
@@ -89,7 +194,7 @@ class Parser:
 
     def parse_file(self, class_name):
 
-        path = self.path + "\\" + class_name + ".rs"
+        path = os.path.join(self.path, class_name + ".rs")
 
         file_contents = ""
         with open(path) as fh:
@@ -107,21 +212,21 @@ class Parser:
             logger.error(f"Could not find impl block or '/*START PARSE HERE*/' in '{class_name}' ({path})")
             raise "see log"
 
-        inner_impl, _, _ = self.get_closing_brace(file_contents[impl:])
+        inner_impl, _, _ = self.get_closing_brace(file_contents, impl)
+
+        position = 0
 
         while True:
 
-            ret = self.get_closing_brace(inner_impl)
+            ret = self.get_closing_brace(inner_impl, position)
 
             if ret is None:
                 break
 
-            _, signature, end = ret
+            _, signature, position = ret
 
             self.parse_function(self.parse_type(class_name), ''.join(signature.split()))
 
-            inner_impl = inner_impl[end:]
-
     def parse_function(self, class_name, signature):
         r = self.parse_signature(signature)
         if r is None:
@@ -236,7 +341,7 @@ class Parser:
                 if hm in member_function_map:
                     b = member_function_map[hm]
                 else:
-                    logger.error(f"Type {class_name} has a member function {func_name} but no overload matches the signature: {[ast.dump(x) for x in hm.l]}")
+                    logger.error(f"Type {class_name} has a member function {func_name} but no overload matches the signature: {hm.l}")
                     raise "See log for info"
             else:
                 logger.error(f"Type {class_name} has no member function {func_name} in built in map")
@@ -250,12 +355,76 @@ class Parser:
     def __contains__(self, item):
         return item in self.map
 
-PATH = "E:\\Software Projects\\IntelliJ\\mylang_template\\src"
+# Root of the Rust template crate. The built in maps are parsed from its 'src/built_ins' and 'src/classes' directories
+TEMPLATE_PATH = os.environ.get("MYLANG_TEMPLATE", "E:\\Software Projects\\IntelliJ\\mylang_template")
+
+# The built in maps of one template. Parsers are created on first use rather than when the template is selected, so
+# importing the compiler does not read the template
+class Template:
+
+    def __init__(self, path):
+        self.path = path
+        self.parsers = {}
+
+    def parser(self, directory):
+        if directory not in self.parsers:
+            self.parsers[directory] = Parser(os.path.join(self.path, "src", directory))
+            logger.debug(self.parsers[directory].map)
+        return self.parsers[directory]
+
+    # Return the map of member functions implemented by the built in types (Integer, List, etc.)
+    def built_ins(self):
+        return self.parser("built_ins")
+
+    # Return the map of member functions implemented by the built in classes (Hasher, StdOut, etc.)
+    def built_in_classes(self):
+        return self.parser("classes")
+
+
+# The template used by lookups, created from TEMPLATE_PATH on first use
+_template = None
+
+
+# Set the template used by subsequent lookups, discarding any maps parsed from the previous template
+def set_template_path(path):
+    global TEMPLATE_PATH, _template
+
+    TEMPLATE_PATH = path
+    _template = None
+
+
+def get_template():
+    global _template
+
+    if _template is None:
+        _template = Template(TEMPLATE_PATH)
+
+    return _template
+
+
+def get_template_path():
+    return get_template().path
+
+
+# Use 'template' for lookups within the block, restoring the previous template afterwards
+@contextmanager
+def using(template):
+    global _template
+
+    previous = _template
+    _template = template
+
+    try:
+        yield template
+    finally:
+        _template = previous
 
-bim = Parser(PATH + "/built_ins")
 
-print(bim.map)
+# Return the map of member functions implemented by the built in types (Integer, List, etc.)
+def built_ins():
+    return get_template().built_ins()
 
-built_in_classes = Parser(PATH + "/classes")
 
-print(built_in_classes.map)
+# Return the map of member functions implemented by the built in classes (Hasher, StdOut, etc.)
+def built_in_classes():
+    return get_template().built_in_classes()
@@ -1,17 +1,72 @@
 import ast
+import logging
+import time
 
+import constants
+import cycles
+import escape
 import ir
+import liveness
+import unboxing
 
+logger = logging.getLogger(__name__)
 
-def post_processing(_ir: ir.Module):
-    p = _Post()
 
-    return p.visit(_ir)
+# An optimisation pass over the IR module. 'run' takes the ir.Module and changes it in place, or sets the attributes
+# of its nodes that rustify reads. 'attributes' names the attributes a pass sets on every function, which are removed
+# when the pass is disabled so none are left from an earlier compile of the same IR
+class Pass:
+    def __init__(self, name, run, enabled=True, attributes=()):
+        self.name = name
+        self.run = run
+        self.enabled = enabled
+        self.attributes = attributes
+
+
+# The passes run by post_processing, in order. Constants are folded and propagated first so the later passes see the
+# simplified IR, and the storage of classes is chosen before the objects that can be constructed by value are found
+PASSES = [
+    Pass("fold_constants", constants.fold_constants),
+    Pass("propagate_constants", constants.propagate_constants),
+    Pass("class_storage", cycles.choose_storage),
+    Pass("eliminate_clones", liveness.eliminate_clones),
+    Pass("lower_primitives", unboxing.lower_primitives, attributes=("natives", "native_return", "lowering")),
+    Pass("stack_allocate", escape.stack_allocate, attributes=("on_stack", "by_value")),
+]
+
+
+# Run the enabled PASSES over '_ir' in order. 'enabled' maps pass names to whether they run, overriding Pass.enabled,
+# and the wall time of each pass is recorded in the metrics.CompileResult 'result' if given. Passes that rewrite the IR
+# leave IR reused from an earlier compile as they rewrote it, which is still correct if they are disabled later
+def post_processing(_ir: ir.Module, enabled=None, result=None):
+    enabled = enabled or {}
+
+    for p in PASSES:
+        if not enabled.get(p.name, p.enabled):
+            logger.debug(f"Skipping pass {p.name}")
+            _forget(_ir, p.attributes)
+            continue
+
+        start = time.perf_counter()
+        p.run(_ir)
+        wall_time = time.perf_counter() - start
+
+        logger.debug(f"Pass {p.name} took {wall_time * 1000:.2f} ms")
+
+        if result is not None:
+            result.add_pass(p.name, wall_time)
+
+    return _Post().visit(_ir)
+
+
+def _forget(module, attributes):
+    for f in module.functions + [f for c in module.classes for f in c.functions]:
+        for attribute in attributes:
+            if hasattr(f, attribute):
+                delattr(f, attribute)
 
 
 class _Post(ast.NodeTransformer):
 
     def __init__(self):
         pass
-
-
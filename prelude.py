@@ -0,0 +1,115 @@
+import ast
+import hashlib
+import os
+import pickle
+
+import compile_cache
+import parse_template
+import sugar
+import symbol_table
+import utils
+
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Bump this whenever the layout of the cached prelude changes
+CACHE_VERSION = 1
+
+# Maps the path of a standard library to its Prelude and the (size, mtime) of the file it was loaded from
+_preludes = {}
+
+
+# Mylang's standard library, parsed, sugared and entered into a symbol table once. Every program is compiled against
+# the same Prelude, whose definitions are merged into the program's table rather than appended to its source
+class Prelude:
+
+    def __init__(self, definitions, table, digest):
+        # The sugared top level functions and classes of the standard library
+        self.definitions = definitions
+        self.table = table
+
+        # Digest of the source the prelude was built from
+        self.digest = digest
+
+
+def build(source):
+    module = ast.parse(source, mode='exec')
+    sugar.sugar(module)
+
+    return Prelude(module.body, symbol_table.Table(module), hashlib.sha256(source.encode()).hexdigest())
+
+
+# Returns the Prelude of the standard library at 'path' (utils.STD_PATH by default). The prelude is kept for the life of
+# the process and, if 'cache_dir' is not None, pickled to disk so other processes do not sugar it again. Both are
+# rebuilt if the standard library or the compiler changes
+def load(path=None, cache_dir=parse_template.CACHE_DIR):
+    path = os.path.abspath(path if path is not None else utils.STD_PATH)
+
+    s = os.stat(path)
+    stamp = s.st_size, s.st_mtime_ns
+
+    if path in _preludes and _preludes[path][1] == stamp:
+        return _preludes[path][0]
+
+    with open(path) as fh:
+        source = fh.read()
+
+    digest = hashlib.sha256(source.encode()).hexdigest()
+
+    prelude = None
+
+    if cache_dir is not None:
+        cache_path = os.path.join(cache_dir, "prelude_" + hashlib.sha1(path.encode()).hexdigest()[:16] + ".pickle")
+        prelude = load_cache(cache_path, digest)
+
+    if prelude is None:
+        logger.debug(f"Building prelude from '{path}'")
+        prelude = build(source)
+
+        if cache_dir is not None:
+            save_cache(cache_path, prelude)
+
+    _preludes[path] = prelude, stamp
+
+    return prelude
+
+
+# Returns the Prelude pickled at 'cache_path', or None if it is missing or was built from a different standard library
+# or by a different compiler
+def load_cache(cache_path, digest):
+
+    try:
+        with open(cache_path, "rb") as fh:
+            cache = pickle.load(fh)
+    except FileNotFoundError:
+        return None
+    except Exception as e:
+        logger.warning(f"Could not read prelude cache '{cache_path}' ({e}), rebuilding prelude")
+        return None
+
+    if cache.get("version") != CACHE_VERSION or cache["compiler"] != compile_cache.compiler_digest():
+        return None
+
+    if cache["prelude"].digest != digest:
+        return None
+
+    logger.debug(f"Loaded prelude from cache '{cache_path}'")
+
+    return cache["prelude"]
+
+
+def save_cache(cache_path, prelude):
+
+    cache = {"version": CACHE_VERSION, "compiler": compile_cache.compiler_digest(), "prelude": prelude}
+
+    try:
+        os.makedirs(os.path.dirname(cache_path), exist_ok=True)
+
+        # Write to a temporary file first so a concurrent reader never sees a partially written cache
+        tmp_path = f"{cache_path}.{os.getpid()}.tmp"
+        with open(tmp_path, "wb") as fh:
+            pickle.dump(cache, fh)
+        os.replace(tmp_path, cache_path)
+    except OSError as e:
+        logger.warning(f"Could not write prelude cache '{cache_path}' ({e})")
@@ -0,0 +1,177 @@
+import argparse
+import concurrent.futures
+import logging
+import multiprocessing
+import os
+import sys
+import tempfile
+import time
+import traceback
+
+import incremental
+import tests
+import utils
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_WORKSPACE_ROOT = os.path.join(tempfile.gettempdir(), "mylang_workspaces")
+
+# Workspace used by the current worker process, assigned once by _init_worker
+_worker_workspace = None
+
+
+class TestResult:
+    def __init__(self, index, passed, duration, error=None):
+        self.index = index
+        self.passed = passed
+        self.duration = duration
+        self.error = error
+
+    def __repr__(self):
+        return f"TestResult({self.index}, {'passed' if self.passed else 'failed'}, {format_duration(self.duration)})"
+
+
+# Batch builds share one cargo invocation, so their tests have no individual duration
+def format_duration(duration):
+    if duration is None:
+        return "-"
+    return f"{duration:.2f}s"
+
+
+# Each worker takes a slot number from the queue and builds in its own workspace for its whole lifetime. Slots are
+# numbered rather than named after the pid so the same workspaces, with their compiled dependencies, are reused by
+# the next run.
+def _init_worker(slots, workspace_root):
+    global _worker_workspace
+
+    logging.basicConfig(level=logging.WARNING, stream=sys.stdout)
+
+    _worker_workspace = os.path.join(workspace_root, f"worker_{slots.get()}")
+
+
+def run_test(index, compile=True):
+    source, expected_output = tests.test_sources[index]
+
+    start = time.perf_counter()
+
+    try:
+        utils.analysis(source, verifier=expected_output, compile=compile, workspace_path=_worker_workspace)
+    except BaseException:
+        return TestResult(index, False, time.perf_counter() - start, traceback.format_exc())
+
+    return TestResult(index, True, time.perf_counter() - start)
+
+
+# Compile the program of the edit test 'index', then its edit reusing the incremental.State of the first compile, and
+# check the Rust is the same as that of the edit compiled from scratch
+def run_edit(index):
+    source, edited = tests.test_edits[index]
+
+    start = time.perf_counter()
+
+    try:
+        state = incremental.State()
+        utils.generate_rust(source, incremental=state)
+
+        if utils.generate_rust(edited, incremental=state) != utils.generate_rust(edited):
+            raise AssertionError("The incremental compile of the edit differs from a compile from scratch")
+    except BaseException:
+        return TestResult(index, False, time.perf_counter() - start, traceback.format_exc())
+
+    return TestResult(index, True, time.perf_counter() - start)
+
+
+# Run the tests with the given indices on a pool of 'jobs' worker processes, returning a list of TestResults in
+# index order
+def run_tests(indices=None, jobs=None, compile=True, workspace_root=DEFAULT_WORKSPACE_ROOT):
+
+    if indices is None:
+        indices = range(len(tests.test_sources))
+
+    if jobs is None:
+        jobs = os.cpu_count() or 1
+
+    slots = multiprocessing.Queue()
+    for i in range(jobs):
+        slots.put(i)
+
+    with concurrent.futures.ProcessPoolExecutor(jobs, initializer=_init_worker, initargs=(slots, workspace_root)) as pool:
+        futures = [pool.submit(run_test, index, compile) for index in indices]
+        results = [future.result() for future in futures]
+
+    return results
+
+
+# Build all the tests as binaries of one cargo workspace, see utils.batch_analysis
+def run_batch(indices=None, workspace_path=None):
+
+    if indices is None:
+        indices = range(len(tests.test_sources))
+
+    programs = {f"test_{index}": tests.test_sources[index] for index in indices}
+
+    errors = utils.batch_analysis(programs, workspace_path=workspace_path)
+
+    results = []
+
+    for index in indices:
+        error = errors[f"test_{index}"]
+
+        if error is None:
+            results.append(TestResult(index, True, None))
+        else:
+            results.append(TestResult(index, False, None, "".join(traceback.format_exception(error))))
+
+    return results
+
+
+def summarise(results, wall_time):
+    passed = [r for r in results if r.passed]
+    failed = [r for r in results if not r.passed]
+
+    lines = []
+
+    for r in results:
+        lines.append(f"test {r.index:3}: {'ok' if r.passed else 'FAILED':6} {format_duration(r.duration):>9}")
+
+    for r in failed:
+        lines.append("")
+        lines.append(f"---- test {r.index} ----")
+        lines.append(r.error)
+
+    total = sum(r.duration for r in results if r.duration is not None)
+
+    lines.append("")
+    lines.append(f"{len(passed)} passed, {len(failed)} failed in {wall_time:.2f}s (total test time {total:.2f}s)")
+
+    return "\n".join(lines)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Translate, build and run the programs in tests.test_sources")
+    parser.add_argument("-j", "--jobs", type=int, default=None, help="number of worker processes (default: number of cores)")
+    parser.add_argument("--no-compile", action="store_true", help="only translate the programs, do not build or run them")
+    parser.add_argument("--workspace-root", default=DEFAULT_WORKSPACE_ROOT, help="directory holding one cargo workspace per worker")
+    parser.add_argument("--batch", action="store_true", help="build every test as a binary of one cargo workspace with a single cargo build")
+    parser.add_argument("--edits", action="store_true", help="run the incremental compile tests in tests.test_edits instead, without building")
+    parser.add_argument("tests", nargs="*", type=int, help="indices of the tests to run (default: all)")
+    args = parser.parse_args(argv)
+
+    start = time.perf_counter()
+
+    if args.edits:
+        logging.basicConfig(level=logging.WARNING, stream=sys.stdout)
+        results = [run_edit(index) for index in (args.tests or range(len(tests.test_edits)))]
+    elif args.batch:
+        logging.basicConfig(level=logging.WARNING, stream=sys.stdout)
+        results = run_batch(args.tests or None, os.path.join(args.workspace_root, "batch"))
+    else:
+        results = run_tests(args.tests or None, args.jobs, not args.no_compile, args.workspace_root)
+
+    print(summarise(results, time.perf_counter() - start))
+
+    return 0 if all(r.passed for r in results) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
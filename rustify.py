@@ -1,17 +1,24 @@
 import ast
 
 import ir
-from contextlib import contextmanager
+from contextlib import contextmanager, nullcontext
 import logging
 
 import m_types
 import mangle
+import unboxing
 
 logger = logging.getLogger(__name__)
 
-# Convert our Rust IR AST into RUst source code
-def rustify(p: ir.Module):
-    r = _Rustify()
+# Appended to the name of a constructor to name the constructor returning the object by value, see escape.stack_allocate
+VALUE_CONSTRUCTOR = "_value"
+
+# Convert our Rust IR AST into RUst source code. 'cache', if given, maps IR function definitions to the primitive
+# lowering and class storage they were emitted with (see unboxing.lower_primitives and cycles.choose_storage) and the
+# Rust emitted for them. Functions found in it with the same lowering and storage are not emitted again, and functions
+# emitted are added to it
+def rustify(p: ir.Module, cache=None):
+    r = _Rustify(cache)
     r.visit(p)
 
     logger.debug(r.code)
@@ -20,13 +27,27 @@ def rustify(p: ir.Module):
 
 class _Rustify(ast.NodeVisitor):
 
-    def __init__(self):
+    def __init__(self, cache=None):
+        self.cache = cache
         self.code = []
         self.indent = 0
         self.in_class = False
         self.next_function = None
         self.del_function = None
 
+        # Maps the mangled names of user classes to the ir.ClassDef subclass chosen for their storage, and the class
+        # being emitted to its own
+        self.storage = {}
+        self.class_storage = None
+
+        # The expressions and assignments of the working function lowered to primitives, see unboxing.lower_primitives
+        self.natives = {}
+        self.native_return = None
+
+        # The constructors of the working function evaluated by value, and the reads of the variables holding them, see
+        # escape.stack_allocate
+        self.on_stack = frozenset()
+
     def write(self, text):
         if type(text) is str:
             self.code.append(text)
@@ -79,6 +100,12 @@ class _Rustify(ast.NodeVisitor):
         self.write(";")
 
     def visit(self, node):
+        # A primitive used where a wrapper is expected is wrapped
+        if isinstance(node, ir.Expression) and node in self.natives:
+            with self.wrapper(self.natives[node]):
+                self.native(node, False)
+            return
+
         method = 'visit_' + node.__class__.__name__
         visitor = getattr(self, method)
         return visitor(node)
@@ -112,22 +139,44 @@ class _Rustify(ast.NodeVisitor):
                     comma = True
                 self.traverse(n)
 
+    # The storage of objects of the type 't', see cycles.choose_storage. Built in classes, and classes not known, are
+    # on the collected heap
+    def storage_of(self, t):
+        while type(t) is m_types.Unknown and t.has_inner():
+            t = t.inner()
+
+        if type(t) is m_types.UserClass:
+            return self.storage.get(mangle.mangle(t), ir.CyclicClassDef)
+
+        return ir.CyclicClassDef
+
     @contextmanager
-    def heap_wrapper(self):
-        self.write("crate::heap::CellGc<")
+    def heap_wrapper(self, storage=ir.CyclicClassDef):
+        if storage is ir.StackClassDef:
+            yield
+            return
+
+        self.write("crate::heap::CellRc<" if storage is ir.AcyclicClassDef else "crate::heap::CellGc<")
         yield
         self.write(">")
 
     @contextmanager
-    def new_heap(self):
+    def new_heap(self, storage=ir.CyclicClassDef):
+        if storage is ir.StackClassDef:
+            yield
+            return
 
-        self.write("crate::heap::new_gc(")
+        self.write("crate::heap::new_rc(" if storage is ir.AcyclicClassDef else "crate::heap::new_gc(")
         yield
         self.write(")")
 
     @contextmanager
-    def access_heap(self):
-        self.write("crate::heap::mut_ref_gc(&")
+    def access_heap(self, storage=ir.CyclicClassDef):
+        if storage is ir.StackClassDef:
+            yield
+            return
+
+        self.write("crate::heap::mut_ref_rc(&" if storage is ir.AcyclicClassDef else "crate::heap::mut_ref_gc(&")
         yield
         self.write(")")
 
@@ -211,7 +260,7 @@ class _Rustify(ast.NodeVisitor):
         self.comma_separated([node.ok_type, node.err_type], "<", ">")
 
     def visit_UserClass(self, node):
-        with self.heap_wrapper():
+        with self.heap_wrapper(self.storage_of(node)):
             self.write(mangle.mangle(node))
         #self.write(mangle.mangle(node))
 
@@ -226,13 +275,29 @@ class _Rustify(ast.NodeVisitor):
 
 
     def visit_Module(self, node):
+        self.storage = {mangle.mangle(c): type(c) for c in node.classes}
         self.traverse(node.functions)
         self.traverse(node.classes)
 
+    def visit_CyclicClassDef(self, node):
+        self.visit_ClassDef(node)
+
+    def visit_AcyclicClassDef(self, node):
+        self.visit_ClassDef(node)
+
+    def visit_StackClassDef(self, node):
+        self.visit_ClassDef(node)
+
     def visit_ClassDef(self, node):
+        self.class_storage = self.storage.get(mangle.mangle(node), ir.CyclicClassDef)
 
-        self.fill()
-        self.write("#[derive(dumpster::Collectable)]")
+        # Only objects on the collected heap are traced, and objects held by value are copied
+        if self.class_storage is ir.StackClassDef:
+            self.fill()
+            self.write("#[derive(Clone)]")
+        elif self.class_storage is not ir.AcyclicClassDef:
+            self.fill()
+            self.write("#[derive(dumpster::Collectable)]")
         self.fill()
         self.write("struct ")
         self.write_mangled(node)
@@ -276,22 +341,71 @@ class _Rustify(ast.NodeVisitor):
                             """)
             self.del_function = None
 
+        self.class_storage = None
 
 
 
     def generic_function(self, node, is_main=False, prepend="", members=None):
+        if self.cache is not None:
+            # The Rust of a function depends on the primitives it was lowered to, the storage of classes and the objects
+            # constructed by value as well as its IR
+            lowering = (getattr(node, "lowering", None), frozenset(self.storage.items()),
+                        getattr(node, "on_stack", frozenset()), getattr(node, "by_value", False))
+
+            if node in self.cache and self.cache[node][0] == lowering:
+                self.write(self.cache[node][1])
+                return
+
+            start = len(self.code)
+            self.emit_function(node, prepend, members)
+            self.cache[node] = lowering, "".join(self.code[start:])
+        else:
+            self.emit_function(node, prepend, members)
+
+    def emit_function(self, node, prepend, members):
+        self.natives = getattr(node, "natives", {})
+        self.native_return = getattr(node, "native_return", None)
+        self.on_stack = getattr(node, "on_stack", frozenset())
+
+        storage = self.class_storage
+        suffix = ""
+
+        # A constructor also used to construct objects by value builds them by value, and moves them onto the heap
+        if members is not None and getattr(node, "by_value", False) and storage is not ir.StackClassDef:
+            self.fill()
+            self.write("fn ")
+            self.write_mangled(node)
+            self.comma_separated(node.args)
+            self.write(" -> ")
+            with self.heap_wrapper(storage):
+                self.write("Self")
+            with self.block():
+                self.fill()
+                with self.new_heap(storage):
+                    self.write("Self::")
+                    self.write_mangled(node)
+                    self.write(VALUE_CONSTRUCTOR)
+                    with self.brace():
+                        self.write(", ".join(arg.id for arg in node.args))
+
+            storage = ir.StackClassDef
+            suffix = VALUE_CONSTRUCTOR
+
         self.fill()
         self.write("fn ")
 
         self.write_mangled(node)
+        self.write(suffix)
 
         self.comma_separated(node.args, prepend=prepend)
 
         if node.ret_type != m_types.Ntuple([]) or members is not None:  # If the return type is not unit type, (), display it
             self.write(" -> ")
             if members is not None:
-                with self.heap_wrapper():
+                with self.heap_wrapper(storage):
                     self.write("Self")
+            elif self.native_return is not None:
+                self.write(self.native_return)
             else:
                 self.traverse(node.ret_type)
 
@@ -300,7 +414,7 @@ class _Rustify(ast.NodeVisitor):
 
             if members is not None:
                 self.fill()
-                with self.new_heap():
+                with self.new_heap(storage):
                     self.write("Self ")
                     with self.block():
                         for n in members:
@@ -310,6 +424,10 @@ class _Rustify(ast.NodeVisitor):
                             self.write(mangle.mangle(mangle.MemberVariable(n)))
                             self.write(",")
 
+        self.natives = {}
+        self.native_return = None
+        self.on_stack = frozenset()
+
 
     def visit_FunctionDef(self, node):
         self.generic_function(node)
@@ -351,18 +469,25 @@ class _Rustify(ast.NodeVisitor):
             self.traverse(node.value)
 
 
+    # Write 'node' as a primitive if the assignment or function it belongs to was lowered to one
+    def value(self, node, native):
+        if native:
+            self.native(node, False)
+        else:
+            self.traverse(node)
+
     def visit_LetAssign(self, node):
         with self.statement():
             self.write("let mut ")
             self.traverse(node.target)
             self.write(" = ")
-            self.traverse(node.value)
+            self.value(node.value, node in self.natives)
 
     def visit_Reassign(self, node):
         with self.statement():
             self.traverse(node.target)
             self.write(" = ")
-            self.traverse(node.value)
+            self.value(node.value, node in self.natives)
 
     def visit_Break(self, node):
         with self.statement():
@@ -375,7 +500,7 @@ class _Rustify(ast.NodeVisitor):
     def visit_Return(self, node):
         with self.statement():
             self.write("return ")
-            self.traverse(node.expr)
+            self.value(node.expr, self.native_return is not None)
 
     def visit_Expr(self, node):
         with self.statement():
@@ -388,8 +513,12 @@ class _Rustify(ast.NodeVisitor):
 
         self.write(" in ")
 
-        with self.access_heap():
-            self.traverse(node.iterator)
+        if node.iterator in self.on_stack:
+            self.write("&mut ")
+            self.in_place(node.iterator)
+        else:
+            with self.access_heap(self.storage_of(node.iterator_type)):
+                self.traverse(node.iterator)
 
         with self.block():
             self.traverse(node.body)
@@ -398,19 +527,24 @@ class _Rustify(ast.NodeVisitor):
     def boolean_conversion(self):
         self.write(".get_bool()")
 
+    def condition(self, node):
+        if node in self.natives:
+            self.native(node, False)
+        else:
+            self.traverse(node)
+            self.boolean_conversion()
+
     def visit_While(self, node):
         self.fill()
         self.write("while ")
-        self.traverse(node.condition)
-        self.boolean_conversion()
+        self.condition(node.condition)
         with self.block():
             self.traverse(node.body)
 
     def visit_IfElse(self, node):
         self.fill()
         self.write("if ")
-        self.traverse(node.condition)
-        self.boolean_conversion()
+        self.condition(node.condition)
         with self.block():
             self.traverse(node.if_block)
         if len(node.else_block) > 0:
@@ -420,7 +554,7 @@ class _Rustify(ast.NodeVisitor):
                 self.traverse(node.else_block)
 
 
-    def generic_constructor_call(self, node, usr_class):
+    def generic_constructor_call(self, node, usr_class, suffix=""):
         if type(usr_class) is str:
             self.write("crate::classes::")
             self.write(node.id)
@@ -430,10 +564,20 @@ class _Rustify(ast.NodeVisitor):
             self.write_mangled(usr_class)
         self.write("::")
         self.write(str(mangle.mangle(ir.FunctionDef("__init__", node.types))))
+        self.write(suffix)
         self.comma_separated(node.args)
 
     def visit_ClassConstructor(self, node):
-        self.generic_constructor_call(node, node.usr_class)
+        self.generic_constructor_call(node, node.usr_class, VALUE_CONSTRUCTOR if node in self.on_stack else "")
+
+    # Write an object constructed by value, or a variable or call returning one, in place
+    def in_place(self, node):
+        if type(node) is ir.ClassConstructor:
+            self.traverse(node)
+        elif type(node) is ir.UserClassMemberFunction:
+            self.in_place(node.expr)
+        else:
+            self.write(node.id)
 
     def visit_BuiltInClassConstructor(self, node):
         self.generic_constructor_call(node, node.id)
@@ -460,8 +604,11 @@ class _Rustify(ast.NodeVisitor):
         self.comma_separated(node.args)
 
     def visit_UserClassMemberFunction(self, node):
-        with self.access_heap():
-            self.traverse(node.expr)
+        if node.expr in self.on_stack:
+            self.in_place(node.expr)
+        else:
+            with self.access_heap(self.storage_of(node.exp_type)):
+                self.traverse(node.expr)
         self.write(".")
         self.write_mangled(node)
         self.comma_separated(node.args)
@@ -540,6 +687,79 @@ class _Rustify(ast.NodeVisitor):
                 raise "joined string value is not a constant or formatted value"
         self.write(f"{mangled_string_name} }}")
 
+    @contextmanager
+    def wrapper(self, native):
+        self.type_scope(unboxing.WRAPPERS[native])
+        self.write("::new(")
+        yield
+        self.write(")")
+
+    # Write an expression lowered to a primitive by unboxing.lower_primitives. Operators are bracketed unless 'bracket'
+    # is False, where the expression stands on its own
+    def native(self, node, bracket=True):
+        t = type(node)
+
+        if t is ir.Constant:
+            if type(node.value) is bool:
+                self.write(str(node.value).lower())
+            else:
+                literal = f"{node.value}{self.natives[node]}"
+                self.write(f"({literal})" if node.value < 0 else literal)
+        elif t is ir.Identifier or t is ir.CloneIdentifier:
+            self.write(node.id)
+        elif t is ir.GlobalFunctionCall:
+            self.visit_GlobalFunctionCall(node)
+        elif t is ir.BuiltInMemberFunction:
+            self.native_operator(node, bracket)
+        else:
+            raise ValueError(f"Cannot write {t.__name__} as a primitive")
+
+    def native_operand(self, node, t):
+        if self.natives[node] != t:
+            with self.brace():
+                self.native(node)
+                self.write(f" as {t}")
+        else:
+            self.native(node)
+
+    def native_operator(self, node, bracket):
+        receiver = self.natives[node.expr]
+        argument = self.natives[node.args[0]] if node.args else None
+        result, symbol = unboxing.OPERATORS[receiver, node.id, argument]
+
+        if symbol == "as":
+            self.native_operand(node.expr, result)
+        elif symbol == "bool" and receiver == "bool":
+            self.native(node.expr, bracket)
+        elif symbol == "bool":
+            with self.brace() if bracket else nullcontext():
+                self.native(node.expr)
+                self.write(" != 0" if receiver == "i64" else " != 0.0")
+        elif symbol == "+" and argument is None:
+            self.native(node.expr, bracket)
+        elif symbol == "-" and argument is None:
+            with self.brace():
+                self.write("-")
+                self.native(node.expr)
+        elif symbol == "//" or symbol == "%":
+            # Python rounds the quotient towards negative infinity, and gives the remainder the sign of the divisor
+            self.write("{ let (a, b) = (")
+            self.native(node.expr)
+            self.write(", ")
+            self.native(node.args[0])
+            if symbol == "//":
+                self.write("); let q = a / b; if a % b != 0 && (a < 0) != (b < 0) { q - 1 } else { q } }")
+            else:
+                self.write("); let r = a % b; if r != 0 && (r < 0) != (b < 0) { r + b } else { r } }")
+        else:
+            # Mixed integer and float operands are compared and combined as floats, as are the operands of '/'
+            operands = "f64" if "f64" in (receiver, argument) or symbol == "/" else receiver
+
+            with self.brace() if bracket else nullcontext():
+                self.native_operand(node.expr, operands)
+                self.write(f" {symbol} ")
+                self.native_operand(node.args[0], operands)
+
     def visit_SomeCall(self, node):
         self.write("crate::built_ins::Option::Option::new(std::option::Option::Some(")
         self.traverse(node.expr)
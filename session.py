@@ -0,0 +1,54 @@
+import compile_cache
+import incremental
+import parse_template
+import prelude
+import utils
+import workspace
+
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+# A long lived compiler for many programs in one process. A Session keeps everything that does not depend on the
+# program being compiled: the built in maps of its template, the standard library prelude, the specialisations deduced
+# for earlier programs, the compile cache and the cargo workspace. Each compile then only pays for the program's own
+# code. Unlike utils.analysis, a Session never changes the level of any logger.
+#
+# Specialisations are kept in an incremental.State shared by every program compiled, so instantiations of standard
+# library functions, and of any definition identical to one in the previous program, are deduced once and reused for
+# as long as the next program does not redefine the names they depend on.
+class Session:
+
+    def __init__(self, template_path=None, std_path=None, workspace_path=None, release=False, cache=True,
+                 trace_memory=False):
+        self.template = parse_template.Template(template_path if template_path is not None else parse_template.get_template_path())
+        self.std_path = std_path
+        self.workspace = workspace.Workspace(workspace_path, self.template.path)
+        self.release = release
+        self.trace_memory = trace_memory
+
+        # A compile_cache.CompileCache, or None if built programs are not cached
+        self.cache = compile_cache.CompileCache() if cache is True else (cache or None)
+
+        self.state = incremental.State()
+
+    # Parse the template's built in maps and load the prelude now, rather than during the first compile
+    def warm(self):
+        self.template.built_ins()
+        self.template.built_in_classes()
+        prelude.load(self.std_path)
+
+    # Compile 'source' and, if 'build' is set, build it and, if 'run' is set, run it, checking its output against
+    # 'verifier' as utils.analysis does. 'release' overrides the build profile of the session. Returns a
+    # metrics.CompileResult
+    def compile(self, source, build=True, verifier=None, exe=None, run=True, release=None):
+        release = self.release if release is None else release
+
+        with parse_template.using(self.template):
+            return utils.compile_program(source, self.workspace, exe, verifier, build, self.trace_memory, release,
+                                         self.cache, self.state, self.std_path, run)
+
+    # Returns the Rust generated for 'source', without building it
+    def generate_rust(self, source):
+        return self.compile(source, build=False).rust
@@ -18,6 +18,9 @@ class _Sugar(ast.NodeTransformer):
         self.working_function = None
         self.working_class = None
 
+        # The number of temporaries created so far in the working function
+        self.temporaries = 0
+
 
     # Returns true if the function in self.working_function represents a class constructor
     def function_is_class_init(self):
@@ -160,6 +163,7 @@ class _Sugar(ast.NodeTransformer):
 
     def visit_FunctionDef(self, node):
         self.working_function = node
+        self.temporaries = 0
 
         if self.function_is_class_init():
             f = custom_nodes.InitFunctionDef(self.traverse(node.args), self.flatten(self.traverse(node.body)), node.decorator_list, node.returns, node.type_comment, node.type_params)
@@ -293,7 +297,8 @@ class _Sugar(ast.NodeTransformer):
 
             import mangle
             # 2.
-            mangled_name = mangle.mangle(node)
+            mangled_name = mangle.mangle(mangle.Temporary("assign", self.temporaries))
+            self.temporaries += 1
 
             # 3.
             tmp_assigner = custom_nodes.MonoAssign(ast.Name(mangled_name, ast.Store()), self.traverse(node.value))
@@ -1,11 +1,9 @@
 import ast
-import symtable
 
 import custom_nodes
-import custom_unparser
 import errors
+import mangle
 import members
-import utils
 
 import logging
 
@@ -20,30 +18,50 @@ class Variable:
         return self.name
 
 
-# A class representing a function in a symbol table
-class Function:
-    def __init__(self, ast_node):
-        self.name = ast_node.name
-        self.ast_node = ast_node
-        self.variables = []
+def resolve_locals(node: ast.FunctionDef):
+    l = _Locals()
+    l.visit(node)
+    return l.names
+
+
+# Visitor class used to extract the names of the local variables (arguments and assignment targets) of a function
+class _Locals(ast.NodeVisitor):
+    def __init__(self):
+        self.names = []
+
+    def add(self, name):
+        if name not in self.names:
+            self.names.append(name)
 
-        # Get the table from the ast_node itself by unparsing, then using this code in a symtable
-        func_code = custom_unparser.unparse(ast_node)
+    def visit_arg(self, node):
+        self.add(node.arg)
 
-        t = symtable.symtable(func_code, "", "exec")
+    def visit_Name(self, node):
+        if isinstance(getattr(node, "ctx", None), ast.Store):
+            self.add(node.id)
 
-        if len(t.get_children()) == 0:
-            logger.critical("Could not get symbol table from function. Hint: This might be caused by a  missing entry in the custom unparser if a new node was created")
-            raise "Could not resolve symbol table for function"
+    def visit_MonoAssign(self, node):
+        if type(node.target) is ast.Name:
+            self.add(node.target.id)
+        self.generic_visit(node)
 
+    def visit_For(self, node):
+        if type(node.target) is ast.Name:
+            self.add(node.target.id)
+        self.generic_visit(node)
 
-        table = t.get_children()[0]
+    def visit_InitAssign(self, node):
+        # Member assignments in a constructor are stored in a mangled local before the object is built
+        self.add(mangle.mangle(node))
+        self.generic_visit(node)
 
-        for t in table.get_symbols():
-            if type(t) is symtable.Symbol:
-                # Only add variable symbols, not function calls
-                if t.is_local():
-                    self.variables.append(Variable(t.get_name()))
+
+# A class representing a function in a symbol table
+class Function:
+    def __init__(self, ast_node):
+        self.name = ast_node.name
+        self.ast_node = ast_node
+        self.variables = [Variable(name) for name in resolve_locals(ast_node)]
 
     def __str__(self):
         return f"{self.name} {self.ast_node} {self.variables}"
@@ -56,33 +74,29 @@ class Class:
         self.node = node
         self.member_variables = member_variables
 
+        # Maps function names to the list of overloads with that name
+        self.function_map = {}
+
         for statement in node.body:
             if type(statement) is ast.FunctionDef or type(statement) is custom_nodes.InitFunctionDef or type(statement) is custom_nodes.DelFunctionDef:
-                self.functions.append(Function(statement))
+                self.add_function(Function(statement))
             else:
                 raise "Classes can only contain function definitions"
 
-    def __contains__(self, item):
-
-        for func in self.functions:
-            if func.name == item:
-                return True
+    def add_function(self, function: Function):
+        self.functions.append(function)
+        self.function_map.setdefault(function.name, []).append(function)
 
-        return False
+    def __contains__(self, item):
+        return item in self.function_map
 
     def __getitem__(self, item):
 
-        funcs = []
-
-        for func in self.functions:
-            if func.name == item:
-                funcs.append(func)
-
-        if len(funcs) == 0:
+        if item not in self.function_map:
             logger.error(f"No such function {item} in class {self.name}")
             raise "Function not found in class"
 
-        return funcs
+        return self.function_map[item]
 
 
 # Mylang tables are simpler than python tables, since python allows nested functions, classes, and all sorts of
@@ -95,6 +109,10 @@ class Table:
         self.functions = []
         self.classes = []
 
+        # Name indexed views of the lists above, so lookups do not need to scan every function and class
+        self.function_map = {}
+        self.class_map = {}
+
         member_variables = members.resolve_members(mod)
 
         logger.debug("Member Map:")
@@ -102,12 +120,29 @@ class Table:
 
         for statement in mod.body:
             if isinstance(statement, ast.FunctionDef):
-                self.functions.append(Function(statement))
+                self.add_function(Function(statement))
             elif type(statement) is ast.ClassDef:
-                self.classes.append(Class(statement, list(map(lambda x: Variable(x), member_variables[statement.name]))))
+                self.add_class(Class(statement, list(map(lambda x: Variable(x), member_variables[statement.name]))))
             else:
                 raise "Top level objects can only be classes or functions"
 
+    def add_function(self, function: Function):
+        self.functions.append(function)
+        self.function_map.setdefault(function.name, []).append(function)
+
+    def add_class(self, cl: Class):
+        self.classes.append(cl)
+        self.class_map.setdefault(cl.name, cl)
+
+    # Add the functions and classes of another table, such as the standard library's, after those of this table
+    def extend(self, other):
+        for function in other.functions:
+            self.add_function(function)
+
+        for cl in other.classes:
+            if cl.name in self.class_map:
+                raise errors.DuplicateClassDeclaration(cl.name)
+            self.add_class(cl)
 
 
     def get_main(self):
@@ -140,32 +175,15 @@ class Table:
 
 
     def __contains__(self, item):
-
-        for func in self.functions:
-            if func.name == item:
-                return True
-
-        for cl in self.classes:
-            if cl.name == item:
-                return True
-
-        return False
+        return item in self.class_map or item in self.function_map
 
     def __getitem__(self, item):
 
-        for cl in self.classes:
-            if cl.name == item:
-                return cl
-
-        funcs = []
-
-        for func in self.functions:
-            if func.name == item:
-                funcs.append(func)
-
+        if item in self.class_map:
+            return self.class_map[item]
 
-        if len(funcs) == 0:
+        if item not in self.function_map:
             logger.error(f"No such global function or class named {item}")
             raise "Function not found in class"
 
-        return funcs
+        return self.function_map[item]
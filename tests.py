@@ -515,5 +515,246 @@ def main():
     
     """, id_test2_verify),
 
+    ("""
+    
+def main():
+    print(-7 // 2)
+    print(-7 % 3)
+    print(7 % -3)
+    
+    a = 6
+    b = a * 7 - 50
+    
+    print(b // 3)
+    print(b % 3)
+    
+    big = 4611686018427387904
+    
+    print(big - 1 + big)
+    
+    n = 1
+    i = 0
+    
+    while i < 3:
+        n = n * 2
+        i = i + 1
+    
+    print(n)
+    
+    """, b'-4\n2\n-2\n-3\n1\n9223372036854775807\n8\n'),
+
+    ("""
+    
+def push(l, x):
+    l.append(x)
+
+def main():
+    l = []
+    l.append(5)
+    i = 0
+    
+    while i < 3:
+        push(l, i)
+        i = i + 1
+    
+    print(f"{l[3]}")
+    
+    k = []
+    k.append(7)
+    
+    while True:
+        if k[0] > 0:
+            m = k
+            m.append(8)
+            break
+        
+        k.append(0)
+    
+    print(f"{k[1]}")
+    
+    j = []
+    j.append(9)
+    push(j, 10)
+    
+    print(f"{j[1]}")
+    
+    """, b'2\n8\n10\n'),
+
+    ("""
+    
+def main():
+    a = -7
+    b = 3
+    f = 0.5
+    i = 0
+    
+    while i < 2:
+        print(a // b)
+        print(a % b)
+        print(b % a)
+        print(f / 2)
+        
+        a = a - 1
+        b = -b
+        f = f - 1.5
+        i = i + 1
+    
+    """, b'-3\n2\n-4\n0.25\n2\n-2\n-3\n-0.5\n'),
+
+    ("""
+    
+class Point:
+    def __init__(x, y):
+        self.x = x
+        self.y = y
+    
+    def __get_x__():
+        return self.x
+    
+    def __get_y__():
+        return self.y
+    
+    def sum():
+        return self.x + self.y
+
+class Counter:
+    def __init__():
+        self.n = 0
+    
+    def __get_n__():
+        return self.n
+    
+    def __set_n__(n):
+        self.n = n
+    
+    def add(k):
+        n = self.n + k
+        self.n = n
+
+class Tag:
+    def __init__(name):
+        self.name = name
+    
+    def __get_name__():
+        return self.name
+
+def main():
+    p = Point(1, 2)
+    q = p
+    
+    print(q.sum())
+    
+    c = Counter()
+    d = c
+    
+    c.add(p.sum())
+    d.add(4)
+    
+    print(c.n)
+    
+    t = Tag("a")
+    u = t
+    
+    print(id(t) == id(u))
+    print(id(t) == id(Tag("a")))
+    
+    """, b'3\n7\ntrue\nfalse\n'),
+
+    ("""
+    
+class Countdown:
+    def __init__(n):
+        self.n = n
+    
+    def __get_n__():
+        return self.n
+    
+    def __set_n__(n):
+        self.n = n
+    
+    def __iter__():
+        return self
+    
+    def __next__():
+        if self.n <= 0:
+            return None
+        
+        n = self.n
+        self.n = n - 1
+        return some(n)
+
+def main():
+    for i in Countdown(3):
+        print(i)
+    
+    c = Countdown(2)
+    
+    for i in c:
+        print(i)
+    
+    """, b'3\n2\n1\n2\n1\n'),
+
+]
+
+
+# Pairs of a program and an edit of it. Compiling the edit with the incremental.State of a compile of the program must
+# give the same Rust as compiling the edit from scratch, see runner.run_edit
+test_edits = [
+
+    ("""
+    
+class Pair:
+    def __init__(left, right):
+        self.left = left
+        self.right = right
+    
+    def __get_left__():
+        return self.left
+    
+    def __get_right__():
+        return self.right
+    
+    def sum():
+        return self.left + self.right
+
+def total(n):
+    p = Pair(n, 1)
+    return p.sum()
+
+def main():
+    x = 5
+    p = Pair(x, x)
+    
+    print(total(2))
+    print(p.sum())
+    
+    """, """
+    
+class Pair:
+    def __init__(left, right):
+        self.left = left
+        self.right = right
+    
+    def __get_left__():
+        return self.left
+    
+    def __get_right__():
+        return self.right
+    
+    def sum():
+        return self.left + self.right
+
+def total(n):
+    p = Pair(n, 1)
+    return p.sum()
+
+def main():
+    x = 5.5
+    p = Pair(x, x)
+    
+    print(total(2))
+    print(p.sum())
+    
+    """),
 
 ]
\ No newline at end of file
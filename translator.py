@@ -20,6 +20,14 @@ def translate(tree):
 
     m.classes = [x for x in t.class_map.values()]
 
+    # Emit items in a canonical order, sorted by mangled name, so the generated Rust does not depend on the order the
+    # type tree happened to be traversed in
+    m.functions.sort(key=mangle.mangle)
+    m.classes.sort(key=mangle.mangle)
+
+    for c in m.classes:
+        c.functions.sort(key=mangle.mangle)
+
     return t.module
 
 # Class which takes a TypeTree and returns a Rust IR
@@ -36,6 +44,9 @@ class _Translator(ast.NodeVisitor):
 
         self.class_map = {}
 
+        # The number of f-strings translated so far in the working function
+        self.joined_strings = 0
+
     def climb_tree(self, depth=0):
 
         if self.working_tree.parent_class_type:
@@ -56,8 +67,12 @@ class _Translator(ast.NodeVisitor):
 
         self.function_set.add(triple)
 
-        # Visit the node
-        self.traverse(self.working_tree.ast_node)
+        # A type tree reused from an earlier compile keeps the IR it was translated to, otherwise visit the node
+        if self.working_tree.translation is not None:
+            self.add_translation(self.working_tree.translation)
+        else:
+            self.joined_strings = 0
+            self.traverse(self.working_tree.ast_node)
 
         children = self.working_tree.child_trees
 
@@ -107,10 +122,6 @@ class _Translator(ast.NodeVisitor):
 
         if self.working_tree.parent_class_type and self.working_tree.parent_class_node:
             # Member function
-            usr = self.working_tree.parent_class_type
-
-
-
             if ir_function.name == "__next__":
                 de = ir.NextFunctionDef(ir_function)
             elif ir_function.name == "__hash__":
@@ -119,14 +130,32 @@ class _Translator(ast.NodeVisitor):
                 de = ir.DelFunctionDef(ir_function)
             else:
                 de = ir.MemberFunctionDef(ir_function)
-
-            self.class_map[usr].add_function(de)
         else:
             # Global function
             if ir_function.name == "main":
-                self.module.add_function(ir.MainFunctionDef(ir_function))
+                de = ir.MainFunctionDef(ir_function)
             else:
-                self.module.add_function(ir_function)
+                de = ir_function
+
+        self.add_translation(de)
+
+    # Add the IR of the working tree to the module, or to its class. The IR is kept in the tree so a later compile
+    # reusing the tree does not translate it again
+    def add_translation(self, de):
+        self.working_tree.translation = de
+
+        usr = self.working_tree.parent_class_type
+
+        if type(de) is ir.InitFunctionDef or (usr and self.working_tree.parent_class_node):
+            # Constructor or member function. A tree reused from an earlier compile can reach a member function of a
+            # class before its constructor, so the class is created by whichever is translated first
+            if usr not in self.class_map:
+                l = [ir.Member(member.id[5:], member.annotation.get_type()) for member in usr.member_types]
+                self.class_map[usr] = ir.ClassDef(usr.identifier, l)
+
+            self.class_map[usr].add_function(de)
+        else:
+            self.module.add_function(de)
 
     def visit_DelFunctionDef(self, node):
         self.visit_FunctionDef(node)
@@ -141,22 +170,7 @@ class _Translator(ast.NodeVisitor):
         # Traverse the function body
         ir_function.body = self.traverse(node.body)
 
-
-        # Constructor
-        usr = self.working_tree.parent_class_type
-
-
-
-        l = [ir.Member(member.id[5:], member.annotation.get_type()) for member in usr.member_types]
-
-
-        if usr not in self.class_map:
-            ir_class = ir.ClassDef(usr.identifier, l)
-            self.class_map[usr] = ir_class
-        else:
-            ir_class = self.class_map[usr]
-
-        ir_class.add_function(ir_function)
+        self.add_translation(ir_function)
 
     def visit_MonoAssign(self, node):
 
@@ -197,7 +211,10 @@ class _Translator(ast.NodeVisitor):
         else:
             target = self.traverse(node.target)
 
-        return ir.For(target, self.traverse(node.iter), self.traverse(node.body))
+        return ir.For(target, self.traverse(node.iter), self.traverse(node.body), getattr(node, "iter_type", None))
+
+    def visit_TypedFor(self, node):
+        return self.visit_For(node)
 
     def visit_Break(self, node):
         return ir.Break()
@@ -237,7 +254,7 @@ class _Translator(ast.NodeVisitor):
             exp = self.traverse(node.exp)
 
         if type(node.exp_type) is m_types.UserClass or type(node.exp_type) is m_types.BuiltInClass:
-            return ir.UserClassMemberFunction(exp, node.id, self.traverse(node.args), node.types)
+            return ir.UserClassMemberFunction(exp, node.id, self.traverse(node.args), node.types, node.exp_type)
         else:
 
             to_mangle = True
@@ -259,7 +276,8 @@ class _Translator(ast.NodeVisitor):
         return ir.LetAssign(ir.Identifier(mangle.mangle(node)), self.traverse(node.value))
 
     def visit_JoinedStr(self, node):
-        return ir.JoinedString(self.traverse(node.values))
+        self.joined_strings += 1
+        return ir.JoinedString(self.traverse(node.values), self.joined_strings - 1)
 
     def visit_FormattedValue(self, node):
         return ir.FormattedValue(self.traverse(node.value), node.conversion)
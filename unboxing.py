@@ -0,0 +1,238 @@
+import ast
+import logging
+
+import ir
+import liveness
+import m_types
+import mangle
+
+logger = logging.getLogger(__name__)
+
+# The Rust primitive each scalar type is lowered to
+NATIVE_TYPES = {m_types.Integer: "i64", m_types.Floating: "f64", m_types.Boolean: "bool"}
+
+# The built in wrapping each primitive, constructed from the primitive where a wrapper is needed
+WRAPPERS = {"i64": "Integer", "f64": "Float", "bool": "Bool"}
+
+# Maps (receiver type, member function, argument type or None) to (result type, operator) for the member functions of
+# scalars that have a native Rust equivalent with the same semantics. '//' and '%' on integers round towards negative
+# infinity as in Python, '/' is only lowered when dividing by a non zero constant, since Rust would return infinity
+# where the wrapper raises, and 'bool' and 'as' are conversions
+OPERATORS = {}
+
+for _name, _symbol in (("__add__", "+"), ("__sub__", "-"), ("__mul__", "*"), ("__truediv__", "/")):
+    for _left in ("i64", "f64"):
+        for _right in ("i64", "f64"):
+            OPERATORS[_left, _name, _right] = ("f64" if "f64" in (_left, _right) or _symbol == "/" else "i64"), _symbol
+
+for _name, _symbol in (("__eq__", "=="), ("__ne__", "!="), ("__lt__", "<"), ("__le__", "<="), ("__gt__", ">"),
+                       ("__ge__", ">=")):
+    for _left in ("i64", "f64"):
+        for _right in ("i64", "f64"):
+            OPERATORS[_left, _name, _right] = "bool", _symbol
+
+OPERATORS["bool", "__eq__", "bool"] = "bool", "=="
+OPERATORS["bool", "__ne__", "bool"] = "bool", "!="
+OPERATORS["i64", "__floordiv__", "i64"] = "i64", "//"
+OPERATORS["i64", "__mod__", "i64"] = "i64", "%"
+
+for _type in ("i64", "f64"):
+    OPERATORS[_type, "__neg__", None] = _type, "-"
+    OPERATORS[_type, "__pos__", None] = _type, "+"
+    OPERATORS[_type, "__float__", None] = "f64", "as"
+    OPERATORS[_type, "__int__", None] = "i64", "as"
+
+for _type in ("i64", "f64", "bool"):
+    OPERATORS[_type, "__bool__", None] = "bool", "bool"
+
+
+# Lower scalar values to Rust primitives where their types are fully known. A local variable is kept as an i64, f64 or
+# bool if every value assigned to it is a constant, another such variable, or a native operator (see OPERATORS) on
+# them, and a global function returns a primitive if all of its returns do. Arguments, members and everything else
+# keep the built in wrappers, and a primitive used where a wrapper is expected is wrapped at that point.
+#
+# The IR is not changed. Each function is given 'natives', mapping the expressions evaluated as primitives, and the
+# assignments to primitive variables, to their Rust type, and 'native_return', the primitive it returns or None.
+# 'lowering' summarises both, so Rust emitted for a function reused from an earlier compile is only reused while its
+# lowering is unchanged.
+def lower_primitives(module: ir.Module):
+    functions = list(module.functions)
+
+    for c in module.classes:
+        functions.extend(c.functions)
+
+    # Assume every global function returning a scalar returns a primitive, and drop those that turn out not to until
+    # the assumption holds
+    returns = {}
+
+    for f in module.functions:
+        if type(f) is ir.FunctionDef and type(_inner(f.ret_type)) in NATIVE_TYPES:
+            returns[mangle.mangle(f)] = NATIVE_TYPES[type(_inner(f.ret_type))]
+
+    while True:
+        analyses = {f: _Natives(f, returns) for f in functions}
+
+        failed = [name for name, f in ((mangle.mangle(f), f) for f in module.functions)
+                  if name in returns and type(f) is ir.FunctionDef and not analyses[f].returns_native(returns[name])]
+
+        if not failed:
+            break
+
+        for name in failed:
+            del returns[name]
+
+    lowered = 0
+
+    for f, analysis in analyses.items():
+        f.natives = analysis.natives
+        f.native_return = returns.get(mangle.mangle(f)) if type(f) is ir.FunctionDef else None
+        f.lowering = f.native_return, frozenset(f.natives.items())
+
+        lowered += len(analysis.locals)
+
+    logger.debug(f"Lowered {lowered} variables and {len(returns)} function returns to primitives")
+
+    return lowered
+
+
+def _inner(t):
+    while type(t) is m_types.Unknown and t.has_inner():
+        t = t.inner()
+
+    return t
+
+
+# Returns the statements of 'statements', and of the blocks within them
+def _statements(statements):
+    for s in statements:
+        yield s
+
+        if type(s) is ir.IfElse:
+            yield from _statements(s.if_block)
+            yield from _statements(s.else_block or [])
+        elif type(s) is ir.While or type(s) is ir.For:
+            yield from _statements(s.body)
+
+
+# The expression fields of a statement
+def _expressions(statement):
+    for field in ("value", "expr", "condition", "iterator"):
+        if isinstance(getattr(statement, field, None), ir.Expression):
+            yield getattr(statement, field)
+
+
+# Finds the local variables and expressions of one function that can be primitives, given the primitive returned by
+# each lowered global function in 'returns'
+class _Natives:
+
+    def __init__(self, function: ir.FunctionDef, returns):
+        self.function = function
+        self.returns = returns
+        self.bindings = liveness.Bindings(function)
+
+        # Maps the bindings of primitive local variables to their Rust type
+        self.locals = {}
+
+        # Maps expressions to their Rust type, or None if they are not primitives, for the current 'locals'
+        self.types = {}
+
+        # A constructor builds Self from the members assigned in its body, which must be wrappers
+        members = set()
+
+        if type(function) is ir.InitFunctionDef:
+            members = {self.bindings.scope.get(mangle.mangle(mangle.MemberVariable(m))) for m in function.member_list}
+
+        candidates = [b for b in self.bindings.assignments if b not in self.bindings.opaque and b[1] != 0
+                      and b not in members]
+
+        # Give each candidate the type of the first of its values to have one, then drop candidates with a value of any
+        # other type until every remaining candidate is consistent
+        changed = True
+
+        while changed:
+            changed = False
+            self.types = {}
+
+            for b in candidates:
+                if b not in self.locals:
+                    for s in self.bindings.assignments[b]:
+                        if self.type(s.value) is not None:
+                            self.locals[b] = self.type(s.value)
+                            changed = True
+                            break
+
+        changed = True
+
+        while changed:
+            changed = False
+            self.types = {}
+
+            for b, t in list(self.locals.items()):
+                if any(self.type(s.value) != t for s in self.bindings.assignments[b]):
+                    del self.locals[b]
+                    changed = True
+                    break
+
+        self.types = {}
+        self.natives = {}
+
+        for s in _statements(function.body):
+            for expression in _expressions(s):
+                self.collect(expression)
+
+            if type(s) is ir.LetAssign or type(s) is ir.Reassign:
+                t = self.locals.get(self.bindings.bindings.get(s.target))
+
+                if t is not None:
+                    self.natives[s] = t
+
+    def returns_native(self, t):
+        return all(self.type(s.expr) == t for s in _statements(self.function.body) if type(s) is ir.Return)
+
+    def collect(self, node):
+        t = self.type(node)
+
+        if t is not None:
+            self.natives[node] = t
+
+        for field, value in ast.iter_fields(node):
+            for element in (value if type(value) is list else [value]):
+                if isinstance(element, ir.Expression):
+                    self.collect(element)
+
+    # Returns the Rust primitive 'node' evaluates to, or None if it evaluates to a wrapper
+    def type(self, node):
+        if node not in self.types:
+            self.types[node] = self.infer(node)
+
+        return self.types[node]
+
+    def infer(self, node):
+        t = type(node)
+
+        if t is ir.Constant:
+            if type(node.value) is bool:
+                return "bool"
+            elif type(node.value) is int:
+                return "i64"
+            elif type(node.value) is float:
+                return "f64"
+        elif t is ir.Identifier or t is ir.CloneIdentifier:
+            return self.locals.get(self.bindings.bindings.get(node))
+        elif t is ir.GlobalFunctionCall:
+            return self.returns.get(mangle.mangle(node))
+        elif t is ir.BuiltInMemberFunction and len(node.args) <= 1:
+            receiver = self.type(node.expr)
+            argument = self.type(node.args[0]) if node.args else None
+
+            if receiver is None or (node.args and argument is None):
+                return None
+
+            result, symbol = OPERATORS.get((receiver, node.id, argument), (None, None))
+
+            if symbol == "/" and not (type(node.args[0]) is ir.Constant and node.args[0].value != 0):
+                return None
+
+            return result
+
+        return None
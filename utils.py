@@ -7,28 +7,173 @@ import symbol_table
 import post
 import deduction
 import translator
-import tempfile
 import shutil
 import os
-import subprocess
 import difflib
+import time
+import metrics
+import workspace
+import compile_cache
+import prelude
 
 import logging
 
 logger = logging.getLogger(__name__)
 
+# Mylang's standard library, appended to every program. Resolved relative to this file so the compiler does not depend
+# on the working directory of the process
+STD_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "docs", "mylang_std")
 
-def analysis(source, exe=None, verbose=False, verifier=None, compile=True):
-
-    # prepend the source with mylang's std:
-    with open("./docs/mylang_std") as fh:
-        source = source + fh.read()
+# Compile a Mylang program and, if 'compile' is set, build it with cargo (in the release profile if 'release' is
+# set), run it and check its output. Returns a metrics.CompileResult with the generated Rust and the time and memory
+# used by each phase. Tracing Python memory slows the compiler down considerably, so it is only done when
+# 'trace_memory' is set. Built programs are looked up in 'cache', a compile_cache.CompileCache (True for the default
+# cache, False to disable it), and on a hit the stored Rust and executable are used without compiling anything. Passing
+# the same incremental.State to successive calls only recompiles the functions affected by each edit
+def analysis(source, exe=None, verbose=False, verifier=None, compile=True, workspace_path=None, trace_memory=False,
+             release=False, cache=True, incremental=None):
 
     # If verbosity is off, set the debugging level of the root logger to INFO level
     if not verbose:
         prior_level = logging.root.level
         logging.root.setLevel(logging.INFO)
 
+    if cache is True:
+        cache = compile_cache.CompileCache()
+
+    try:
+        return compile_program(source, workspace.Workspace(workspace_path), exe, verifier, compile, trace_memory,
+                               release, cache, incremental)
+    finally:
+        if not verbose:
+            logging.root.setLevel(prior_level)
+
+
+# The body of analysis, building in the workspace.Workspace 'ws' and compiling against the standard library at
+# 'std_path' (STD_PATH by default). Unlike analysis, this does not change the level of any logger. 'cache' is a
+# compile_cache.CompileCache or None. If 'run' is not set a built program is not executed, and 'verifier' is ignored
+def compile_program(source, ws, exe=None, verifier=None, compile=True, trace_memory=False, release=False, cache=None,
+                    incremental=None, std_path=None, run=True):
+
+    result = metrics.CompileResult(trace_memory)
+
+    key = None
+    hit = None
+
+    if compile and cache:
+        with result.phase("cache_lookup"):
+            with open(std_path if std_path is not None else STD_PATH) as fh:
+                key = cache.key(source, fh.read(), ws.template_path, release)
+
+            hit = cache.get(key, need_executable=True)
+
+    if hit is not None:
+        logger.info("Using cached build")
+
+        result.cache_hit = True
+        result.rust, executable = hit
+
+        if run:
+            start = time.perf_counter()
+            r = workspace.run_process([executable], capture_output=True)
+            result.add_process_phase("execution", time.perf_counter() - start, r.max_rss)
+
+    else:
+        s = generate_rust(source, result, incremental, std_path)
+
+        if compile:
+
+            logger.info("Updating workspace...")
+            ws.sync()
+
+            logger.info("Writing Rust source...")
+            ws.write_main(s)
+
+            start = time.perf_counter()
+            executable = ws.build(release)
+            result.add_process_phase("cargo_build", time.perf_counter() - start, ws.build_max_rss)
+
+            if run:
+                start = time.perf_counter()
+                r = ws.run(executable)
+                result.add_process_phase("execution", time.perf_counter() - start, r.max_rss)
+
+            # The cached copy of the executable stays valid when the workspace builds another program
+            if cache:
+                executable = cache.put(key, s, executable)
+
+    if compile:
+        if exe is not None:
+            shutil.copy(executable, exe)
+
+        result.executable = executable
+
+        if run:
+            result.stdout, result.stderr, result.returncode = r.stdout, r.stderr, r.returncode
+
+            check_output(r, verifier)
+
+    return result
+
+
+# Build many programs as the binaries of one cargo workspace with a single cargo invocation. 'programs' maps program
+# names to (source, verifier) pairs. Returns a map of program names to None if the program translated, built and
+# verified successfully, or the exception raised otherwise. A Rust compile error in any program fails the whole build
+def batch_analysis(programs, verbose=False, workspace_path=None):
+
+    if not verbose:
+        prior_level = logging.root.level
+        logging.root.setLevel(logging.INFO)
+
+    try:
+        results = {}
+        generated = {}
+
+        for name, (source, _) in programs.items():
+            try:
+                generated[name] = generate_rust(source)
+            except Exception as e:
+                results[name] = e
+
+        ws = workspace.BatchWorkspace(workspace_path)
+
+        logger.info("Updating workspace...")
+        ws.sync()
+
+        logger.info("Writing Rust sources...")
+        ws.write_programs(generated)
+
+        executables = ws.build()
+
+        for name in generated:
+            try:
+                check_output(ws.run(executables[name]), programs[name][1])
+                results[name] = None
+            except Exception as e:
+                results[name] = e
+
+        return results
+    finally:
+        if not verbose:
+            logging.root.setLevel(prior_level)
+
+
+# Run the whole pipeline on a Mylang program, returning the generated Rust source. The time taken by each phase and the
+# size of each representation are recorded in 'result' if given. If 'incremental' is an incremental.State, the
+# definitions, specialisations and Rust it kept from the previous compile are reused where they are unchanged. The
+# program is compiled against the standard library at 'std_path' (STD_PATH by default)
+def generate_rust(source, result=None, incremental=None, std_path=None):
+
+    if result is None:
+        result = metrics.CompileResult()
+
+    # Dumps of whole trees are expensive to format, so they are only built when debug logging is enabled
+    debug = logger.isEnabledFor(logging.DEBUG)
+
+    # Mylang's std is parsed and sugared once, and merged into the program's symbol table
+    with result.phase("prelude"):
+        std = prelude.load(std_path)
+
     logger.debug("##################################")
     logger.debug("Source")
     logger.debug("##################################")
@@ -36,29 +181,41 @@ def analysis(source, exe=None, verbose=False, verifier=None, compile=True):
     logger.debug("\n" + source)
 
     # Create a python AST from the source code
-    my_ast = ast.parse(source, mode='exec')
+    with result.phase("parse"):
+        my_ast = ast.parse(source, mode='exec')
 
     # Convert certain operations in to their syntactic sugar equivalent
-    sugar.sugar(my_ast)
+    with result.phase("sugar"):
+        if incremental is not None:
+            incremental.sugar(my_ast, std)
+            result.count("reused_definitions", incremental.reused_definitions)
+        else:
+            sugar.sugar(my_ast)
+
+    result.count("ast_nodes", metrics.count_nodes(my_ast))
 
     logger.debug("##################################")
     logger.debug("Abstract Syntax Tree")
     logger.debug("##################################")
 
-    logger.debug(ast.dump(my_ast, indent=4))
+    if debug:
+        logger.debug(ast.dump(my_ast, indent=4))
 
     logger.debug("##################################")
     logger.debug("Unparsed content")
     logger.debug("##################################")
 
-    logger.debug(custom_unparser.unparse(my_ast))
+    if debug:
+        logger.debug(custom_unparser.unparse(my_ast))
 
     logger.debug("##################################")
     logger.debug("Symbol Table")
     logger.debug("##################################")
 
     # Get the Mylang AST
-    t = symbol_table.Table(my_ast)
+    with result.phase("symbol_table"):
+        t = symbol_table.Table(my_ast)
+        t.extend(std.table)
     logger.debug(t)
 
     logger.debug("##################################")
@@ -72,7 +229,15 @@ def analysis(source, exe=None, verbose=False, verifier=None, compile=True):
     logger.debug("Deduction")
     logger.debug("##################################")
 
-    tree = deduction.deduce(t)
+    with result.phase("deduction"):
+        if incremental is not None:
+            tree = deduction.deduce(t, incremental.reusable())
+            incremental.record(tree)
+            result.count("reused_specialisations", incremental.reused_specialisations)
+        else:
+            tree = deduction.deduce(t)
+
+    result.count("type_tree_nodes", metrics.count_type_trees(tree))
 
     logger.debug("POpoksdpf[d")
     logger.debug(tree)
@@ -82,107 +247,74 @@ def analysis(source, exe=None, verbose=False, verifier=None, compile=True):
     logger.debug("Translation")
     logger.debug("##################################")
 
-    _ir = translator.translate(tree)
+    with result.phase("translation"):
+        _ir = translator.translate(tree)
 
-    logger.debug(ast.dump(_ir, indent=4))
+    result.count("ir_nodes", metrics.count_nodes(_ir))
+    result.count("monomorphized_functions", metrics.count_functions(_ir))
+
+    if debug:
+        logger.debug(ast.dump(_ir, indent=4))
 
     logger.debug("##################################")
     logger.debug("Mutability")
     logger.debug("##################################")
 
-    mutability.fill_mutability(_ir, t)
+    with result.phase("mutability"):
+        mutability.fill_mutability(_ir, t)
 
     logger.debug("Mutability map:")
-    for c in _ir.classes:
-        logger.debug(f"    {c.name} {[ast.dump(x) for x in c.member_map]} -> {c.mutable}")
+    if debug:
+        for c in _ir.classes:
+            logger.debug(f"    {c.name} {[ast.dump(x) for x in c.member_map]} -> {c.mutable}")
 
     logger.debug("##################################")
     logger.debug("Post processing")
     logger.debug("##################################")
 
-    p = post.post_processing(_ir)
+    with result.phase("post"):
+        p = post.post_processing(_ir, result=result)
 
-    logger.debug(ast.dump(p, indent=4))
+    if debug:
+        logger.debug(ast.dump(p, indent=4))
 
     logger.debug("##################################")
     logger.debug("Final rust code")
     logger.debug("##################################")
 
-    s = rustify.rustify(p)
-
-    logger.debug(s)
-
-    if compile:
-
-        template_path = "E:\\Software Projects\\IntelliJ\\mylang_template"
-
-        cwd = os.getcwd()
-
-        with tempfile.TemporaryDirectory() as td:
-
-            try:
-                root = td + "\\template"
-                main_rs = root + "\\src\\main.rs"
-                target = root + "\\target"
-                executable = target + "\\debug\\mylang_template.exe"
-
-                logger.info("Copying template to temporary location...")
-                # Copy the Rust template to the temporary directory
-                shutil.copytree(template_path, root)
-
-                if os.path.exists(target):
-                    shutil.rmtree(target)
-
-                logger.info("Writing Rust source...")
-                # Open main.rs with append and write then write the source to the end
-                with open(main_rs, "a") as fh:
-                    fh.write(s)
-
-                # Change the working directory to root
-                os.chdir(root)
-
-                logger.info("Compiling Rust code (cargo build)...")
-                subprocess.run(["cargo", "build"])
-
-                if not os.path.exists(executable):
-                    raise "Cargo build command failed"
-
-                if exe is not None:
-                    shutil.copy(executable, exe)
-
-                logger.info("Executing code...")
-                r = subprocess.run([executable], capture_output=True)
-
-                logger.info("stdout: " + str(r.stdout))
-                logger.info("return code: " + str(r.returncode))
-
-                if r.returncode != 0:
-                    logger.warning("A non-zero return code implies an error occurred in the test. Stderr says:")
-                    logger.warning(str(r.stderr))
-
-                if verifier is not None:
-                    if type(verifier) is bytes:
-                        if r.stdout != verifier:
-                            logger.warning("Expected output does not match actual output for test")
-                            logger.info("Expected output: " + repr(verifier))
-                            logger.info("Actual output: " + repr(r.stdout))
-                            assert r.stdout == verifier
-                            logger.info("Stdout test passed.")
-                    else:
-                        verifier(r.stdout.decode('utf-8').split("\n"))
-                        logger.info("Verifier success")
-
-
-            finally:
-
-                os.chdir(cwd)
-
-    if not verbose:
-        logging.root.setLevel(prior_level)
-
-
-
-
+    with result.phase("rustify"):
+        if incremental is not None:
+            s = rustify.rustify(p, incremental.rust)
+            incremental.prune(p)
+        else:
+            s = rustify.rustify(p)
 
+    result.rust = s
+    result.count("rust_bytes", len(s.encode("utf-8")))
 
+    logger.debug(s)
 
+    return s
+
+
+# Log the result of running a generated program, and check its stdout against 'verifier'. The verifier is either the
+# expected stdout as bytes, or a function taking the list of output lines that raises on failure
+def check_output(r, verifier=None):
+    logger.info("stdout: " + str(r.stdout))
+    logger.info("return code: " + str(r.returncode))
+
+    if r.returncode != 0:
+        logger.warning("A non-zero return code implies an error occurred in the test. Stderr says:")
+        logger.warning(str(r.stderr))
+
+    if verifier is not None:
+        if type(verifier) is bytes:
+            if r.stdout != verifier:
+                logger.warning("Expected output does not match actual output for test")
+                logger.info("Expected output: " + repr(verifier))
+                logger.info("Actual output: " + repr(r.stdout))
+                assert r.stdout == verifier
+                logger.info("Stdout test passed.")
+        else:
+            verifier(r.stdout.decode('utf-8').split("\n"))
+            logger.info("Verifier success")
@@ -0,0 +1,217 @@
+import argparse
+import fnmatch
+import hashlib
+import logging
+import os
+import sys
+import tempfile
+import time
+
+import session
+import workspace
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_WORKSPACE_ROOT = os.path.join(tempfile.gettempdir(), "mylang_watch_workspaces")
+
+# Seconds between polls of the watched files
+DEFAULT_INTERVAL = 0.25
+
+# Seconds the watched files must stay unchanged before a rebuild starts, so an editor writing a file in several steps,
+# or saving many files at once, causes one rebuild rather than several
+DEFAULT_DEBOUNCE = 0.2
+
+
+# The outcome of rebuilding one program: the metrics.CompileResult, or the exception that stopped the rebuild, and the
+# wall time the rebuild took once the files settled
+class Rebuild:
+    def __init__(self, path, latency, result=None, error=None):
+        self.path = path
+        self.latency = latency
+        self.result = result
+        self.error = error
+
+    def __str__(self):
+        if self.error is not None:
+            return f"{self.path}: failed after {self.latency:.2f}s: {type(self.error).__name__}: {self.error}"
+
+        r = self.result
+        phases = ", ".join(f"{name} {p.wall_time:.3f}s" for name, p in r.phases.items())
+        reused = ""
+
+        if "reused_specialisations" in r.counts:
+            reused = f", reused {r.counts['reused_definitions']} definitions and {r.counts['reused_specialisations']} specialisations"
+
+        if r.cache_hit:
+            reused = ", cached build"
+
+        return f"{self.path}: rebuilt in {self.latency:.2f}s ({phases}){reused}"
+
+
+# Watches Mylang programs and rebuilds each one when it changes. 'paths' are program files, or directories searched
+# recursively for files matching 'pattern'. Changes are found by polling modification times, so no file system
+# notification service is needed.
+#
+# Every program has its own session.Session, and so its own incremental state and cargo workspace under
+# 'workspace_root'. A rebuild therefore only deduces, translates and rustifies the definitions the edit affected, and
+# cargo rebuilds incrementally in a workspace that only ever holds that program.
+class Watcher:
+
+    def __init__(self, paths, pattern="*.my", build=True, run=False, release=False, interval=DEFAULT_INTERVAL,
+                 debounce=DEFAULT_DEBOUNCE, workspace_root=DEFAULT_WORKSPACE_ROOT, template_path=None):
+        self.paths = paths
+        self.pattern = pattern
+        self.build = build
+        self.run = run
+        self.release = release
+        self.interval = interval
+        self.debounce = debounce
+        self.workspace_root = workspace_root
+        self.template_path = template_path
+
+        # Maps program paths to their Session, and to the source they were last built from
+        self.sessions = {}
+        self.sources = {}
+
+    def files(self):
+        files = []
+
+        for path in self.paths:
+            if os.path.isdir(path):
+                for directory, dirs, names in os.walk(path):
+                    dirs.sort()
+                    files.extend(os.path.join(directory, name) for name in sorted(names) if fnmatch.fnmatch(name, self.pattern))
+            elif os.path.exists(path):
+                files.append(path)
+
+        return files
+
+    # Maps every watched file to its (mtime, size)
+    def snapshot(self):
+        stamps = {}
+
+        for path in self.files():
+            try:
+                s = os.stat(path)
+            except OSError:
+                continue
+            stamps[path] = s.st_mtime_ns, s.st_size
+
+        return stamps
+
+    # The session building the program at 'path'. binary_name maps every character it does not keep to '_', so distinct
+    # paths such as a/b.py and a_b.py can give the same name, and a hash of the path keeps their workspaces apart
+    def session(self, path):
+        if path not in self.sessions:
+            abspath = os.path.abspath(path)
+            digest = hashlib.sha256(abspath.encode("utf-8")).hexdigest()[:8]
+            workspace_path = os.path.join(self.workspace_root, workspace.binary_name(abspath) + "_" + digest)
+            self.sessions[path] = session.Session(self.template_path, workspace_path=workspace_path, release=self.release)
+
+        return self.sessions[path]
+
+    # Rebuild the program at 'path' if its source changed since it was last built. Returns a Rebuild, or None if the
+    # file is unchanged (it may have been touched or saved without edits)
+    def rebuild(self, path):
+        start = time.perf_counter()
+
+        try:
+            with open(path) as fh:
+                source = fh.read()
+        except OSError:
+            return None
+
+        if self.sources.get(path) == source:
+            return None
+
+        self.sources[path] = source
+
+        try:
+            result = self.session(path).compile(source, build=self.build, run=self.run)
+        except Exception as e:
+            return Rebuild(path, time.perf_counter() - start, error=e)
+
+        return Rebuild(path, time.perf_counter() - start, result)
+
+    # Wait until the watched files stop changing, returning their final stamps
+    def settle(self, stamps):
+        while True:
+            time.sleep(self.debounce)
+            current = self.snapshot()
+
+            if current == stamps:
+                return current
+
+            stamps = current
+
+    # Build every program, then rebuild the programs that change, calling 'report' with each Rebuild. Stops after
+    # 'polls' polls if given, otherwise runs until interrupted
+    def watch(self, report=None, polls=None):
+        report = report if report is not None else (lambda rebuild: logger.info(str(rebuild)))
+
+        stamps = {}
+        count = 0
+
+        while polls is None or count < polls:
+            count += 1
+            current = self.snapshot()
+
+            if current != stamps:
+                if stamps:
+                    current = self.settle(current)
+
+                for path in sorted(current):
+                    if stamps.get(path) != current[path]:
+                        rebuild = self.rebuild(path)
+
+                        if rebuild is not None:
+                            report(rebuild)
+
+                # Forget programs that were deleted
+                for path in set(self.sessions) - set(current):
+                    del self.sessions[path]
+                    self.sources.pop(path, None)
+
+                stamps = current
+
+            time.sleep(self.interval)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Rebuild Mylang programs incrementally whenever they change")
+    parser.add_argument("paths", nargs="+", help="program files, or directories to search for programs")
+    parser.add_argument("--pattern", default="*.my", help="file name pattern of programs in directories (default: *.my)")
+    parser.add_argument("--no-build", action="store_true", help="only generate Rust, do not run cargo")
+    parser.add_argument("--run", action="store_true", help="run each program after building it")
+    parser.add_argument("--release", action="store_true", help="build in the release profile")
+    parser.add_argument("--interval", type=float, default=DEFAULT_INTERVAL, help=f"seconds between polls (default: {DEFAULT_INTERVAL})")
+    parser.add_argument("--debounce", type=float, default=DEFAULT_DEBOUNCE,
+                        help=f"seconds files must stay unchanged before rebuilding (default: {DEFAULT_DEBOUNCE})")
+    parser.add_argument("--workspace-root", default=DEFAULT_WORKSPACE_ROOT, help="directory holding one cargo workspace per program")
+    parser.add_argument("--template", default=None, help="Rust template to compile against (default: MYLANG_TEMPLATE)")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.WARNING, stream=sys.stdout, format="%(message)s")
+    logger.setLevel(logging.INFO)
+
+    def report(rebuild):
+        logger.info(str(rebuild))
+
+        if rebuild.result is not None and rebuild.result.stdout is not None:
+            sys.stdout.write(rebuild.result.stdout.decode("utf-8", "replace"))
+
+    watcher = Watcher(args.paths, args.pattern, not args.no_build, args.run, args.release, args.interval, args.debounce,
+                      args.workspace_root, args.template)
+
+    logger.info(f"Watching {len(watcher.files())} programs, press Ctrl+C to stop")
+
+    try:
+        watcher.watch(report)
+    except KeyboardInterrupt:
+        pass
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
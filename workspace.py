@@ -0,0 +1,273 @@
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+
+import errors
+import parse_template
+
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Name of the package in the template's Cargo.toml, and therefore of the built executable
+CRATE_NAME = "mylang_template"
+
+DEFAULT_WORKSPACE = os.path.join(tempfile.gettempdir(), "mylang_workspace")
+
+# Directories of the template that are never copied into the workspace
+IGNORED_DIRECTORIES = {"target", ".git", ".idea"}
+
+# The generated code is appended to the template's main.rs, so this file is written separately rather than copied
+MAIN_RS = os.path.join("src", "main.rs")
+
+# Files in the workspace that are not copied from the template, and so must not be removed when syncing
+GENERATED_FILES = {MAIN_RS, "Cargo.lock"}
+
+# Batch builds turn the template's main.rs into a library, and add one binary per program
+LIB_RS = os.path.join("src", "lib.rs")
+BIN_DIRECTORY = os.path.join("src", "bin")
+
+# Prepended to each batch binary. Importing the library at the crate root means the crate:: paths used by the generated
+# code (crate::built_ins, crate::heap, ...) resolve to the shared runtime
+BIN_PRELUDE = f"#[allow(unused_imports)]\nuse {CRATE_NAME}::*;\n"
+
+
+# Run a child process like subprocess.run, additionally setting 'max_rss' on the result to the maximum resident set
+# size in bytes of the child and its descendants, or None where the platform cannot report it
+def run_process(args, cwd=None, capture_output=False):
+
+    if not hasattr(os, "wait4"):
+        r = subprocess.run(args, cwd=cwd, capture_output=capture_output)
+        r.max_rss = None
+        return r
+
+    pipe = subprocess.PIPE if capture_output else None
+
+    p = subprocess.Popen(args, cwd=cwd, stdout=pipe, stderr=pipe)
+
+    # Read the pipes on threads so a child filling one pipe cannot deadlock, then reap the child ourselves with wait4
+    # to obtain its resource usage, which Popen.wait would discard
+    output = {}
+    readers = []
+
+    if capture_output:
+        for name, stream in (("stdout", p.stdout), ("stderr", p.stderr)):
+            reader = threading.Thread(target=lambda n=name, st=stream: output.__setitem__(n, st.read()))
+            reader.start()
+            readers.append(reader)
+
+    _, status, usage = os.wait4(p.pid, 0)
+    p.returncode = os.waitstatus_to_exitcode(status)
+
+    for reader in readers:
+        reader.join()
+
+    if capture_output:
+        p.stdout.close()
+        p.stderr.close()
+
+    r = subprocess.CompletedProcess(args, p.returncode, output.get("stdout"), output.get("stderr"))
+
+    # Linux reports kilobytes, macOS reports bytes
+    r.max_rss = usage.ru_maxrss if sys.platform == "darwin" else usage.ru_maxrss * 1024
+
+    return r
+
+
+def executable_name(name):
+    if sys.platform == "win32":
+        return name + ".exe"
+    return name
+
+
+# A persistent copy of the Rust template used to build generated code. The 'target' directory is kept between builds
+# so the template's dependencies are only compiled once, and files are only rewritten when their contents change so
+# cargo's fingerprints stay valid.
+class Workspace:
+
+    def __init__(self, path=None, template_path=None):
+        self.path = path if path is not None else DEFAULT_WORKSPACE
+        self.template_path = template_path if template_path is not None else parse_template.get_template_path()
+
+        # Maximum resident set size of the last cargo build, see run_process
+        self.build_max_rss = None
+
+    def main_rs(self):
+        return os.path.join(self.path, MAIN_RS)
+
+    def executable(self, profile="debug"):
+        return os.path.join(self.path, "target", profile, executable_name(CRATE_NAME))
+
+    # Returns true if the file at the relative path 'rel' is created by the workspace rather than copied from the template
+    def is_generated(self, rel):
+        return rel in GENERATED_FILES
+
+    def template_files(self):
+        files = []
+
+        for directory, dirs, names in os.walk(self.template_path):
+            dirs[:] = [d for d in dirs if d not in IGNORED_DIRECTORIES]
+
+            for name in names:
+                files.append(os.path.relpath(os.path.join(directory, name), self.template_path))
+
+        return files
+
+    # Bring the workspace up to date with the template, copying only files that are missing or have changed
+    def sync(self):
+
+        files = self.template_files()
+
+        for rel in files:
+            if rel == MAIN_RS:
+                continue
+
+            src = os.path.join(self.template_path, rel)
+            dst = os.path.join(self.path, rel)
+
+            if os.path.exists(dst):
+                s, d = os.stat(src), os.stat(dst)
+                if s.st_size == d.st_size and s.st_mtime_ns == d.st_mtime_ns:
+                    continue
+
+            logger.debug(f"Copying {rel} into workspace")
+
+            os.makedirs(os.path.dirname(dst), exist_ok=True)
+            shutil.copy2(src, dst)
+
+        # Remove anything that has been deleted from the template since the last sync
+        keep = set(files)
+
+        for directory, dirs, names in os.walk(self.path):
+            dirs[:] = [d for d in dirs if d not in IGNORED_DIRECTORIES]
+
+            for name in names:
+                path = os.path.join(directory, name)
+                rel = os.path.relpath(path, self.path)
+                if rel not in keep and not self.is_generated(rel):
+                    logger.debug(f"Removing {path} from workspace")
+                    os.remove(path)
+
+    # Write a source file of the workspace, leaving it untouched if the contents are unchanged
+    def write_source(self, path, contents):
+        if os.path.exists(path):
+            with open(path) as fh:
+                if fh.read() == contents:
+                    return False
+
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+
+        with open(path, "w") as fh:
+            fh.write(contents)
+
+        return True
+
+    # Return the template's main.rs, which the generated code is appended to
+    def template_main(self):
+        with open(os.path.join(self.template_path, MAIN_RS)) as fh:
+            return fh.read()
+
+    def write_main(self, rust_source):
+        return self.write_source(self.main_rs(), self.template_main() + rust_source)
+
+    def cargo_build(self, args=()):
+        logger.info("Compiling Rust code (cargo build)...")
+
+        r = run_process(["cargo", "build", *args], cwd=self.path)
+
+        self.build_max_rss = r.max_rss
+
+        if r.returncode != 0:
+            raise errors.CargoBuildFailed(self.path, r.returncode)
+
+    # Build the generated program, in the release profile if 'release' is set, returning the path of the executable
+    def build(self, release=False):
+        self.cargo_build(["--release"] if release else [])
+
+        executable = self.executable(profile(release))
+
+        if not os.path.exists(executable):
+            raise errors.CargoBuildFailed(self.path, 0)
+
+        return executable
+
+    def run(self, executable=None):
+        logger.info("Executing code...")
+        return run_process([executable or self.executable()], cwd=self.path, capture_output=True)
+
+
+# The cargo profile, and so the target subdirectory, used for debug or release builds
+def profile(release):
+    return "release" if release else "debug"
+
+
+# Convert a program name into a valid cargo binary name
+def binary_name(name):
+    return "".join(ch if ch.isalnum() or ch == "_" else "_" for ch in str(name))
+
+
+# A workspace that builds many programs with a single cargo invocation. The template's main.rs becomes src/lib.rs, with
+# its top level modules made public, and each program is written to src/bin/<name>.rs. The runtime and dependencies
+# are then compiled and linked once, and cargo can build the binaries in parallel.
+class BatchWorkspace(Workspace):
+
+    def __init__(self, path=None, template_path=None):
+        super().__init__(path if path is not None else DEFAULT_WORKSPACE + "_batch", template_path)
+
+        # Maps program names to binary names for the current batch
+        self.binaries = {}
+
+    def is_generated(self, rel):
+        return rel == LIB_RS or os.path.dirname(rel) == BIN_DIRECTORY or rel == "Cargo.lock"
+
+    def executable(self, profile="debug", name=None):
+        return os.path.join(self.path, "target", profile, executable_name(name if name is not None else CRATE_NAME))
+
+    # Make the template's top level module declarations public, so the binaries can reach them through the library
+    def template_lib(self):
+        lines = []
+
+        for line in self.template_main().split("\n"):
+            if line.startswith("mod "):
+                line = "pub " + line
+            lines.append(line)
+
+        return "\n".join(lines)
+
+    # Write the library and one binary per program. 'programs' maps program names to generated Rust code. Binaries
+    # from previous batches that are not part of this one are removed so they are not rebuilt
+    def write_programs(self, programs):
+
+        self.write_source(os.path.join(self.path, LIB_RS), self.template_lib())
+
+        # A main.rs would be built as an extra binary without a main function
+        if os.path.exists(self.main_rs()):
+            os.remove(self.main_rs())
+
+        self.binaries = {name: binary_name(name) for name in programs}
+
+        for name, rust_source in programs.items():
+            self.write_source(os.path.join(self.path, BIN_DIRECTORY, self.binaries[name] + ".rs"), BIN_PRELUDE + rust_source)
+
+        bin_directory = os.path.join(self.path, BIN_DIRECTORY)
+
+        for file in os.listdir(bin_directory):
+            if file[:-3] not in self.binaries.values():
+                os.remove(os.path.join(bin_directory, file))
+
+    # Build every binary with one cargo invocation, returning a map of program names to executables
+    def build(self, release=False):
+        self.cargo_build(["--bins", "--release"] if release else ["--bins"])
+
+        executables = {}
+
+        for name, binary in self.binaries.items():
+            executables[name] = self.executable(profile(release), name=binary)
+
+            if not os.path.exists(executables[name]):
+                raise errors.CargoBuildFailed(self.path, 0)
+
+        return executables